@@ -1,45 +1,42 @@
 #!/usr/bin/env python3
 import argparse
-from Bio.PDB import PDBParser, NeighborSearch, Selection
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from pdb_reader import read_atoms
+from neighbors import cross_pairs
 
 def get_interface_residues(pdb_file, chain1_id, chain2_id, cutoff):
-    parser = PDBParser(QUIET=True)
-    structure = parser.get_structure("complex", pdb_file)
-    model = structure[0]
+    atoms = read_atoms(pdb_file, chains=(chain1_id, chain2_id))
 
-    try:
-        chain1 = model[chain1_id]
-        chain2 = model[chain2_id]
-    except KeyError:
+    chain_ids = atoms.chain_ids()
+    if chain1_id not in chain_ids or chain2_id not in chain_ids:
         raise ValueError(f"Chain IDs {chain1_id} or {chain2_id} not found in {pdb_file}")
 
-    atoms_chain1 = list(chain1.get_atoms())
-    atoms_chain2 = list(chain2.get_atoms())
+    atoms_chain1 = np.flatnonzero(atoms.chain == chain1_id.encode())
+    atoms_chain2 = np.flatnonzero(atoms.chain == chain2_id.encode())
+
+    # All cross-chain atom pairs within the cutoff, from one cell-list search
+    i, j, _ = cross_pairs(atoms.xyz[atoms_chain1], atoms.xyz[atoms_chain2], cutoff)
 
-    # NeighborSearch needs all atoms; we'll use it twice (both directions)
-    all_atoms = atoms_chain1 + atoms_chain2
-    ns = NeighborSearch(all_atoms)
+    keys = atoms.residue_keys()
+    names = atoms.residue_names()
 
-    iface_residues_chain1 = set()
-    iface_residues_chain2 = set()
+    def residues(res_index):
+        # (resname, chain, resseq, icode) per interface residue
+        return {(names[k],) + keys[k] for k in np.unique(res_index)}
 
-    # For each atom in chain1, search neighbors in chain2
-    for atom in atoms_chain1:
-        neighbors = ns.search(atom.get_coord(), cutoff, level="A")
-        for neigh in neighbors:
-            parent_chain = neigh.get_parent().get_parent()  # residue -> chain
-            if parent_chain.id == chain2_id:
-                iface_residues_chain1.add(atom.get_parent())
-                iface_residues_chain2.add(neigh.get_parent())
+    iface_residues_chain1 = residues(atoms.res_index[atoms_chain1[i]])
+    iface_residues_chain2 = residues(atoms.res_index[atoms_chain2[j]])
 
     return iface_residues_chain1, iface_residues_chain2
 
 def residue_id(res):
-    """Return a nice string for a Biopython residue object."""
-    resname = res.get_resname()
-    chain_id = res.get_parent().id
-    seq_id = res.get_id()[1]  # (hetflag, resseq, icode) -> use resseq
-    icode = res.get_id()[2].strip()
+    """Return a nice string for a (resname, chain, resseq, icode) residue key."""
+    resname, chain_id, seq_id, icode = res
+    icode = icode.strip()
     if icode:
         return f"{resname} {chain_id}{seq_id}{icode}"
     else:
@@ -49,7 +46,7 @@ def main():
     parser = argparse.ArgumentParser(
         description="Find interface residues between two chains in a PDB file."
     )
-    parser.add_argument("pdb", help="Input PDB file (clean structure)")
+    parser.add_argument("pdb", help="Input PDB or mmCIF file (clean structure)")
     parser.add_argument("chain1", help="First chain ID (e.g. A)")
     parser.add_argument("chain2", help="Second chain ID (e.g. E)")
     parser.add_argument(
@@ -63,12 +60,12 @@ def main():
     )
 
     print(f"Interface residues on chain {args.chain1} (within {args.distance} Å of chain {args.chain2}):")
-    for res in sorted(iface1, key=lambda r: r.get_id()[1]):
+    for res in sorted(iface1, key=lambda r: r[2]):
         print("  ", residue_id(res))
 
     print()
     print(f"Interface residues on chain {args.chain2} (within {args.distance} Å of chain {args.chain1}):")
-    for res in sorted(iface2, key=lambda r: r.get_id()[1]):
+    for res in sorted(iface2, key=lambda r: r[2]):
         print("  ", residue_id(res))
 
 if __name__ == "__main__":
@@ -1,27 +1,28 @@
 import os
-import subprocess
+import sys
 import csv
-from Bio.PDB import PDBParser, PDBIO
+from functools import lru_cache
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from pdb_reader import read_atoms, PdbTemplate
+from compressed_io import open_input
+from energy_results import save_table
+from mutant_scan import MutantScan, RESULTS_DB
 
 # -----------------------
 # Paths
 # -----------------------
 DATA = "data"
-SRC = "src"
 RESULTS = "results/alanine_scanning"
 
-WT_PDB = f"{DATA}/6m0j_prepared.pdb"
-WT_PDBQT = f"{DATA}/6m0j_prepared.pdbqt"
-WT_CSV = "results/WT/WT_interaction_energies.csv"
+# WT structure: PDB or mmCIF (mutants are written as PDB)
+WT_PDB = os.environ.get("WT_PDB", f"{DATA}/6m0j_prepared.pdb")
+WT_PDBQT = os.environ.get("WT_PDBQT", f"{DATA}/6m0j_prepared.pdbqt")
 
 INTERFACE_A = "results/interface/interface_chain_A.txt"
 INTERFACE_E = "results/interface/interface_chain_E.txt"
 
-ENERGY_SCRIPT = f"{SRC}/int_energies_AE.py"
-
-os.makedirs(f"{RESULTS}/mutants", exist_ok=True)
-os.makedirs(f"{RESULTS}/energies", exist_ok=True)
-
 BACKBONE_KEEP = {"N", "CA", "C", "O", "CB"}
 
 
@@ -29,85 +30,34 @@ BACKBONE_KEEP = {"N", "CA", "C", "O", "CB"}
 # Helpers
 # -----------------------
 def load_interface(path):
-    with open(path) as f:
+    with open_input(path, "r") as f:
         return [int(x) for x in f.read().split() if x.isdigit()]
 
 
+@lru_cache(maxsize=None)
+def wt_template(pdb_in):
+    """WT PDB text, read once per scan; mutants only rewrite their residue block."""
+    return PdbTemplate(read_atoms(pdb_in, altloc=None))
+
+
 def mutate_to_alanine(pdb_in, chain_id, resid, pdb_out):
-    parser = PDBParser(QUIET=True)
-    structure = parser.get_structure("mut", pdb_in)
+    wt = wt_template(pdb_in)
+    atoms = wt.atoms
 
-    if chain_id not in structure[0]:
+    if chain_id not in atoms.chain_ids():
         raise KeyError(f"Chain {chain_id} not found in {pdb_in}")
 
-    found = False
-    for res in structure[0][chain_id]:
-        if res.id[0] != " ":
-            continue
-        if res.id[1] == resid:
-            found = True
-            res.resname = "ALA"
-            for atom in list(res):
-                if atom.name not in BACKBONE_KEEP:
-                    res.detach_child(atom.id)
-            break
-
-    if not found:
+    res = np.flatnonzero((atoms.chain == chain_id.encode()) & ~atoms.hetero & (atoms.res_seq == resid))
+    if not len(res):
         raise ValueError(f"Residue {resid} not found in chain {chain_id}")
+    # first residue with that number (insertion codes are separate residues)
+    r = atoms.res_index[res[0]]
 
-    io = PDBIO()
-    io.set_structure(structure)
-    io.save(pdb_out)
-
-
-def pdb_to_pdbqt(pdb, pdbqt):
-    subprocess.run(
-        ["obabel", pdb, "-O", pdbqt, "--partialcharge", "gasteiger"],
-        check=True
-    )
-
-
-def extract_total_energy(csv_file):
-    """
-    Accepts either:
-      TOTAL, ... , <value>
-    or
-      TOTAL(A–E),, <elec>, <vdw>, <solv>, <total>
-    """
-    with open(csv_file) as f:
-        for row in csv.reader(f):
-            if not row:
-                continue
-            key = row[0].strip()
-
-            if key == "TOTAL":
-                # old style
-                return float(row[-1])
-
-            if key.startswith("TOTAL(") or key.startswith("TOTAL"):
-                # new style: TOTAL(A–E),,elec,vdw,solv,total
-                try:
-                    return float(row[-1])
-                except Exception:
-                    pass
-
-    raise RuntimeError(f"Total energy not found in {csv_file}")
-
-
-def run_energy(pdb, pdbqt, out_csv):
-    env = dict(os.environ)
-    env["PDB"] = pdb
-    env["PDBQT"] = pdbqt
-    env["OUTCSV"] = out_csv
-
-    subprocess.run(
-        ["python3", ENERGY_SCRIPT],
-        check=True,
-        env=env
-    )
-
-    if not os.path.exists(out_csv):
-        raise FileNotFoundError(f"Energy script did not write OUTCSV: {out_csv}")
+    lines = wt.residue_lines(r)
+    lines = lines[np.isin(atoms.name[atoms.res_start[r]:atoms.res_start[r + 1]],
+                          [n.encode() for n in BACKBONE_KEEP])]
+    lines.view(np.uint8).reshape(len(lines), -1)[:, 17:20] = np.frombuffer(b"ALA", dtype=np.uint8)
+    wt.write(pdb_out, {r: lines})
 
 
 # -----------------------
@@ -121,51 +71,31 @@ def main():
     iface_A = [r for r in iface_A if r >= 10]
     iface_E = [r for r in iface_E if r >= 10]
 
-    WT_energy = extract_total_energy(WT_CSV)
-
+    # WT engine, database run and result files shared by all mutants (mutant_scan.py)
+    scan = MutantScan("alanine", RESULTS, WT_PDB, WT_PDBQT)
     ddg_results = []
 
-    # --- Chain A scan ---
-    for resid in iface_A:
-        tag = f"A_{resid}_ALA"
-        pdb = f"{RESULTS}/mutants/{tag}.pdb"
-        pdbqt = f"{RESULTS}/mutants/{tag}.pdbqt"
-        csv_out = f"{RESULTS}/energies/{tag}.csv"
-
-        try:
-            mutate_to_alanine(WT_PDB, "A", resid, pdb)
-            pdb_to_pdbqt(pdb, pdbqt)
-            run_energy(pdb, pdbqt, csv_out)
-
-            mut_energy = extract_total_energy(csv_out)
-            ddg = mut_energy - WT_energy
-            ddg_results.append(("A", resid, ddg))
-
-        except Exception as e:
-            print(f"Skipping {tag}: {e}")
-            continue
-
-    # --- Chain E scan ---
-    for resid in iface_E:
-        tag = f"E_{resid}_ALA"
-        pdb = f"{RESULTS}/mutants/{tag}.pdb"
-        pdbqt = f"{RESULTS}/mutants/{tag}.pdbqt"
-        csv_out = f"{RESULTS}/energies/{tag}.csv"
-
-        try:
-            mutate_to_alanine(WT_PDB, "E", resid, pdb)
-            pdb_to_pdbqt(pdb, pdbqt)
-            run_energy(pdb, pdbqt, csv_out)
-
-            mut_energy = extract_total_energy(csv_out)
-            ddg = mut_energy - WT_energy
-            ddg_results.append(("E", resid, ddg))
-
-        except Exception as e:
-            print(f"Skipping {tag}: {e}")
-            continue
-
-    # Save ΔΔG table
+    for chain_id, iface in (("A", iface_A), ("E", iface_E)):
+        for resid in iface:
+            tag = f"{chain_id}_{resid}_ALA"
+
+            try:
+                mut_cx = scan.build(tag, lambda out: mutate_to_alanine(WT_PDB, chain_id, resid, out))
+                _, ddg = scan.score(tag, mut_cx, chain_id, resid, "ALA")
+                ddg_results.append((chain_id, resid, ddg))
+
+            except Exception as e:
+                print(f"Skipping {tag}: {e}")
+                continue
+
+    scan.close()
+
+    # Save ΔΔG table (typed columns for the plots, CSV export)
+    chain, residue, ddg = zip(*ddg_results) if ddg_results else ((), (), ())
+    save_table(f"{RESULTS}/alanine_ddg.npz",
+               {"chain": np.array(chain, dtype="U4"), "residue": np.array(residue, dtype=np.int64),
+                "ddg": np.array(ddg, dtype=np.float64)})
+
     out_ddg = f"{RESULTS}/alanine_ddg.csv"
     with open(out_ddg, "w", newline="") as f:
         w = csv.writer(f)
@@ -173,7 +103,7 @@ def main():
         for row in ddg_results:
             w.writerow(row)
 
-    print(f"Alanine scanning finished → {out_ddg}")
+    print(f"Alanine scanning finished → {out_ddg} (database: {RESULTS_DB or 'off'})")
 
 
 if __name__ == "__main__":
@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
-import pandas as pd
+import os
+import sys
 
-DDG_CSV = "results/alanine_scanning/alanine_ddg.csv"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from energy_results import load_table
+
+DDG_NPZ = "results/alanine_scanning/alanine_ddg.npz"
 PDB_IN  = "data/6m0j_prepared.pdb"
 PDB_OUT = "results/alanine_scanning/6m0j_ddg_bfactor.pdb"
 
-df = pd.read_csv(DDG_CSV)
-ddg_map = {(row["Chain"], int(row["Residue"])): float(row["ΔΔG (kcal/mol)"])
-           for _, row in df.iterrows()}
+ddg = load_table(DDG_NPZ)
+ddg_map = dict(zip(zip(ddg["chain"].tolist(), ddg["residue"].tolist()), ddg["ddg"].tolist()))
 
 def set_bfactor(line, b):
     # PDB B-factor is columns 61-66 (1-indexed); format width 6, 2 decimals
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
+import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 
-CSV_IN  = "results/alanine_scanning/alanine_ddg.csv"
-PNG_OUT = "results/alanine_scanning/alanine_ddg_overlay_v2.png"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from energy_results import load_table
 
-df = pd.read_csv(CSV_IN)
+NPZ_IN  = "results/alanine_scanning/alanine_ddg.npz"
+PNG_OUT = "results/alanine_scanning/alanine_ddg_overlay_v2.png"
 
-df["Residue"] = pd.to_numeric(df["Residue"])
-df["ΔΔG (kcal/mol)"] = pd.to_numeric(df["ΔΔG (kcal/mol)"])
+# Typed columns written by alanine_scan.py
+ddg = load_table(NPZ_IN)
+df = pd.DataFrame({"Chain": ddg["chain"], "Residue": ddg["residue"], "ΔΔG (kcal/mol)": ddg["ddg"]})
 
 # In your project:
 # Chain A = ACE2, Chain E = Spike RBD
@@ -1,15 +1,26 @@
+import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
-import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from energy_results import load_results
 
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 results_dir = os.path.join(base_dir, 'results')
-csv_path = os.path.join(results_dir, "interaction_energies_RBD_ACE2.csv")
+npz_path = os.path.join(results_dir, "interaction_energies_RBD_ACE2.npz")
 
-# Load CSV
-df = pd.read_csv(csv_path)
+# Load typed per-residue columns (int_energies_AE.py OUTNPZ)
+res = load_results(npz_path).residue_columns(0)
+df = pd.DataFrame({
+    "Chain": res["chain"],
+    "Residue": res["residue"],
+    "ΔG_elec (kcal/mol)": res["elec"],
+    "ΔG_vdw (kcal/mol)": res["vdw"],
+    "ΔG_solv (kcal/mol)": res["solv"],
+    "ΔG_total (kcal/mol)": res["total"],
+})
 
-# Column name EXACTLY as in CSV
 TOTAL_COL = "ΔG_total (kcal/mol)"
 
 # Separate chains
@@ -1,24 +1,24 @@
 #!/usr/bin/env python3
 import os
+import sys
 import csv
 import subprocess
 import tempfile
-from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from energy_results import save_table
+from mutant_scan import MutantScan, RESULTS_DB
 
 # -----------------------
 # Paths
 # -----------------------
 DATA = "data"
-SRC = "src"
 RESULTS = "results/variants"
 
-WT_PDB = f"{DATA}/6m0j_prepared.pdb"
-WT_PDBQT = f"{DATA}/6m0j_prepared.pdbqt"
-WT_CSV = "results/WT/WT_interaction_energies.csv"
-ENERGY_SCRIPT = f"{SRC}/int_energies_AE.py"
-
-Path(f"{RESULTS}/mutants").mkdir(parents=True, exist_ok=True)
-Path(f"{RESULTS}/energies").mkdir(parents=True, exist_ok=True)
+# WT structure: PDB or mmCIF (mutants are written as PDB)
+WT_PDB = os.environ.get("WT_PDB", f"{DATA}/6m0j_prepared.pdb")
+WT_PDBQT = os.environ.get("WT_PDBQT", f"{DATA}/6m0j_prepared.pdbqt")
 
 # -----------------------
 # Mutations (Variants of concern)
@@ -42,31 +42,6 @@ AA3_TO_AA1 = {
 # -----------------------
 # Helpers
 # -----------------------
-def extract_total_energy(csv_file: str) -> float:
-    """
-    Reads TOTAL(A–E) line from your CSV.
-    Example: TOTAL(A–E),,elec,vdw,solv,total
-    """
-    with open(csv_file) as f:
-        r = csv.reader(f)
-        for row in r:
-            if row and row[0].startswith("TOTAL"):
-                return float(row[-1])
-    raise RuntimeError(f"TOTAL energy not found in {csv_file}")
-
-def pdb_to_pdbqt(pdb: str, pdbqt: str):
-    subprocess.run(
-        ["obabel", pdb, "-O", pdbqt, "--partialcharge", "gasteiger"],
-        check=True
-    )
-
-def run_energy(pdb: str, pdbqt: str, out_csv: str):
-    subprocess.run(
-        ["python3", ENERGY_SCRIPT],
-        check=True,
-        env=dict(os.environ, PDB=pdb, PDBQT=pdbqt, OUTCSV=out_csv)
-    )
-
 def mutate_with_pymol(pdb_in: str, chain: str, resid: int, new_aa3: str, pdb_out: str):
     """
     Uses PyMOL mutagenesis wizard (headless) to rebuild sidechain.
@@ -110,29 +85,32 @@ quit
 # MAIN
 # -----------------------
 def main():
-    # WT reference (from your already computed WT CSV)
-    wt_energy = extract_total_energy(WT_CSV)
+    # WT engine, database run and result files shared by all variants (mutant_scan.py)
+    scan = MutantScan("variant", RESULTS, WT_PDB, WT_PDBQT)
+    wt_energy = scan.wt_energy
 
     out_csv = f"{RESULTS}/variant_ddg.csv"
     rows = []
 
     for variant, chain, resid, newaa3 in MUTATIONS:
         tag = f"{variant}_{chain}{resid}_{newaa3}"
-        mut_pdb = f"{RESULTS}/mutants/{tag}.pdb"
-        mut_pdbqt = f"{RESULTS}/mutants/{tag}.pdbqt"
-        e_csv = f"{RESULTS}/energies/{tag}.csv"
 
         print(f"\n=== Building {tag} ===")
-        mutate_with_pymol(WT_PDB, chain, resid, newaa3, mut_pdb)
-        pdb_to_pdbqt(mut_pdb, mut_pdbqt)
+        mut_cx = scan.build(tag, lambda out: mutate_with_pymol(WT_PDB, chain, resid, newaa3, out))
 
         print(f"=== Energy {tag} ===")
-        run_energy(mut_pdb, mut_pdbqt, e_csv)
+        result, ddg = scan.score(tag, mut_cx, chain, resid, newaa3, label=variant)
+        rows.append([variant, chain, resid, newaa3, result.total, wt_energy, ddg])
 
-        mut_energy = extract_total_energy(e_csv)
-        ddg = mut_energy - wt_energy
+    scan.close()
 
-        rows.append([variant, chain, resid, newaa3, mut_energy, wt_energy, ddg])
+    variant, chain, residue, mut_aa3, mut_g, wt_g, ddg = zip(*rows)
+    save_table(f"{RESULTS}/variant_ddg.npz", {
+        "variant": np.array(variant, dtype="U16"), "chain": np.array(chain, dtype="U4"),
+        "residue": np.array(residue, dtype=np.int64), "mut_aa3": np.array(mut_aa3, dtype="U3"),
+        "dg_variant": np.array(mut_g, dtype=np.float64), "dg_wt": np.array(wt_g, dtype=np.float64),
+        "ddg": np.array(ddg, dtype=np.float64),
+    })
 
     with open(out_csv, "w", newline="") as f:
         w = csv.writer(f)
@@ -140,7 +118,7 @@ def main():
                     "ΔG_variant (kcal/mol)", "ΔG_WT (kcal/mol)", "ΔΔG_variant (kcal/mol)"])
         w.writerows(rows)
 
-    print(f"\n✅ Variant scan done → {out_csv}")
+    print(f"\n✅ Variant scan done → {out_csv} (database: {RESULTS_DB or 'off'})")
 
 if __name__ == "__main__":
     main()
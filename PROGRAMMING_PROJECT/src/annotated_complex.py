@@ -0,0 +1,188 @@
+"""
+ Array-backed annotated complex (structure of arrays)
+ Coordinates, charges, atom types and residue ASA in flat NumPy arrays,
+ built once from the PDB + PDBQT + NACCESS RSA inputs (or in-process SASA)
+"""
+import numpy as np
+from forcefield import VdwParamset, lj_pair_tables
+from pdb_reader import read_atoms, pdbqt_charges
+from naccess_reader import bound_unbound_asa, bound_unbound_atom_asa
+from sasa import bound_unbound_state, N_POINTS
+
+
+# Constructor fields, in order (also the keys of the on-disk formats)
+FIELDS = ("chain_ids", "xyz", "charge", "atom_type", "atom_name", "element", "res_index",
+          "res_chain", "res_seq", "res_icode", "res_name", "asa_bound", "asa_unbound",
+          "type_names", "type_eps", "type_sig", "type_fsrf", "atom_asa_bound", "atom_asa_unbound")
+
+
+class AnnotatedComplex():
+    ''' Structure-of-arrays container for an annotated complex
+        Atom arrays (n_atoms): xyz, charge, atom_type (index into type_names),
+            atom_name, element, res_index
+        Residue table (n_res): res_chain (index into chain_ids), res_seq, res_icode,
+            res_name, res_start (n_res + 1 atom offsets), asa_bound, asa_unbound
+        Per-type vdW parameters (n_types): type_names, type_eps, type_sig, type_fsrf,
+            and the type x type LJ coefficient tables lj_a, lj_b
+        Per-atom ASA (n_atoms): atom_asa_bound, atom_asa_unbound (NaN when the inputs
+            only give residue ASA)
+        Only atoms with an element symbol are kept (the energy terms skip the others).
+        nbytes: memory of the arrays (about 50 bytes per atom for 6m0j, residue and
+        type tables included)
+    '''
+    def __init__(self, chain_ids, xyz, charge, atom_type, atom_name, element, res_index,
+                 res_chain, res_seq, res_icode, res_name, asa_bound, asa_unbound,
+                 type_names, type_eps, type_sig, type_fsrf, atom_asa_bound=None, atom_asa_unbound=None):
+        self.chain_ids = [str(c) for c in chain_ids]
+        self.xyz = np.asarray(xyz, dtype=np.float32).reshape(-1, 3)
+        self.charge = np.asarray(charge, dtype=np.float32)
+        self.atom_type = np.asarray(atom_type, dtype=np.int16)
+        self.atom_name = np.asarray(atom_name, dtype="S4")
+        self.element = np.asarray(element, dtype="S2")
+        self.res_index = np.asarray(res_index, dtype=np.int32)
+
+        self.res_chain = np.asarray(res_chain, dtype=np.int16)
+        self.res_seq = np.asarray(res_seq, dtype=np.int32)
+        self.res_icode = np.asarray(res_icode, dtype="S1")
+        self.res_name = np.asarray(res_name, dtype="S3")
+        self.asa_bound = np.asarray(asa_bound, dtype=np.float64)
+        self.asa_unbound = np.asarray(asa_unbound, dtype=np.float64)
+        self.res_start = np.searchsorted(self.res_index, np.arange(len(self.res_seq) + 1)).astype(np.int32)
+        n_atoms = len(self.charge)
+        self.atom_asa_bound = np.full(n_atoms, np.nan) if atom_asa_bound is None \
+            else np.asarray(atom_asa_bound, dtype=np.float64)
+        self.atom_asa_unbound = np.full(n_atoms, np.nan) if atom_asa_unbound is None \
+            else np.asarray(atom_asa_unbound, dtype=np.float64)
+
+        self.type_names = [str(t) for t in type_names]
+        self.type_eps = np.asarray(type_eps, dtype=np.float64)
+        self.type_sig = np.asarray(type_sig, dtype=np.float64)
+        self.type_fsrf = np.asarray(type_fsrf, dtype=np.float64)
+        _, _, self.lj_a, self.lj_b = lj_pair_tables(self.type_eps, self.type_sig)
+
+        self.atom_chain = self.res_chain[self.res_index]
+        self._res_lookup = None
+        self._spheres = None
+
+    @property
+    def n_atoms(self):
+        return len(self.charge)
+
+    @property
+    def n_res(self):
+        return len(self.res_seq)
+
+    @property
+    def has_atom_asa(self):
+        return not (np.isnan(self.atom_asa_bound).any() or np.isnan(self.atom_asa_unbound).any())
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+    def fields(self):
+        ''' {field: array} for every constructor field (AnnotatedComplex(**cx.fields()) copies cx) '''
+        return {name: np.asarray(getattr(self, name)) for name in FIELDS}
+
+    def chain_index(self, chain_id):
+        return self.chain_ids.index(chain_id)
+
+    def _chain_mask(self, chain_ids):
+        if isinstance(chain_ids, str):
+            chain_ids = [chain_ids]
+        mask = np.zeros(len(self.chain_ids), dtype=bool)
+        mask[[self.chain_index(c) for c in chain_ids]] = True
+        return mask
+
+    def chain_atoms(self, chain_ids):
+        ''' Atom indices of a chain (or a list of chains) '''
+        return np.flatnonzero(self._chain_mask(chain_ids)[self.atom_chain])
+
+    def chain_residues(self, chain_ids):
+        ''' Residue indices of a chain (or a list of chains) '''
+        return np.flatnonzero(self._chain_mask(chain_ids)[self.res_chain])
+
+    def residue_atoms(self, residues):
+        ''' Atom indices of the given residues and, per atom, its position in residues '''
+        residues = np.asarray(residues, dtype=np.int64)
+        counts = self.res_start[residues + 1] - self.res_start[residues]
+        owner = np.repeat(np.arange(len(residues)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.res_start[residues][owner] + local, owner
+
+    def residue_spheres(self):
+        ''' Per-residue bounding spheres: (centroid (n_res, 3), radius (n_res,)) '''
+        if self._spheres is None:
+            xyz = self.xyz.astype(np.float64)
+            n = np.maximum(np.diff(self.res_start), 1)
+            centroid = np.stack([np.bincount(self.res_index, weights=xyz[:, k], minlength=self.n_res)
+                                 for k in range(3)], axis=1) / n[:, None]
+            radius = np.zeros(self.n_res)
+            np.maximum.at(radius, self.res_index, np.linalg.norm(xyz - centroid[self.res_index], axis=1))
+            self._spheres = (centroid, radius)
+        return self._spheres
+
+    def residue_index(self, chain_id, resseq, icode=" "):
+        ''' Residue index for (chain, resseq, icode), or None '''
+        if self._res_lookup is None:
+            self._res_lookup = {
+                (self.chain_ids[c], int(n), i.decode() or " "): k
+                for k, (c, n, i) in enumerate(zip(self.res_chain, self.res_seq, self.res_icode))
+            }
+        return self._res_lookup.get((chain_id, resseq, icode))
+
+    def residue_key(self, k):
+        ''' (chain, resseq, icode) of residue k '''
+        return (self.chain_ids[self.res_chain[k]], int(self.res_seq[k]),
+                self.res_icode[k].decode() or " ")
+
+
+# ---------------------------
+# Build from PDB + PDBQT + NACCESS RSA (bound complex, unbound chains)
+# ---------------------------
+def load_annotated_complex(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound,
+                           sasa_reference=None, sasa_points=N_POINTS):
+    ''' pdb_file: PDB or mmCIF; rsa_unbound: {chain_id: RSA file of that chain alone}.
+        rsa_complex None: residue ASA computed in process (sasa.py, sasa_points sphere
+        points per atom), every chain unbound;
+        per-atom ASA comes from the same computation, or from the NACCESS .asa files
+        next to the RSA files (NaN when they are missing);
+        sasa_reference: sasa.bound_unbound_state of a related structure (the WT of a
+        mutant), updated locally instead of a full computation
+    '''
+    ff_params = VdwParamset(vdw_file)
+
+    pdb = read_atoms(pdb_file)
+
+    # PDBQT charge/type, joined to the PDB atoms by (chain, resseq, icode, name)
+    qt_charge, qt_type, _ = pdbqt_charges(pdb, pdbqt_file, ff_params.at_types)
+    qt_type = np.array([ff_params.type_index[t] for t in qt_type], dtype=np.int16)
+
+    # Atoms with an element symbol
+    keep = np.flatnonzero(pdb.element != b"")
+
+    chain_ids = pdb.chain_ids()
+    res_first = pdb.res_start[:-1]
+    res_chain = [chain_ids.index(c.decode()) for c in pdb.chain[res_first]]
+    if rsa_complex is None:
+        state = (bound_unbound_state(pdb, n_points=sasa_points) if sasa_reference is None
+                 else sasa_reference.mutant(pdb))
+        asa_bound, asa_unbound, missing_bound, missing_unb = state.bound_unbound()
+        atom_bound, atom_unbound = state.atom_bound_unbound()
+    else:
+        asa_bound, asa_unbound, missing_bound, missing_unb = bound_unbound_asa(
+            rsa_complex, rsa_unbound, pdb.chain[res_first], pdb.res_seq[res_first],
+            pdb.icode[res_first], pdb.hetero[res_first])
+        atom_bound, atom_unbound = bound_unbound_atom_asa(rsa_complex, rsa_unbound, pdb)
+
+    cx = AnnotatedComplex(
+        chain_ids, pdb.xyz[keep], qt_charge[keep], qt_type[keep], pdb.name[keep], pdb.element[keep],
+        pdb.res_index[keep], res_chain, pdb.res_seq[res_first], np.char.strip(pdb.icode[res_first]),
+        pdb.res_name[res_first], asa_bound, asa_unbound,
+        ff_params.type_names, ff_params.eps, ff_params.sig, ff_params.fsrf,
+        atom_asa_bound=atom_bound[keep], atom_asa_unbound=atom_unbound[keep],
+    )
+
+    print(f"Total charge (from PDBQT): {float(np.sum(cx.charge, dtype=np.float64)):.2f} e")
+    print(f"ASA attached (Å^2). Residues={cx.n_res}, missing bound={missing_bound}, missing unbound={missing_unb}")
+    return cx
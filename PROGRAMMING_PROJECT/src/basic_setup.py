@@ -7,9 +7,14 @@
 
 import argparse
 import os
+import numpy as np
 
 from Bio.PDB.PDBParser import PDBParser
+from Bio.PDB.MMCIFParser import MMCIFParser
 from forcefield import VdwParamset
+from compressed_io import open_input
+from pdb_reader import read_atoms, pdbqt_charges, is_cif, biopython_keys, join_keys, residue_key_array
+from naccess_reader import read_asa, residue_totals
 
 parser = argparse.ArgumentParser(
     prog='structure_setup',
@@ -25,7 +30,7 @@ parser.add_argument(
     help='Vdw parameter file'
 )
 
-parser.add_argument('pdb_file', help='Input PDB', type=open)
+parser.add_argument('pdb_file', help='Input PDB or mmCIF', type=open)
 parser.add_argument('pdbqt_file', help='Input PDBQT', type=open)
 parser_pdb = PDBParser(PERMISSIVE=1)
 
@@ -48,51 +53,32 @@ ff_params = VdwParamset(args.vdwprm_file)
 # ---------------------------------------------------------
 
 print('Parsing PDB', args.pdb_file.name)
-st = parser_pdb.get_structure('STR', args.pdb_file.name)
+if is_cif(args.pdb_file.name):
+    parser_pdb = MMCIFParser(QUIET=True)
+with open_input(args.pdb_file.name, 'r') as fh:
+    st = parser_pdb.get_structure('STR', fh)
 
 # ---------------------------------------------------------
-# Parse PDBQT properly (store raw lines instead of broken fixed columns)
+# Parse PDBQT columns and join them to the PDB atoms by
+# (chain, resseq, icode, atom name), so reordered PDBQTs still match
 # ---------------------------------------------------------
 print(f"Parsing PDBQT {args.pdbqt_file.name}")
-params = [{}]  # so that atom serial numbers match index
-
-for line in args.pdbqt_file:
-    line = line.rstrip()
-
-    # Only store ATOM/HETATM lines
-    if line.startswith("ATOM") or line.startswith("HETATM"):
-        params.append({'raw': line})
-
-# ---------------------------------------------------------
-# Fix atom serial numbers so they match PDBQT order
-# ---------------------------------------------------------
-i = 1
-for at in st.get_atoms():
-    at.serial_number = i
-    i += 1
+pdb = read_atoms(args.pdb_file.name)
+qt_charge, qt_type, match = pdbqt_charges(pdb, args.pdbqt_file.name, ff_params.at_types)
+print(f"PDBQT atoms matched: {match['matched']} (missing {match['missing']}, unused {match['unused']})")
 
 # ---------------------------------------------------------
 # Assign charge, atom type, VDW parameters
 # ---------------------------------------------------------
-total_charge = 0.0
+# Biopython atoms / residues joined to the reader's by (chain, resseq, icode[, name])
+st_atoms, st_residues, st_atom_keys, st_res_keys = biopython_keys(st[0])
+atom_index = join_keys(st_atom_keys, pdb.atom_keys())
 
-for at in st.get_atoms():
-
-    # Extract raw PDBQT line for this atom
-    raw = params[at.serial_number]['raw']
-    parts = raw.split()
-
-    # Charge = second-to-last column
-    charge_str = parts[-2]
-    try:
-        charge = float(charge_str)
-    except:
-        charge = 0.0   # fallback for malformed values
+total_charge = 0.0
 
-    # Atom type = last column
-    atom_type = parts[-1]
-    if atom_type not in ff_params.at_types:
-        atom_type = "C"  # safe fallback
+for at, k in zip(st_atoms, atom_index.tolist()):
+    charge = float(qt_charge[k]) if k >= 0 else 0.0
+    atom_type = qt_type[k] if k >= 0 else "C"
 
     at.xtra['charge'] = charge
     at.xtra['atom_type'] = atom_type
@@ -103,106 +89,28 @@ for at in st.get_atoms():
 print(f"Total Charge: {total_charge:8.2f}")
 
 # ---------------------------------------------------------
-# NACCESS residue ASA parsing (from .asa files)
+# NACCESS residue ASA (sum of the atom ASA of the .asa files)
 # ---------------------------------------------------------
-def parse_naccess_asa(path):
-    """
-    Parse NACCESS .asa output and return dict:
-    ASA[(chain_id, resseq, icode)] = asa_value
-
-    Notes:
-    - NACCESS formats can vary slightly. We robustly extract:
-      chain (1 char), residue number (int), insertion code (optional), ASA (float)
-    - We ignore non-residue summary lines.
-    """
-    asa = {}
-    with open(path, "r") as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if not line:
-                continue
-
-            # NACCESS residue lines typically start with "RES"
-            # Example patterns seen in the wild:
-            # "RES GLN A  42   12.34 ..."
-            # "RES GLN A  42A  12.34 ..." (insertion code)
-            if not line.startswith("RES"):
-                continue
-
-            parts = line.split()
-            # Minimum expected fields: RES, RESNAME, CHAIN, RESNUM, ASA
-            # parts[0]=RES, parts[1]=GLN, parts[2]=A, parts[3]=42, parts[4]=12.34
-            if len(parts) < 5:
-                continue
-
-            chain_id = parts[2]
-            resnum_token = parts[3]
-
-            # resnum_token may contain insertion code appended, e.g. "42A"
-            # separate numeric prefix from optional trailing insertion code
-            num_str = ""
-            icode = " "
-            for ch in resnum_token:
-                if ch.isdigit() or (ch == "-" and not num_str):
-                    num_str += ch
-                else:
-                    icode = ch
-                    break
-
-            try:
-                resseq = int(num_str)
-            except ValueError:
-                continue
-
-            try:
-                asa_val = float(parts[4])
-            except ValueError:
-                continue
-
-            asa[(chain_id, resseq, icode)] = asa_val
-
-    return asa
-
-
-# Read ASA for each chain (NACCESS outputs)
 print("Reading NACCESS ASA files...")
-asa_A = parse_naccess_asa(args.asa_chain_A)
-asa_E = parse_naccess_asa(args.asa_chain_E)
-
-# Merge into one lookup dict
-ASA_res = {}
-ASA_res.update(asa_A)
-ASA_res.update(asa_E)
-
-print(f"Loaded ASA entries: chain A = {len(asa_A)}, chain E = {len(asa_E)}")
-
-# Attach residue ASA to the structure (residue-level)
-missing = 0
-total_res = 0
-
-for chain in st[0]:
-    for res in chain:
-        hetflag, resseq, icode = res.id
-        # only standard residues (ignore hetero / waters; should already be removed)
-        if hetflag != " ":
-            continue
-
-        total_res += 1
-        key = (chain.id, resseq, icode if icode else " ")
-        asa_val = ASA_res.get(key, None)
-
-        if asa_val is None:
-            # Allow fallback ignoring insertion code if needed
-            key2 = (chain.id, resseq, " ")
-            asa_val = ASA_res.get(key2, None)
-
-        if asa_val is None:
-            missing += 1
-            res.xtra["ASA_NACCESS"] = 0.0
-        else:
-            res.xtra["ASA_NACCESS"] = asa_val
-
-print(f"Residues in structure: {total_res} | Missing ASA entries: {missing}")
+asa_A = residue_totals(read_asa(args.asa_chain_A))
+asa_E = residue_totals(read_asa(args.asa_chain_E))
+print(f"Loaded ASA entries: chain A = {asa_A.n_res}, chain E = {asa_E.n_res}")
+
+# Attach residue ASA to the structure (residue-level), joined by (chain, resseq, icode)
+res_first = pdb.res_start[:-1]
+res_keys = (pdb.chain[res_first], pdb.res_seq[res_first], pdb.icode[res_first])
+asa_res, found = asa_A.align(*res_keys, column="all_abs")
+asa_res_E, found_E = asa_E.align(*res_keys, column="all_abs")
+asa_res[found_E] = asa_res_E[found_E]
+found |= found_E
+
+standard = ~pdb.hetero[res_first]
+res_index = join_keys(st_res_keys, residue_key_array(*res_keys))
+for res, k in zip(st_residues, res_index.tolist()):
+    if res.id[0] == " ":
+        res.xtra["ASA_NACCESS"] = float(asa_res[k]) if k >= 0 else 0.0
+
+print(f"Residues in structure: {int(standard.sum())} | Missing ASA entries: {int(np.sum(standard & ~found))}")
 
 # Optional: attach residue ASA to atoms for compatibility with existing downstream code.
 # This does NOT create real atom-level ASA; it simply propagates residue ASA to its atoms.
@@ -0,0 +1,148 @@
+"""
+ Streaming mmCIF _atom_site reader
+ Reads the _atom_site loop in chunks of rows, tokenizes each chunk in bulk into
+ NumPy columns and keeps only the selected chains / first model, so large
+ assemblies never need a PDB conversion or a full in-memory token table
+"""
+import shlex
+import numpy as np
+from compressed_io import open_input
+from pdb_reader import PdbAtoms, ATOM_FIELDS, group_chains, select_altloc
+
+# Rows tokenized per chunk
+CHUNK_ROWS = 200000
+
+# PdbAtoms field -> _atom_site items (author numbering first, as PDB files use it)
+COLUMNS = {
+    "record": ("group_PDB",),
+    "serial": ("id",),
+    "name": ("auth_atom_id", "label_atom_id"),
+    "altloc": ("label_alt_id",),
+    "res_name": ("auth_comp_id", "label_comp_id"),
+    "chain": ("auth_asym_id", "label_asym_id"),
+    "res_seq": ("auth_seq_id", "label_seq_id"),
+    "icode": ("pdbx_PDB_ins_code",),
+    "x": ("Cartn_x",),
+    "y": ("Cartn_y",),
+    "z": ("Cartn_z",),
+    "occupancy": ("occupancy",),
+    "bfactor": ("B_iso_or_equiv",),
+    "element": ("type_symbol",),
+    "model": ("pdbx_PDB_model_num",),
+}
+
+# CIF "unknown" / "not applicable" values
+_MISSING = (b"?", b".")
+
+
+def _tokenize(rows, n_items):
+    ''' (n_rows, n_items) token array of _atom_site rows; rows with quoted values (e.g.
+        atom names with primes) are split with shlex, all others in one bulk split
+    '''
+    quoted = np.array([r.find(b"'") >= 0 or r.find(b'"') >= 0 for r in rows], dtype=bool)
+    tokens = np.empty((len(rows), n_items), dtype=object)
+    plain = np.flatnonzero(~quoted)
+    if len(plain):
+        flat = b" ".join([rows[k] for k in plain]).split()
+        if len(flat) != len(plain) * n_items:
+            raise ValueError(f"mmCIF _atom_site rows do not all have {n_items} values")
+        tokens[plain] = np.array(flat, dtype=object).reshape(len(plain), n_items)
+    for k in np.flatnonzero(quoted):
+        tokens[k] = [t.encode() for t in shlex.split(rows[k].decode())]
+    return tokens
+
+
+def _column(tokens, items, name, required=True):
+    for item in COLUMNS[name]:
+        if item in items:
+            return tokens[:, items[item]]
+    if required:
+        raise ValueError(f"mmCIF _atom_site has no {COLUMNS[name][0]} column")
+    return None
+
+
+def _blank_missing(col, blank=b" "):
+    col = col.astype(bytes)
+    return np.where(np.isin(col, _MISSING), blank, col)
+
+
+def _atom_site_chunks(path):
+    ''' Yield ({item: column index}, rows) chunks of the _atom_site loop (bytes rows) '''
+    items = {}
+    rows = []
+    in_loop = False
+    in_rows = False
+    with open_input(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if in_rows:
+                if not line or line.startswith((b"#", b"loop_", b"_", b"data_")):
+                    break
+                rows.append(line)
+                if len(rows) >= CHUNK_ROWS:
+                    yield items, rows
+                    rows = []
+            elif line == b"loop_":
+                in_loop = True
+                items = {}
+            elif in_loop and line.startswith(b"_atom_site."):
+                items[line[len(b"_atom_site."):].decode()] = len(items)
+            elif in_loop and items:
+                in_rows = True
+                rows.append(line)
+            elif in_loop and line.startswith(b"_"):
+                in_loop = False
+    if rows:
+        yield items, rows
+
+
+def read_cif_atoms(path, chains=None, altloc="best", hetatm=True):
+    ''' PdbAtoms of the first model of an mmCIF file (author chain / residue numbering).
+        chains: chain ids to keep (None: all); altloc: "best", a letter, or None (keep all);
+        hetatm: keep HETATM records
+    '''
+    if chains is not None:
+        chains = np.array([c.encode() for c in chains], dtype=object)
+
+    parts = []
+    first_model = None
+    for items, rows in _atom_site_chunks(path):
+        tokens = _tokenize(rows, len(items))
+        keep = np.ones(len(tokens), dtype=bool)
+        if chains is not None:
+            keep &= np.isin(_column(tokens, items, "chain"), chains)
+        if not hetatm:
+            keep &= _column(tokens, items, "record") == b"ATOM"
+        model = _column(tokens, items, "model", required=False)
+        if model is not None and len(model):
+            if first_model is None:
+                first_model = model[0]
+            keep &= model == first_model
+        tokens = tokens[keep]
+
+        xyz = np.stack([_column(tokens, items, c).astype(bytes).astype(np.float64) for c in "xyz"],
+                       axis=1)
+        occupancy = _column(tokens, items, "occupancy", required=False)
+        bfactor = _column(tokens, items, "bfactor", required=False)
+        parts.append({
+            "record": _column(tokens, items, "record").astype(bytes),
+            "serial": _column(tokens, items, "serial").astype(bytes).astype(np.int64),
+            "name": _column(tokens, items, "name").astype(bytes),
+            "altloc": _blank_missing(_column(tokens, items, "altloc")),
+            "res_name": _column(tokens, items, "res_name").astype(bytes),
+            "chain": _column(tokens, items, "chain").astype(bytes),
+            "res_seq": _column(tokens, items, "res_seq").astype(bytes).astype(np.int64),
+            "icode": _blank_missing(_column(tokens, items, "icode")),
+            "xyz": xyz,
+            "occupancy": (np.ones(len(tokens)) if occupancy is None
+                          else _blank_missing(occupancy, b"1.0").astype(np.float64)),
+            "bfactor": (np.zeros(len(tokens)) if bfactor is None
+                        else _blank_missing(bfactor, b"0.0").astype(np.float64)),
+            "element": _blank_missing(_column(tokens, items, "element"), b""),
+        })
+
+    if not parts:
+        raise ValueError(f"No _atom_site loop in {path}")
+    cols = {f: np.concatenate([p[f] for p in parts]) for f in ATOM_FIELDS}
+    atoms = PdbAtoms(*(cols[f] for f in ATOM_FIELDS))
+    return select_altloc(group_chains(atoms), altloc)
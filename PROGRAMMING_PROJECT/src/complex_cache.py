@@ -0,0 +1,111 @@
+"""
+ Persistent cache of annotated complexes (.npz bundles)
+ Keyed by the content hashes of the PDB, PDBQT, vdwprm and RSA inputs (with their
+ NACCESS .asa companions) or the SASA parameters when the ASA is computed in process, so any change
+ to an input invalidates the entry; the cache directory is kept under a size limit (LRU)
+"""
+import hashlib
+import os
+import tempfile
+import numpy as np
+from annotated_complex import AnnotatedComplex, FIELDS, load_annotated_complex
+from naccess_reader import asa_companion
+from sasa import PROBE, N_POINTS
+
+CACHE_VERSION = 3
+DEFAULT_CACHE_DIR = os.environ.get("COMPLEX_CACHE_DIR", os.path.join(".cache", "complexes"))
+DEFAULT_MAX_BYTES = int(float(os.environ.get("COMPLEX_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound, sasa_points=N_POINTS):
+    ''' Hash of the input contents (not names/paths) and the unbound chain assignment '''
+    h = hashlib.sha256(f"annotated-complex-v{CACHE_VERSION}".encode())
+    for path in (pdb_file, pdbqt_file, vdw_file):
+        h.update(file_hash(path).encode())
+    if rsa_complex is None:
+        h.update(f"sasa:{PROBE}:{sasa_points}".encode())
+        return h.hexdigest()
+    for chain_id, path in [("", rsa_complex)] + sorted(rsa_unbound.items()):
+        h.update(chain_id.encode())
+        h.update(file_hash(path).encode())
+        asa_path = asa_companion(path)
+        h.update(b"-" if asa_path is None else file_hash(asa_path).encode())
+    return h.hexdigest()
+
+
+def save_complex_npz(cx, path):
+    ''' Write cx atomically (temp file + rename), so concurrent readers never see partial files '''
+    out_dir = os.path.dirname(path) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **cx.fields())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_complex_npz(path):
+    with np.load(path) as data:
+        return AnnotatedComplex(**{name: data[name] for name in FIELDS})
+
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    ''' Remove least recently used bundles until the directory fits in max_bytes '''
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            st = os.stat(os.path.join(cache_dir, name))
+            entries.append((st.st_mtime, st.st_size, name))
+    entries.sort()
+    total = sum(e[1] for e in entries)
+    removed = 0
+    for _, size, name in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def load_annotated_complex_cached(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound,
+                                  cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                                  sasa_reference=None, sasa_points=N_POINTS):
+    ''' load_annotated_complex through the cache (cache_dir None/"" disables it); an
+        incremental SASA (sasa_reference) gives the same complex, so it shares the key
+    '''
+    if not cache_dir:
+        return load_annotated_complex(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound,
+                                      sasa_reference, sasa_points)
+
+    key = cache_key(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound, sasa_points)
+    path = os.path.join(cache_dir, key + ".npz")
+    if os.path.exists(path):
+        try:
+            cx = load_complex_npz(path)
+            os.utime(path)  # LRU: mark as recently used
+            return cx
+        except (OSError, KeyError, ValueError):
+            pass  # unreadable bundle: rebuild it
+
+    cx = load_annotated_complex(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound,
+                                sasa_reference, sasa_points)
+    save_complex_npz(cx, path)
+    evict(cache_dir, max_bytes)
+    return cx
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+ Memory-mapped on-disk format for annotated complexes
+ A directory with one .npy file per AnnotatedComplex array and a small header.json;
+ opening maps the arrays read-only (np.load mmap_mode="r"), so it costs no parsing
+ and worker processes share the same page-cache pages
+
+ Convert a PDB/PDBQT/RSA set:
+   python src/complex_store.py data/6m0j_prepared.pdb data/6m0j_prepared.pdbqt -o data/6m0j_prepared.cx
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from annotated_complex import AnnotatedComplex, FIELDS
+
+FORMAT = "annotated-complex"
+FORMAT_VERSION = 1
+HEADER = "header.json"
+
+# Small per-chain / per-type name lists live in the header, not in .npy files
+_HEADER_FIELDS = ("chain_ids", "type_names")
+
+
+def is_complex_dir(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, HEADER))
+
+
+def save_complex_dir(cx, path, sources=None):
+    ''' Write cx as a complex directory (built next to path, then renamed into place).
+        sources: optional {role: file} of the inputs, recorded in the header
+    '''
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, suffix=".tmp")
+    try:
+        arrays = {}
+        for name in FIELDS:
+            if name in _HEADER_FIELDS:
+                continue
+            arr = np.ascontiguousarray(getattr(cx, name))
+            np.save(os.path.join(tmp, name + ".npy"), arr)
+            arrays[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape)}
+
+        header = {
+            "format": FORMAT,
+            "version": FORMAT_VERSION,
+            "n_atoms": cx.n_atoms,
+            "n_res": cx.n_res,
+            "chain_ids": cx.chain_ids,
+            "type_names": cx.type_names,
+            "arrays": arrays,
+            "sources": sources or {},
+        }
+        with open(os.path.join(tmp, HEADER), "w") as f:
+            json.dump(header, f, indent=1)
+        os.chmod(tmp, 0o755)
+
+        if os.path.exists(path):
+            old = tmp + ".old"
+            os.replace(path, old)
+            os.replace(tmp, path)
+            shutil.rmtree(old)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def open_complex_dir(path, mmap_mode="r"):
+    ''' AnnotatedComplex backed by read-only memory maps of a complex directory
+        (mmap_mode=None reads the arrays into memory instead)
+    '''
+    with open(os.path.join(path, HEADER)) as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT or header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: not a {FORMAT} v{FORMAT_VERSION} directory")
+
+    fields = {name: header[name] for name in _HEADER_FIELDS}
+    for name in header["arrays"]:
+        fields[name] = np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+    return AnnotatedComplex(**fields)
+
+
+def main():
+    # defaults of the energy script (imported here: int_energies_AE imports this module)
+    from int_energies_AE import DEFAULT_VDW, DEFAULT_RSA_COMPLEX, DEFAULT_RSA_UNBOUND
+    from annotated_complex import load_annotated_complex
+
+    parser = argparse.ArgumentParser(
+        description="Convert a PDB (or mmCIF) + PDBQT + NACCESS RSA set into a memory-mapped complex directory."
+    )
+    parser.add_argument("pdb", help="Input PDB or mmCIF")
+    parser.add_argument("pdbqt", help="Input PDBQT (charges / AutoDock types)")
+    parser.add_argument("-o", "--output", required=True, help="Output directory (e.g. data/6m0j_prepared.cx)")
+    parser.add_argument("--vdw", default=DEFAULT_VDW, help="Vdw parameter file")
+    parser.add_argument("--rsa", default=DEFAULT_RSA_COMPLEX, help="NACCESS .rsa of the complex")
+    parser.add_argument(
+        "--rsa-unbound", nargs="*", metavar="CHAIN=RSA",
+        default=[f"{c}={p}" for c, p in DEFAULT_RSA_UNBOUND.items()],
+        help="NACCESS .rsa of each chain alone (default: chains A and E)"
+    )
+    args = parser.parse_args()
+
+    rsa_unbound = dict(item.split("=", 1) for item in args.rsa_unbound)
+    cx = load_annotated_complex(args.pdb, args.pdbqt, args.vdw, args.rsa, rsa_unbound)
+    sources = {"pdb": args.pdb, "pdbqt": args.pdbqt, "vdw": args.vdw, "rsa_complex": args.rsa}
+    sources.update({f"rsa_{c}": p for c, p in rsa_unbound.items()})
+    save_complex_dir(cx, args.output, sources)
+    print(f"Wrote {args.output} ({cx.n_atoms} atoms, {cx.n_res} residues, {cx.nbytes / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+ Transparent compressed file access
+ Inputs are decompressed on the fly when they start with gzip, bzip2 or xz magic bytes
+ (whatever their name); outputs are compressed when the name ends in .gz / .bz2 / .xz
+"""
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+
+# (magic bytes, opener), checked in order
+_MAGIC = (
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+)
+
+# output suffix -> opener
+_SUFFIXES = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+COMPRESSIONS = tuple(s[1:] for s in _SUFFIXES)
+
+
+def _opener_for_input(path):
+    with open(path, "rb") as f:
+        head = f.read(6)
+    for magic, opener in _MAGIC:
+        if head.startswith(magic):
+            return opener
+    return None
+
+
+def open_input(path, mode="rb"):
+    ''' Open a file for reading ("rb" or "r"/"rt"), decompressing it as a stream if needed '''
+    opener = _opener_for_input(path)
+    if opener is None:
+        return open(path, mode)
+    if "b" not in mode:
+        return opener(path, "rt")
+    return opener(path, "rb")
+
+
+def open_output(path, mode="wb"):
+    ''' Open a file for writing ("wb" or "w"/"wt"), compressed by its .gz / .bz2 / .xz suffix '''
+    opener = _SUFFIXES.get(os.path.splitext(str(path))[1].lower())
+    if opener is None:
+        return open(path, mode)
+    if "b" not in mode:
+        return opener(path, "wt")
+    return opener(path, "wb")
+
+
+def strip_compression_suffix(path):
+    ''' path without a trailing .gz / .bz2 / .xz '''
+    root, ext = os.path.splitext(str(path))
+    return root if ext.lower() in _SUFFIXES else str(path)
+
+
+def compressed_name(path, compression):
+    ''' path with the suffix of compression ("gz", "bz2", "xz"; "" or None: unchanged) '''
+    if not compression:
+        return path
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}' ({', '.join(COMPRESSIONS)})")
+    return f"{path}.{compression}"
+
+
+def compress_file(path, compression):
+    ''' Replace path by a compressed copy (path.gz etc.); returns the new name '''
+    out = compressed_name(path, compression)
+    if out == path:
+        return path
+    with open(path, "rb") as src, open_output(out, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.remove(path)
+    return out
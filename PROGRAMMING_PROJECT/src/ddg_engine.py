@@ -0,0 +1,150 @@
+"""
+ Incremental ΔΔG engine for point mutants
+ Keeps the WT residue x residue energy / contact matrices and per-residue solvation
+ in memory and, for a mutant, only recomputes the rows/columns of residues whose atoms changed
+"""
+import numpy as np
+from int_energies_AE import (InterfaceEnergies, interaction_energies, delta_solvation,
+                             residue_pair_table, CUTOFF_CONTACT, CUTOFF_ENERGY, MEMORY_MB,
+                             SOLVATION_MODEL, SOLVATION_ATOMS)
+
+
+def changed_residues(wt, mut):
+    ''' Residue indices whose atoms (count, coordinates, charge or type) differ between
+        two complexes with the same residue table
+    '''
+    if mut.n_res != wt.n_res or np.any(mut.res_seq != wt.res_seq) or np.any(mut.res_chain != wt.res_chain):
+        raise ValueError("Mutant and WT complexes must have the same residue table")
+
+    n_wt = np.diff(wt.res_start)
+    n_mut = np.diff(mut.res_start)
+    changed = n_wt != n_mut
+
+    same = np.flatnonzero(~changed)
+    at_wt, owner = wt.residue_atoms(same)
+    at_mut, _ = mut.residue_atoms(same)
+    diff = (np.any(wt.xyz[at_wt] != mut.xyz[at_mut], axis=1)
+            | (wt.charge[at_wt] != mut.charge[at_mut])
+            | (wt.atom_type[at_wt] != mut.atom_type[at_mut]))
+    changed[same[np.unique(owner[diff])]] = True
+    return np.flatnonzero(changed)
+
+
+def atom_asa_changed(wt, mut, residues):
+    ''' Those of residues (same atom count in both complexes) whose per-atom ASA differs '''
+    residues = np.asarray(residues, dtype=np.int64)
+    at_wt, owner = wt.residue_atoms(residues)
+    at_mut, _ = mut.residue_atoms(residues)
+    diff = np.zeros(len(at_wt), dtype=bool)
+    for a, b in ((wt.atom_asa_bound, mut.atom_asa_bound), (wt.atom_asa_unbound, mut.atom_asa_unbound)):
+        a, b = a[at_wt], b[at_mut]
+        diff |= (a != b) & ~(np.isnan(a) & np.isnan(b))
+    return residues[np.unique(owner[diff])]
+
+
+class InterfaceDdgEngine():
+    ''' WT chain_1 x chain_2 residue matrices (elec, vdw, min distance) over whole chains,
+        plus per-residue ΔG_solv (solvation_model: "residue" or "atom", solvation_atoms: the
+        atom class the atom model counts); mutants are scored by patching the changed rows/columns
+    '''
+    def __init__(self, wt_cx, chain_1="A", chain_2="E",
+                 cutoff_contact=CUTOFF_CONTACT, cutoff_energy=CUTOFF_ENERGY, memory_mb=MEMORY_MB,
+                 solvation_model=SOLVATION_MODEL, solvation_atoms=SOLVATION_ATOMS):
+        self.wt_cx = wt_cx
+        self.chain_1 = chain_1
+        self.chain_2 = chain_2
+        self.cutoff_contact = cutoff_contact
+        self.cutoff_energy = cutoff_energy
+        self.memory_mb = memory_mb
+        self.solvation_model = solvation_model
+        self.solvation_atoms = solvation_atoms
+
+        self.res_1 = wt_cx.chain_residues(chain_1)
+        self.res_2 = wt_cx.chain_residues(chain_2)
+        # complex residue index -> row (chain_1) / column (chain_2), -1 elsewhere
+        self.row = np.full(wt_cx.n_res, -1, dtype=np.int64)
+        self.col = np.full(wt_cx.n_res, -1, dtype=np.int64)
+        self.row[self.res_1] = np.arange(len(self.res_1))
+        self.col[self.res_2] = np.arange(len(self.res_2))
+
+        self.elec, self.vdw, self.dmin = self._block(wt_cx, self.res_1, self.res_2)
+        self.dsolv = delta_solvation(wt_cx, model=solvation_model, atom_class=solvation_atoms)
+        self.wt = self._result(wt_cx, self.elec, self.vdw, self.dmin, self.dsolv)
+
+    def _block(self, cx, res_a, res_b):
+        ''' (elec, vdw, min distance) matrices between two residue sets of cx '''
+        row = np.full(cx.n_res, -1, dtype=np.int64)
+        col = np.full(cx.n_res, -1, dtype=np.int64)
+        row[res_a] = np.arange(len(res_a))
+        col[res_b] = np.arange(len(res_b))
+
+        t1, t2, d, e, v = residue_pair_table(cx, cx.residue_atoms(res_a)[0], cx.residue_atoms(res_b)[0],
+                                             cutoff_contact=self.cutoff_contact,
+                                             cutoff_energy=self.cutoff_energy,
+                                             memory_mb=self.memory_mb)
+        shape = (len(res_a), len(res_b))
+        elec, vdw, dmin = np.zeros(shape), np.zeros(shape), np.full(shape, np.inf)
+        idx = (row[t1], col[t2])
+        elec[idx], vdw[idx], dmin[idx] = e, v, d
+        return elec, vdw, dmin
+
+    def _result(self, cx, elec, vdw, dmin, dsolv):
+        contact = dmin < self.cutoff_contact
+        iface_1 = np.flatnonzero(contact.any(axis=1))
+        iface_2 = np.flatnonzero(contact.any(axis=0))
+        sel = np.ix_(iface_1, iface_2)
+        return InterfaceEnergies(cx, self.chain_1, self.chain_2,
+                                 self.res_1[iface_1], self.res_2[iface_2],
+                                 elec[sel], vdw[sel], dsolv)
+
+    def score(self, mut_cx, changed=None):
+        ''' InterfaceEnergies of a mutant complex (same residue table as WT).
+            changed: residue indices to recompute (default: detected with changed_residues)
+        '''
+        if changed is None:
+            try:
+                changed = changed_residues(self.wt_cx, mut_cx)
+            except ValueError:
+                # residues added/removed (e.g. rebuilt by an external tool): full evaluation
+                return interaction_energies(mut_cx, self.chain_1, self.chain_2,
+                                            cutoff_contact=self.cutoff_contact,
+                                            cutoff_energy=self.cutoff_energy,
+                                            memory_mb=self.memory_mb,
+                                            solvation_model=self.solvation_model,
+                                            solvation_atoms=self.solvation_atoms)
+        changed = np.asarray(changed, dtype=np.int64)
+
+        elec, vdw, dmin = self.elec.copy(), self.vdw.copy(), self.dmin.copy()
+        rows = changed[self.row[changed] >= 0]
+        cols = changed[self.col[changed] >= 0]
+        if len(rows):
+            e, v, d = self._block(mut_cx, rows, self.res_2)
+            elec[self.row[rows]], vdw[self.row[rows]], dmin[self.row[rows]] = e, v, d
+        if len(cols):
+            e, v, d = self._block(mut_cx, self.res_1, cols)
+            elec[:, self.col[cols]], vdw[:, self.col[cols]], dmin[:, self.col[cols]] = e, v, d
+
+        # Solvation: only residues with changed atoms or changed (residue / atom) ASA
+        dsolv = self.dsolv.copy()
+        solv_changed = np.union1d(changed, np.flatnonzero(
+            (mut_cx.asa_bound != self.wt_cx.asa_bound) | (mut_cx.asa_unbound != self.wt_cx.asa_unbound)))
+        if self.solvation_model == "atom":
+            same = np.setdiff1d(np.arange(mut_cx.n_res), changed)
+            solv_changed = np.union1d(solv_changed, atom_asa_changed(self.wt_cx, mut_cx, same))
+        if len(solv_changed):
+            dsolv[solv_changed] = delta_solvation(mut_cx, solv_changed, self.solvation_model,
+                                                  self.solvation_atoms)
+
+        return self._result(mut_cx, elec, vdw, dmin, dsolv)
+
+    def ddg(self, mut_cx, changed=None):
+        ''' ΔΔG = ΔG_mutant - ΔG_WT (kcal/mol) '''
+        return self.score(mut_cx, changed).total - self.wt.total
+
+    def check(self, mut_cx):
+        ''' |incremental - full| total for a mutant (sanity check against interaction_energies) '''
+        full = interaction_energies(mut_cx, self.chain_1, self.chain_2,
+                                    cutoff_contact=self.cutoff_contact, cutoff_energy=self.cutoff_energy,
+                                    memory_mb=self.memory_mb, solvation_model=self.solvation_model,
+                                    solvation_atoms=self.solvation_atoms)
+        return abs(self.score(mut_cx).total - full.total)
@@ -0,0 +1,27 @@
+"""
+ Vectorized pair-energy kernels (Coulomb + Lennard-Jones)
+ Same functional forms as coulomb_energy / lennard_jones_energy in int_energies_AE.py,
+ evaluated on charge / type-index / distance arrays of neighbour pairs instead of Biopython atoms
+"""
+import numpy as np
+
+K_ELEC = 332.0636
+EPS_R = 80.0
+
+
+def pair_energies(q_i, t_i, q_j, t_j, r, lj_a, lj_b, k_elec=K_ELEC, eps_r=EPS_R):
+    ''' Elementwise elec and vdW energies for atom pairs at distance r (broadcasts).
+        lj_a / lj_b are the type x type tables of forcefield.lj_pair_tables.
+        r == 0 pairs contribute 0, as in the reference functions.
+    '''
+    q_i = np.asarray(q_i, dtype=np.float64)
+    nonzero = r > 0.0
+    r_safe = np.where(nonzero, r, 1.0)
+
+    elec = k_elec * q_i * q_j / (eps_r * r_safe)
+
+    inv6 = r_safe ** -6
+    vdw = (lj_a[t_i, t_j] * inv6 - lj_b[t_i, t_j]) * inv6
+
+    return np.where(nonzero, elec, 0.0), np.where(nonzero, vdw, 0.0)
+
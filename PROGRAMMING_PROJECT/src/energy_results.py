@@ -0,0 +1,156 @@
+"""
+ Typed interaction-energy results
+ Per-residue terms and interface totals as named NumPy columns in .npz files; one
+ file holds any number of scored structures (e.g. a whole scan) and loads in one
+ call. CSV stays available as an export (InterfaceEnergies.write_csv)
+"""
+import csv
+import os
+import numpy as np
+
+RESULTS_FORMAT = "interface-energies"
+RESULTS_VERSION = 1
+
+# Per-residue columns (one row per interface residue, side 1 first)
+RESIDUE_COLUMNS = (
+    ("chain", "U4"),
+    ("residue", np.int64),
+    ("elec", np.float64),
+    ("vdw", np.float64),
+    ("solv", np.float64),
+    ("total", np.float64),
+)
+
+# Per-structure columns (one row per scored structure)
+TOTAL_COLUMNS = (
+    ("tag", "U64"),
+    ("side_1", "U64"),
+    ("side_2", "U64"),
+    ("elec", np.float64),
+    ("vdw", np.float64),
+    ("solv", np.float64),
+    ("total", np.float64),
+)
+
+
+def _typed(columns, schema):
+    return {name: np.asarray(columns[name], dtype=dtype) for name, dtype in schema}
+
+
+def save_table(path, columns):
+    ''' Write {name: 1-D array} as an .npz file (directory created if needed) '''
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez(f, **columns)
+
+
+def load_table(path):
+    ''' {name: array} of an .npz table '''
+    with np.load(path, allow_pickle=False) as z:
+        return {name: z[name] for name in z.files}
+
+
+class ResultSet():
+    ''' Interface energies of one or more structures
+        totals: TOTAL_COLUMNS arrays (n)
+        residues: RESIDUE_COLUMNS arrays of all structures, concatenated;
+            rows offsets[i]:offsets[i+1] belong to structure i
+    '''
+    def __init__(self, totals, residues, offsets):
+        self.totals = _typed(totals, TOTAL_COLUMNS)
+        self.residues = _typed(residues, RESIDUE_COLUMNS)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.totals["tag"])
+
+    @property
+    def tags(self):
+        return self.totals["tag"]
+
+    def index(self, tag):
+        hit = np.flatnonzero(self.totals["tag"] == tag)
+        if len(hit) == 0:
+            raise KeyError(f"No result tagged '{tag}'")
+        return int(hit[0])
+
+    def total(self, tag):
+        return float(self.totals["total"][self.index(tag)])
+
+    def residue_columns(self, i=0):
+        ''' RESIDUE_COLUMNS arrays of structure i (an index or a tag) '''
+        if isinstance(i, str):
+            i = self.index(i)
+        s = slice(self.offsets[i], self.offsets[i + 1])
+        return {name: col[s] for name, col in self.residues.items()}
+
+    def residue_tags(self):
+        ''' Tag of every residue row '''
+        return np.repeat(self.totals["tag"], np.diff(self.offsets))
+
+
+def result_set(results, tags=None):
+    ''' ResultSet of InterfaceEnergies objects (tags default to "0", "1", ...) '''
+    results = list(results)
+    if tags is None:
+        tags = [str(i) for i in range(len(results))]
+    parts = [r.residue_columns() for r in results]
+    residues = {name: np.concatenate([np.asarray(p[name], dtype=dtype) for p in parts])
+                if parts else np.zeros(0, dtype=dtype)
+                for name, dtype in RESIDUE_COLUMNS}
+    offsets = np.concatenate([[0], np.cumsum([len(p["residue"]) for p in parts], dtype=np.int64)])
+    totals = {
+        "tag": list(tags),
+        "side_1": [r.side_label(1) for r in results],
+        "side_2": [r.side_label(2) for r in results],
+        "elec": [r.elec for r in results],
+        "vdw": [r.vdw for r in results],
+        "solv": [r.solv for r in results],
+        "total": [r.total for r in results],
+    }
+    return ResultSet(totals, residues, offsets)
+
+
+def save_results(path, results, tags=None):
+    ''' Write InterfaceEnergies objects (or a ResultSet) to one .npz file '''
+    rs = results if isinstance(results, ResultSet) else result_set(results, tags)
+    columns = {"format": np.array(RESULTS_FORMAT), "version": np.array(RESULTS_VERSION),
+               "offsets": rs.offsets}
+    columns.update({f"total_{name}": col for name, col in rs.totals.items()})
+    columns.update({f"res_{name}": col for name, col in rs.residues.items()})
+    save_table(path, columns)
+
+
+def load_results(path):
+    ''' ResultSet of an .npz written by save_results '''
+    z = load_table(path)
+    if str(z.get("format")) != RESULTS_FORMAT or int(z.get("version", -1)) != RESULTS_VERSION:
+        raise ValueError(f"{path}: not a {RESULTS_FORMAT} v{RESULTS_VERSION} file")
+    return ResultSet({name: z[f"total_{name}"] for name, _ in TOTAL_COLUMNS},
+                     {name: z[f"res_{name}"] for name, _ in RESIDUE_COLUMNS},
+                     z["offsets"])
+
+
+def read_results_csv(path, tag=""):
+    ''' ResultSet of a CSV written by InterfaceEnergies.write_csv (to convert older results) '''
+    residues = {name: [] for name, _ in RESIDUE_COLUMNS}
+    totals = None
+    with open(path, newline="") as f:
+        rows = csv.reader(f)
+        next(rows)
+        for row in rows:
+            if not row:
+                continue
+            if row[0].startswith("TOTAL("):
+                side_1, side_2 = row[0][len("TOTAL("):-1].split("–")
+                totals = {"tag": [tag], "side_1": [side_1], "side_2": [side_2]}
+                totals.update({name: [float(v)] for name, v in zip(("elec", "vdw", "solv", "total"), row[2:6])})
+                continue
+            for (name, _), v in zip(RESIDUE_COLUMNS, row):
+                residues[name].append(v)
+    if totals is None:
+        raise ValueError(f"{path}: no TOTAL row")
+    return ResultSet(totals, {name: np.asarray(residues[name]).astype(dtype) for name, dtype in RESIDUE_COLUMNS},
+                     [0, len(residues["residue"])])
@@ -3,6 +3,8 @@
  uses modified CMIP vdwprm file
 """
 import sys
+import numpy as np
+from compressed_io import open_input
 
 class VdwParamset():
     ''' Class to hold VdW parameters 
@@ -11,7 +13,7 @@ class VdwParamset():
     def __init__ (self, file_name):
         self.at_types = {}
         try:
-            fh = open(file_name, "r")
+            fh = open_input(file_name, "r")
         except OSError:
             print ("#ERROR parameter file not found or not readable (", file_name, ")")
             sys.exit(2)
@@ -22,6 +24,32 @@ class VdwParamset():
             self.at_types[data[0]] = AtomType(data)
         self.ntypes = len(self.at_types)
         fh.close()
+        self._build_tables()
+
+    def _build_tables(self):
+        ''' Per-type arrays and dense type x type LJ tables, indexed by type_index '''
+        self.type_names = list(self.at_types)
+        self.type_index = {name: i for i, name in enumerate(self.type_names)}
+        types = list(self.at_types.values())
+        self.eps  = np.array([t.eps for t in types])
+        self.sig  = np.array([t.sig for t in types])
+        self.mass = np.array([t.mass for t in types])
+        self.fsrf = np.array([t.fsrf for t in types])
+        self.rvdw = np.array([t.rvdw for t in types])
+        self.eps_ij, self.sig_ij, self.lj_a, self.lj_b = lj_pair_tables(self.eps, self.sig)
+
+
+def lj_pair_tables(eps, sig):
+    ''' Combined type x type parameters (Lorentz-Berthelot):
+        eps_ij = sqrt(eps_i*eps_j), sig_ij = (sig_i+sig_j)/2,
+        and the coefficients of E = A/r^12 - B/r^6: A = 4 eps_ij sig_ij^12, B = 4 eps_ij sig_ij^6
+    '''
+    eps = np.asarray(eps, dtype=np.float64)
+    sig = np.asarray(sig, dtype=np.float64)
+    eps_ij = np.sqrt(np.outer(eps, eps))
+    sig_ij = 0.5 * (sig[:, None] + sig[None, :])
+    sig6 = sig_ij ** 6
+    return eps_ij, sig_ij, 4.0 * eps_ij * sig6 * sig6, 4.0 * eps_ij * sig6
 
 class AtomType():
     ''' Class to hold Atomic parameters '''
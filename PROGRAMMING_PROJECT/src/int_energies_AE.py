@@ -2,90 +2,41 @@
 import os
 import csv
 import math
-from Bio.PDB import PDBParser
+import numpy as np
+from Bio.PDB import PDBParser, MMCIFParser
 from forcefield import VdwParamset
+from complex_cache import load_annotated_complex_cached, DEFAULT_CACHE_DIR
+from complex_store import is_complex_dir, open_complex_dir
+from compressed_io import open_input
+from energy_kernels import pair_energies
+from energy_results import RESIDUE_COLUMNS, save_results
+from neighbors import cross_pairs, cross_pairs_blocks, max_candidates_for
+from pdb_reader import read_atoms, pdbqt_charges, is_cif, biopython_keys, join_keys
+from sasa import column_atoms, ATOM_CLASSES, N_POINTS, FAST_POINTS
 
 
 # ---------------------------
-# NACCESS RSA parsing (RES lines)
-# Uses "Non-polar ABS" column (index 8)
+# Load and annotate Biopython structure (reference mode): charges/types/vdw
 # ---------------------------
-def parse_naccess_rsa(path):
-    asa = {}
-    with open(path, "r") as f:
-        for line in f:
-            if not line.startswith("RES"):
-                continue
-            parts = line.split()
-            if len(parts) < 10:
-                continue
-
-            chain_id = parts[2]
-            resnum_token = parts[3]
-
-            num_str = ""
-            icode = " "
-            for ch in resnum_token:
-                if ch.isdigit() or (ch == "-" and not num_str):
-                    num_str += ch
-                else:
-                    icode = ch
-                    break
-
-            try:
-                resseq = int(num_str)
-            except ValueError:
-                continue
-
-            try:
-                asa_val = float(parts[8])  # Non-polar ABS
-            except ValueError:
-                continue
-
-            asa[(chain_id, resseq, icode)] = asa_val
-
-    return asa
-
-
-# ---------------------------
-# Load and annotate structure: charges/types/vdw + ASA (bound & unbound)
-# ---------------------------
-def load_annotated_structure(pdb_file, pdbqt_file, vdw_file,
-                            rsa_complex, rsa_chainA, rsa_chainE):
+def load_annotated_structure(pdb_file, pdbqt_file, vdw_file):
     ff_params = VdwParamset(vdw_file)
 
-    parser = PDBParser(PERMISSIVE=1)
-    st = parser.get_structure("STR", pdb_file)
-
-    # Read PDBQT lines (ATOM/HETATM)
-    params = [{}]
-    with open(pdbqt_file) as f:
-        for line in f:
-            line = line.rstrip()
-            if line.startswith("ATOM") or line.startswith("HETATM"):
-                params.append({"raw": line})
+    parser = MMCIFParser(QUIET=True) if is_cif(pdb_file) else PDBParser(PERMISSIVE=1)
+    with open_input(pdb_file, "r") as fh:
+        st = parser.get_structure("STR", fh)
 
-    # Force serial numbers to match PDBQT order
-    i = 1
-    for at in st.get_atoms():
-        at.serial_number = i
-        i += 1
+    # PDBQT charge/type of the fixed-column reader's atoms, joined by (chain, resseq, icode, name);
+    # the Biopython atoms and residues are joined to those by the same keys
+    pdb = read_atoms(pdb_file)
+    qt_charge, qt_type, _ = pdbqt_charges(pdb, pdbqt_file, ff_params.at_types)
+    st_atoms, st_residues, st_atom_keys, st_res_keys = biopython_keys(st[0])
+    atom_index = join_keys(st_atom_keys, pdb.atom_keys())
 
-    # Assign charge/type/vdw
+    # Assign charge/type/vdw (atoms the reader does not list: charge 0, type C, as unmatched PDBQT atoms)
     total_charge = 0.0
-    for at in st.get_atoms():
-        raw = params[at.serial_number]["raw"]
-        parts = raw.split()
-
-        try:
-            charge = float(parts[-2])
-        except Exception:
-            charge = 0.0
-
-        atom_type = parts[-1]
-        if atom_type not in ff_params.at_types:
-            atom_type = "C"
-
+    for at, k in zip(st_atoms, atom_index.tolist()):
+        charge = float(qt_charge[k]) if k >= 0 else 0.0
+        atom_type = qt_type[k] if k >= 0 else "C"
         at.xtra["charge"] = charge
         at.xtra["atom_type"] = atom_type
         at.xtra["vdw"] = ff_params.at_types[atom_type]
@@ -94,54 +45,6 @@ def load_annotated_structure(pdb_file, pdbqt_file, vdw_file,
 
     print(f"Total charge (from PDBQT): {total_charge:.2f} e")
 
-    # Load RSA: bound (complex) and unbound (chains)
-    asa_complex = parse_naccess_rsa(rsa_complex)
-    asa_A_unb   = parse_naccess_rsa(rsa_chainA)
-    asa_E_unb   = parse_naccess_rsa(rsa_chainE)
-
-    # Attach residue ASA
-    missing_bound = 0
-    missing_unb = 0
-    total_res = 0
-
-    model = st[0]
-    for chain in model:
-        for res in chain:
-            hetflag, resseq, icode = res.id
-            if hetflag != " ":
-                continue
-
-            total_res += 1
-            key = (chain.id, resseq, icode if icode else " ")
-
-            # bound ASA (complex RSA)
-            asa_b = asa_complex.get(key)
-            if asa_b is None:
-                asa_b = asa_complex.get((chain.id, resseq, " "))
-            if asa_b is None:
-                missing_bound += 1
-                asa_b = 0.0
-
-            # unbound ASA (chain RSA)
-            if chain.id == "A":
-                asa_u = asa_A_unb.get(key)
-                if asa_u is None:
-                    asa_u = asa_A_unb.get((chain.id, resseq, " "))
-            elif chain.id == "E":
-                asa_u = asa_E_unb.get(key)
-                if asa_u is None:
-                    asa_u = asa_E_unb.get((chain.id, resseq, " "))
-            else:
-                asa_u = 0.0
-
-            if asa_u is None:
-                missing_unb += 1
-                asa_u = 0.0
-
-            res.xtra["ASA_BOUND"] = asa_b
-            res.xtra["ASA_UNBOUND"] = asa_u
-
-    print(f"ASA attached (Å^2). Residues={total_res}, missing bound={missing_bound}, missing unbound={missing_unb}")
     return st
 
 
@@ -191,162 +94,497 @@ def residue_pair_energy(resA, resE, cutoff=8.0):
     return E_elec, E_vdw
 
 
-def solvation_energy_residue(res, asa_key):
-    asa_res = res.xtra.get(asa_key, 0.0)
-    atoms = [at for at in res if at.element.strip()]
-    if not atoms or asa_res == 0.0:
-        return 0.0
-
-    sum_fsrf = 0.0
-    for at in atoms:
-        sum_fsrf += at.xtra["vdw"].fsrf
-
-    asa_per_atom = asa_res / len(atoms)
-    return sum_fsrf * asa_per_atom
+def reference_energy_matrix(residues_A, residues_E, cutoff=8.0, pairs=None):
+    """Residue x residue (elec, vdw) with the per-atom reference functions.
+    pairs: optional (i, j, inside) residue-pair list (positions in residues_A / residues_E)
+    from cull_residue_pairs; other pairs are skipped, inside pairs need no cutoff test.
+    """
+    elec = np.zeros((len(residues_A), len(residues_E)))
+    vdw = np.zeros((len(residues_A), len(residues_E)))
+    if pairs is None:
+        pairs = [(i, j, False) for i in range(len(residues_A)) for j in range(len(residues_E))]
+    else:
+        pairs = zip(*pairs)
+    for i, j, inside in pairs:
+        elec[i, j], vdw[i, j] = residue_pair_energy(residues_A[i], residues_E[j],
+                                                    cutoff=math.inf if inside else cutoff)
+    return elec, vdw
 
 
-def delta_solvation_residue(res):
-    return solvation_energy_residue(res, "ASA_BOUND") - solvation_energy_residue(res, "ASA_UNBOUND")
+# ---------------------------
+# Residue bounding-sphere culling
+# ---------------------------
+def cull_residue_pairs(cx, res_1, res_2, cutoff, stats=None):
+    """Residue pairs whose bounding spheres come within cutoff: (res_1, res_2, inside).
+    Pairs not returned cannot have any atom pair within cutoff; inside marks pairs
+    whose atom pairs are all within cutoff. stats (dict) receives the counts.
+    """
+    res_1 = np.asarray(res_1, dtype=np.int64)
+    res_2 = np.asarray(res_2, dtype=np.int64)
+    centroid, radius = cx.residue_spheres()
+    if len(res_1) == 0 or len(res_2) == 0:
+        i = j = np.zeros(0, dtype=np.int64)
+        d = np.zeros(0)
+    else:
+        reach = cutoff + radius[res_1].max() + radius[res_2].max()
+        i, j, d = cross_pairs(centroid[res_1], centroid[res_2], reach)
+    rad_sum = radius[res_1][i] + radius[res_2][j]
+    keep = d - rad_sum <= cutoff
+    inside = d + rad_sum <= cutoff
+
+    if stats is not None:
+        stats["residue_pairs"] = stats.get("residue_pairs", 0) + len(res_1) * len(res_2)
+        stats["skipped"] = stats.get("skipped", 0) + len(res_1) * len(res_2) - int(keep.sum())
+        stats["bulk_accepted"] = stats.get("bulk_accepted", 0) + int(inside[keep].sum())
+        stats["evaluated"] = stats.get("evaluated", 0) + int((keep & ~inside).sum())
+    return res_1[i][keep], res_2[j][keep], inside[keep]
+
+
+def print_culling_stats(stats):
+    """Residue-pair counts (cull_residue_pairs) or atom pruning counts (residue_pair_table)."""
+    if "residue_pairs" in stats:
+        print(f"Residue culling: {stats['residue_pairs']} pairs, skipped {stats['skipped']}, "
+              f"bulk-accepted {stats['bulk_accepted']}, evaluated {stats['evaluated']}")
+    elif "atoms" in stats:
+        print(f"Residue culling: {stats['atoms_kept']} of {stats['atoms']} atoms "
+              f"({stats['residues_kept']} of {stats['residues']} residues) enter the neighbour search")
 
 
 # ---------------------------
-# MAIN
+# Residue-pair table (one tiled neighbour search for contact and energy cutoffs)
 # ---------------------------
-def main():
-    # Read inputs from environment (this is how your alanine scan calls it)
-    pdb_file   = os.environ.get("PDB",   os.path.join("data", "6m0j_prepared.pdb"))
-    pdbqt_file = os.environ.get("PDBQT", os.path.join("data", "6m0j_prepared.pdbqt"))
-    out_csv    = os.environ.get("OUTCSV", "interaction_energies_RBD_ACE2.csv")
+def _reduce_by_key(key, dmin, elec, vdw):
+    uk, inv = np.unique(key, return_inverse=True)
+    d = np.full(len(uk), np.inf)
+    np.minimum.at(d, inv, dmin)
+    return (uk, d,
+            np.bincount(inv, weights=elec, minlength=len(uk)),
+            np.bincount(inv, weights=vdw, minlength=len(uk)))
+
+
+def residue_pair_table(cx, atoms_1, atoms_2, cutoff_contact=8.0, cutoff_energy=8.0,
+                       memory_mb=None, stats=None):
+    """Sparse residue-pair table between two atom sets: (res_1, res_2, dmin, elec, vdw),
+    one entry per residue pair with an atom pair within max(cutoff_contact, cutoff_energy).
+    elec/vdw sum the atom pairs within cutoff_energy, dmin is the closest atom pair.
+    Residues with no partner bounding sphere in range are dropped before the atom search
+    (stats receives the atom / residue counts before and after).
+    Atoms are processed in tiles sized to memory_mb (None: one tile), so peak memory
+    stays flat and run time follows the number of neighbour pairs.
+    """
+    atoms_1 = np.asarray(atoms_1)
+    atoms_2 = np.asarray(atoms_2)
+    n = np.int64(cx.n_res)
+
+    # Residue-level prefilter: only atoms of residues with a partner sphere in range
+    # enter the atom-level search
+    res_1, res_2 = np.unique(cx.res_index[atoms_1]), np.unique(cx.res_index[atoms_2])
+    r1, r2, _ = cull_residue_pairs(cx, res_1, res_2, max(cutoff_contact, cutoff_energy))
+    n_atoms = len(atoms_1) + len(atoms_2)
+    atoms_1 = atoms_1[np.isin(cx.res_index[atoms_1], r1)]
+    atoms_2 = atoms_2[np.isin(cx.res_index[atoms_2], r2)]
+    if stats is not None:
+        stats["atoms"] = stats.get("atoms", 0) + n_atoms
+        stats["atoms_kept"] = stats.get("atoms_kept", 0) + len(atoms_1) + len(atoms_2)
+        stats["residues"] = stats.get("residues", 0) + len(res_1) + len(res_2)
+        stats["residues_kept"] = stats.get("residues_kept", 0) + len(np.unique(r1)) + len(np.unique(r2))
+    chunks = []
+    for i, j, r in cross_pairs_blocks(cx.xyz[atoms_1], cx.xyz[atoms_2],
+                                      max(cutoff_contact, cutoff_energy),
+                                      max_candidates_for(memory_mb)):
+        i, j = atoms_1[i], atoms_2[j]
+        elec, vdw = pair_energies(cx.charge[i], cx.atom_type[i], cx.charge[j], cx.atom_type[j],
+                                  r, cx.lj_a, cx.lj_b)
+        far = r > cutoff_energy
+        elec[far] = 0.0
+        vdw[far] = 0.0
+        chunks.append(_reduce_by_key(cx.res_index[i] * n + cx.res_index[j], r, elec, vdw))
+
+    if not chunks:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0), np.zeros(0), np.zeros(0)
+    # residue pairs split across tiles are merged here
+    key, dmin, elec, vdw = _reduce_by_key(*(np.concatenate(c) for c in zip(*chunks)))
+    return key // n, key % n, dmin, elec, vdw
+
+
+def interface_residues(table, cutoff_contact):
+    """Residue indices on each side with any atom pair closer than cutoff_contact."""
+    res_1, res_2, dmin = table[:3]
+    contact = dmin < cutoff_contact
+    return np.unique(res_1[contact]), np.unique(res_2[contact])
 
-    vdw_file   = os.path.join("data", "vdwprm")
-    rsa_complex = os.environ.get("RSA_COMPLEX", os.path.join("results", "naccess", "6m0j_prepared.rsa"))
-    rsa_A       = os.environ.get("RSA_A",       os.path.join("results", "naccess", "6m0j_chain_A.rsa"))
-    rsa_E       = os.environ.get("RSA_E",       os.path.join("results", "naccess", "6m0j_chain_E.rsa"))
 
+# ---------------------------
+# Residue x residue interface energy matrix (each A–E pair evaluated once)
+# ---------------------------
+def _positions(sorted_res, values):
+    """Position of each value in sorted_res, -1 if absent."""
+    if len(sorted_res) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(sorted_res, values), len(sorted_res) - 1)
+    return np.where(sorted_res[pos] == values, pos, -1)
+
+
+def interface_energy_matrix(table, res_1, res_2):
+    """(elec, vdw) matrices of shape (len(res_1), len(res_2)) from a residue-pair table
+    (res_1, res_2 sorted). Row sums are the per-residue terms of res_1, column sums those of res_2.
+    """
+    t1, t2, _, elec, vdw = table
+    row = _positions(res_1, t1)
+    col = _positions(res_2, t2)
+    keep = (row >= 0) & (col >= 0)
+    idx = row[keep] * len(res_2) + col[keep]
+    size = len(res_1) * len(res_2)
+    return (np.bincount(idx, weights=elec[keep], minlength=size).reshape(len(res_1), len(res_2)),
+            np.bincount(idx, weights=vdw[keep], minlength=size).reshape(len(res_1), len(res_2)))
 
-    cutoff_contact = 6.0  # Å (teacher)
-    cutoff_energy  = 8.0  # Å
 
-    st = load_annotated_structure(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_A, rsa_E)
-    model = st[0]
-    chainA = model["A"]
-    chainE = model["E"]
+# ---------------------------
+# Solvation (residue ASA spread over its atoms, or per-atom ASA)
+# ---------------------------
+# "residue": sum(fsrf) * residue ASA / n_atoms (the original model);
+# "atom": sum over atoms of fsrf * atom ASA (needs per-atom ASA, see AnnotatedComplex),
+# over the atoms of SOLVATION_ATOMS (default all; side, main, apolar or polar restrict it).
+# The residue ASA is SOLVATION_COLUMN, RSA field 8 (Main-Chain ABS: N, C, O only), which
+# the original parser labelled "Non-polar ABS"
+SOLVATION_MODEL = os.environ.get("SOLVATION_MODEL", "residue")
+SOLVATION_MODELS = ("residue", "atom")
+SOLVATION_ATOMS = os.environ.get("SOLVATION_ATOMS", "all")
+
+
+def solvation_energy(cx, asa_res, residues=None):
+    """Per-residue solvation: sum(fsrf) * ASA / n_atoms (0 for empty residues).
+    asa_res is indexed by complex residue; residues restricts the output (default: all).
+    """
+    if residues is None:
+        residues = np.arange(cx.n_res)
+    residues = np.asarray(residues, dtype=np.int64)
+    atoms, owner = cx.residue_atoms(residues)
+    sum_fsrf = np.bincount(owner, weights=cx.type_fsrf[cx.atom_type[atoms]], minlength=len(residues))
+    n_atoms = cx.res_start[residues + 1] - cx.res_start[residues]
+    asa_per_atom = np.divide(asa_res[residues], n_atoms, out=np.zeros(len(residues)), where=n_atoms > 0)
+    return sum_fsrf * asa_per_atom
 
-    # Sanity check
-    try:
-        print(f"Sanity check ASA_BOUND A353 (Å^2): {model['A'][353].xtra.get('ASA_BOUND', 0.0):.2f}")
-    except Exception:
-        print("Sanity check ASA_BOUND A353 (Å^2): 0.00 (residue missing?)")
 
-    # Interface residues based on cutoff_contact (more correct breaks)
-    interface_A = set()
-    interface_E = set()
+def atom_solvation_energy(cx, atom_asa, residues=None, atom_class=SOLVATION_ATOMS):
+    """Per-residue solvation: sum of fsrf * atom ASA over its atoms of atom_class
+    (ATOM_CLASSES, default all). atom_asa is indexed by complex atom;
+    residues restricts the output (default: all).
+    """
+    if atom_class not in ATOM_CLASSES:
+        raise ValueError(f"Unknown atom class '{atom_class}' ({', '.join(ATOM_CLASSES)})")
+    if residues is None:
+        residues = np.arange(cx.n_res)
+    residues = np.asarray(residues, dtype=np.int64)
+    atoms, owner = cx.residue_atoms(residues)
+    counted = column_atoms(atom_class, cx.atom_name[atoms], cx.element[atoms])
+    return np.bincount(owner, weights=cx.type_fsrf[cx.atom_type[atoms]] * atom_asa[atoms] * counted,
+                       minlength=len(residues))
+
+
+def delta_solvation(cx, residues=None, model=SOLVATION_MODEL, atom_class=SOLVATION_ATOMS):
+    """Per-residue ΔG_solv = G(bound ASA) - G(unbound ASA), with the residue or atom model
+    (atom_class: the atoms the atom model counts)."""
+    if model not in SOLVATION_MODELS:
+        raise ValueError(f"Unknown solvation model '{model}' ({', '.join(SOLVATION_MODELS)})")
+    if model == "atom":
+        if not cx.has_atom_asa:
+            raise ValueError("Solvation model 'atom' needs per-atom ASA "
+                             "(ASA_SOURCE=sasa, or NACCESS .asa files next to the RSA files)")
+        return (atom_solvation_energy(cx, cx.atom_asa_bound, residues, atom_class)
+                - atom_solvation_energy(cx, cx.atom_asa_unbound, residues, atom_class))
+    return solvation_energy(cx, cx.asa_bound, residues) - solvation_energy(cx, cx.asa_unbound, residues)
 
-    for resA in chainA:
-        for atA in resA:
-            if not atA.element.strip():
-                continue
-            found = False
-            for resE in chainE:
-                for atE in resE:
-                    if not atE.element.strip():
-                        continue
-                    if (atA - atE) < cutoff_contact:
-                        interface_A.add(resA.id[1])
-                        interface_E.add(resE.id[1])
-                        found = True
-                        break
-                if found:
-                    break
-
-    print("Interface residues A:", sorted(interface_A))
-    print("Interface residues E:", sorted(interface_E))
-
-    res_energy_A = {}
-    res_energy_E = {}
-
-    # ---- Chain A per-residue
-    for resA in chainA:
-        if resA.id[1] not in interface_A:
-            continue
 
-        Ee_tot = 0.0
-        Ev_tot = 0.0
-        for resE in chainE:
-            if resE.id[1] not in interface_E:
-                continue
-            Ee, Ev = residue_pair_energy(resA, resE, cutoff=cutoff_energy)
-            Ee_tot += Ee
-            Ev_tot += Ev
+# ---------------------------
+# Scoring API (in-process; the CLI below is a thin wrapper)
+# ---------------------------
+DATA_DIR = "data"
+NACCESS_DIR = os.path.join("results", "naccess")
+DEFAULT_VDW = os.path.join(DATA_DIR, "vdwprm")
+DEFAULT_RSA_COMPLEX = os.path.join(NACCESS_DIR, "6m0j_prepared.rsa")
+DEFAULT_RSA_UNBOUND = {"A": os.path.join(NACCESS_DIR, "6m0j_chain_A.rsa"),
+                       "E": os.path.join(NACCESS_DIR, "6m0j_chain_E.rsa")}
+
+# Residue ASA source: "naccess" reads the RSA files above, "sasa" computes the bound
+# and unbound ASA of each structure in process (src/sasa.py), e.g. for mutants;
+# "sasa-fast" does the same with a small point set, for screening (accuracy against
+# NACCESS: python src/sasa.py --report)
+ASA_SOURCE = os.environ.get("ASA_SOURCE", "naccess")
+ASA_SOURCES = ("naccess", "sasa", "sasa-fast")
+SASA_POINTS = {"sasa": N_POINTS, "sasa-fast": FAST_POINTS}
+
+CUTOFF_CONTACT = 6.0  # Å (teacher)
+CUTOFF_ENERGY = 8.0   # Å
+
+# Memory budget (MB) for the tiled pair evaluation
+MEMORY_MB = float(os.environ.get("ENERGY_MEMORY_MB", "256"))
+
+CHAIN_LABELS = {"A": "ACE2", "E": "RBD"}
+
+
+def chain_label(chains):
+    """'A' for one chain, 'A+B+C' for a chain group."""
+    return chains if isinstance(chains, str) else "+".join(chains)
+
+
+class InterfaceEnergies():
+    ''' Per-residue and total interaction energies of a chain_1–chain_2 interface
+        (each side a chain id or a group of chain ids)
+        res_1 / res_2: complex residue indices of the interface residues
+        elec / vdw: residue x residue matrices (len(res_1), len(res_2))
+        dsolv: per-residue ΔG_solv for the whole complex
+    '''
+    def __init__(self, cx, chain_1, chain_2, res_1, res_2, elec, vdw, dsolv):
+        self.chain_1 = chain_1
+        self.chain_2 = chain_2
+        self.res_1 = np.asarray(res_1)
+        self.res_2 = np.asarray(res_2)
+        self.resseq_1 = cx.res_seq[self.res_1]
+        self.resseq_2 = cx.res_seq[self.res_2]
+        self.chains_1 = np.array([cx.chain_ids[c] for c in cx.res_chain[self.res_1]], dtype=object)
+        self.chains_2 = np.array([cx.chain_ids[c] for c in cx.res_chain[self.res_2]], dtype=object)
+        self.elec_matrix = elec
+        self.vdw_matrix = vdw
+
+        # chain_1 terms = row sums, chain_2 terms = column sums
+        self.elec_1, self.vdw_1 = elec.sum(axis=1), vdw.sum(axis=1)
+        self.elec_2, self.vdw_2 = elec.sum(axis=0), vdw.sum(axis=0)
+        self.solv_1 = dsolv[self.res_1]
+        self.solv_2 = dsolv[self.res_2]
+        self.total_1 = self.elec_1 + self.vdw_1 + self.solv_1
+        self.total_2 = self.elec_2 + self.vdw_2 + self.solv_2
+
+        # Totals (elec/vdw counted once per pair)
+        self.elec = float(elec.sum())
+        self.vdw = float(vdw.sum())
+        self.solv = float(self.solv_1.sum() + self.solv_2.sum())
+        self.total = self.elec + self.vdw + self.solv
+        self.culling = {}  # residue culling counts, when computed
+
+    def chains(self):
+        ''' Chain ids with interface residues, side 1 first '''
+        seen = []
+        for c in list(self.chains_1) + list(self.chains_2):
+            if c not in seen:
+                seen.append(c)
+        return seen
+
+    def residue_terms(self, chain_id):
+        ''' (resseq, elec, vdw, solv, total) arrays for the interface residues of one chain '''
+        for chains, terms in ((self.chains_1, (self.resseq_1, self.elec_1, self.vdw_1, self.solv_1, self.total_1)),
+                              (self.chains_2, (self.resseq_2, self.elec_2, self.vdw_2, self.solv_2, self.total_2))):
+            mask = chains == chain_id
+            if mask.any():
+                return tuple(t[mask] for t in terms)
+        raise KeyError(f"Chain {chain_id} has no residues in this interface")
+
+    def rows(self):
+        ''' (chain, resseq, elec, vdw, solv, total) per interface residue '''
+        for chain_id in self.chains():
+            for resid, Ee, Ev, Es, Et in zip(*self.residue_terms(chain_id)):
+                yield chain_id, int(resid), float(Ee), float(Ev), float(Es), float(Et)
+
+    def residue_columns(self):
+        ''' Typed per-residue columns (energy_results.RESIDUE_COLUMNS), rows as in rows() '''
+        chain, terms = [], []
+        for chain_id in self.chains():
+            t = self.residue_terms(chain_id)
+            chain.append(np.full(len(t[0]), chain_id))
+            terms.append(t)
+        values = [chain] + [[t[k] for t in terms] for k in range(5)]
+        return {name: np.concatenate(v).astype(dtype) if v else np.zeros(0, dtype=dtype)
+                for (name, dtype), v in zip(RESIDUE_COLUMNS, values)}
+
+    def side_label(self, side):
+        ''' Chain label of interface side 1 or 2 (e.g. "A" or "A+B+C") '''
+        return chain_label(self.chain_1 if side == 1 else self.chain_2)
+
+    def print_tables(self):
+        for chain_id in self.chains():
+            label = CHAIN_LABELS.get(chain_id, chain_id)
+            print(f"\nResidue interaction energies for chain {chain_id} ({label}):")
+            print("ResID   ΔG_elec   ΔG_vdw   ΔG_solv(Δ)   ΔG_total   [kcal/mol]")
+            for resid, Ee, Ev, Es, Et in zip(*self.residue_terms(chain_id)):
+                print(f"{resid:4d}  {Ee:8.3f} {Ev:8.3f} {Es:11.3f} {Et:10.3f}")
+
+        pair = f"{chain_label(self.chain_1)}–{chain_label(self.chain_2)}"
+        print("\nTOTAL interaction free energy (interface-based):")
+        print(f"ΔG_elect({pair}) = {self.elec: .3f} kcal/mol")
+        print(f"ΔG_vdw({pair})   = {self.vdw: .3f} kcal/mol")
+        print(f"ΔG_solv       = {self.solv: .3f} kcal/mol   (G_complex - G_A - G_E, interface residues)")
+        print(f"ΔG_total      = {self.total: .3f} kcal/mol")
+
+    def write_csv(self, out_csv):
+        out_dir = os.path.dirname(out_csv)
+        if out_dir and not os.path.exists(out_dir):
+            os.makedirs(out_dir, exist_ok=True)
+
+        with open(out_csv, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["Chain", "Residue",
+                        "ΔG_elec (kcal/mol)", "ΔG_vdw (kcal/mol)", "ΔG_solv (kcal/mol)", "ΔG_total (kcal/mol)"])
+            for row in self.rows():
+                w.writerow(row)
+            w.writerow([])
+            w.writerow([f"TOTAL({chain_label(self.chain_1)}–{chain_label(self.chain_2)})", "",
+                        self.elec, self.vdw, self.solv, self.total])
+
+    def write_results(self, path, tag=""):
+        ''' Typed residue / total columns as an .npz file (energy_results.load_results) '''
+        save_results(path, [self], [tag])
+
+
+def interaction_energies(cx, chain_1="A", chain_2="E",
+                         cutoff_contact=CUTOFF_CONTACT, cutoff_energy=CUTOFF_ENERGY,
+                         memory_mb=MEMORY_MB, solvation_model=SOLVATION_MODEL,
+                         solvation_atoms=SOLVATION_ATOMS):
+    ''' Score the chain_1–chain_2 interface of an AnnotatedComplex
+        (chain_1 / chain_2: a chain id or a list of chain ids, e.g. a spike trimer)
+    '''
+    # Cross-chain neighbour pairs, found once (in tiles) within the largest cutoff;
+    # the same search gives the contact interface and the energy pairs
+    culling = {}
+    table = residue_pair_table(cx, cx.chain_atoms(chain_1), cx.chain_atoms(chain_2),
+                               cutoff_contact=cutoff_contact, cutoff_energy=cutoff_energy,
+                               memory_mb=memory_mb, stats=culling)
+    res_1, res_2 = interface_residues(table, cutoff_contact)
+    elec, vdw = interface_energy_matrix(table, res_1, res_2)
+    result = InterfaceEnergies(cx, chain_1, chain_2, res_1, res_2, elec, vdw,
+                               delta_solvation(cx, model=solvation_model, atom_class=solvation_atoms))
+    result.culling = culling
+    return result
+
+
+def asa_inputs(asa_source=ASA_SOURCE, rsa_complex=DEFAULT_RSA_COMPLEX, rsa_unbound=None):
+    ''' (rsa_complex, rsa_unbound) as passed to the loaders: the RSA files for "naccess",
+        (None, {}) for "sasa" / "sasa-fast" (ASA computed in process)
+    '''
+    if asa_source not in ASA_SOURCES:
+        raise ValueError(f"Unknown ASA source '{asa_source}' ({', '.join(ASA_SOURCES)})")
+    if asa_source in SASA_POINTS:
+        return None, {}
+    return rsa_complex, DEFAULT_RSA_UNBOUND if rsa_unbound is None else rsa_unbound
+
+
+def asa_input_files(asa_source=ASA_SOURCE):
+    ''' RSA files the default ASA inputs read (none for "sasa" / "sasa-fast") '''
+    rsa_complex, rsa_unbound = asa_inputs(asa_source)
+    return [] if rsa_complex is None else [rsa_complex, *rsa_unbound.values()]
+
+
+def load_complex(pdb_file, pdbqt_file, vdw_file=DEFAULT_VDW,
+                 rsa_complex=DEFAULT_RSA_COMPLEX, rsa_unbound=None, cache_dir=DEFAULT_CACHE_DIR,
+                 asa_source=ASA_SOURCE, sasa_reference=None):
+    ''' Annotated complex with the project default parameter / NACCESS files,
+        through the content-hash cache (COMPLEX_CACHE_DIR, empty to disable).
+        asa_source "sasa" / "sasa-fast" ignores the RSA files and computes the residue ASA in
+        process (SASA_POINTS), locally from sasa_reference (sasa.bound_unbound_state of the
+        WT) when given.
+        pdb_file may also be a complex directory (complex_store.py), which is memory-mapped
+        as is (the other inputs are then ignored).
+    '''
+    if is_complex_dir(pdb_file):
+        return open_complex_dir(pdb_file)
+    rsa_complex, rsa_unbound = asa_inputs(asa_source, rsa_complex, rsa_unbound)
+    return load_annotated_complex_cached(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound,
+                                         cache_dir=cache_dir, sasa_reference=sasa_reference,
+                                         sasa_points=SASA_POINTS.get(asa_source, N_POINTS))
+
+
+def interaction_energies_from_files(pdb_file, pdbqt_file, vdw_file=DEFAULT_VDW,
+                                    rsa_complex=DEFAULT_RSA_COMPLEX, rsa_unbound=None,
+                                    chain_1="A", chain_2="E",
+                                    cutoff_contact=CUTOFF_CONTACT, cutoff_energy=CUTOFF_ENERGY,
+                                    mode="vectorized", memory_mb=MEMORY_MB, asa_source=ASA_SOURCE,
+                                    solvation_model=SOLVATION_MODEL, solvation_atoms=SOLVATION_ATOMS):
+    ''' Load PDB + PDBQT + RSA (or in-process ASA) and score the interface.
+        mode: "vectorized", "reference" (per-atom functions on the Biopython structure)
+        or "check" (vectorized, reporting the deviation from the reference)
+        solvation_model: "residue" or "atom" (SOLVATION_MODELS); solvation_atoms: the atom
+        class the atom model counts (ATOM_CLASSES)
+    '''
+    if mode not in ("vectorized", "reference", "check"):
+        raise ValueError(f"Unknown energy mode '{mode}' (vectorized, reference, check)")
+    rsa_complex, rsa_unbound = asa_inputs(asa_source, rsa_complex, rsa_unbound)
+
+    cx = load_complex(pdb_file, pdbqt_file, vdw_file, rsa_complex, rsa_unbound, asa_source=asa_source)
+    result = interaction_energies(cx, chain_1, chain_2,
+                                  cutoff_contact=cutoff_contact, cutoff_energy=cutoff_energy,
+                                  memory_mb=memory_mb, solvation_model=solvation_model,
+                                  solvation_atoms=solvation_atoms)
+    if mode == "vectorized":
+        return result
+    if is_complex_dir(pdb_file):
+        raise ValueError(f"Energy mode '{mode}' needs the PDB / PDBQT files, not a complex directory")
+
+    st = load_annotated_structure(pdb_file, pdbqt_file, vdw_file)
+    # (chain, resseq, icode) -> Biopython residue, whatever the hetero flag
+    residues = {(res.get_parent().id, res.id[1], res.id[2] or " "): res for res in st[0].get_residues()}
+    res_list_1 = [residues[cx.residue_key(k)] for k in result.res_1]
+    res_list_2 = [residues[cx.residue_key(k)] for k in result.res_2]
+    culling = {}
+    i, j, inside = cull_residue_pairs(cx, result.res_1, result.res_2, cutoff_energy, culling)
+    pairs = (np.searchsorted(result.res_1, i), np.searchsorted(result.res_2, j), inside)
+    elec_ref, vdw_ref = reference_energy_matrix(res_list_1, res_list_2, cutoff=cutoff_energy,
+                                                pairs=pairs)
+    print_culling_stats(culling)
+
+    if mode == "check":
+        max_dev = max(np.abs(result.elec_matrix - elec_ref).max(initial=0.0),
+                      np.abs(result.vdw_matrix - vdw_ref).max(initial=0.0))
+        print(f"Vectorized vs reference pair energies: max |Δ| = {max_dev:.2e} kcal/mol")
+        return result
+
+    return InterfaceEnergies(cx, chain_1, chain_2, result.res_1, result.res_2,
+                             elec_ref, vdw_ref,
+                             delta_solvation(cx, model=solvation_model, atom_class=solvation_atoms))
+
+
+def parse_chains(value):
+    chains = [c.strip() for c in value.split(",") if c.strip()]
+    return chains[0] if len(chains) == 1 else chains
 
-        dSolv = delta_solvation_residue(resA)
-        Etot = Ee_tot + Ev_tot + dSolv
-        res_energy_A[resA.id[1]] = (Ee_tot, Ev_tot, dSolv, Etot)
 
-    # ---- Chain E per-residue
-    for resE in chainE:
-        if resE.id[1] not in interface_E:
-            continue
+# ---------------------------
+# MAIN
+# ---------------------------
+def main():
+    # Read inputs from environment (CLI wrapper around interaction_energies_from_files)
+    pdb_file   = os.environ.get("PDB",   os.path.join(DATA_DIR, "6m0j_prepared.pdb"))
+    pdbqt_file = os.environ.get("PDBQT", os.path.join(DATA_DIR, "6m0j_prepared.pdbqt"))
+    # Typed results (.npz); the CSV export is skipped when OUTCSV is empty
+    out_npz    = os.environ.get("OUTNPZ", "interaction_energies_RBD_ACE2.npz")
+    out_csv    = os.environ.get("OUTCSV", "interaction_energies_RBD_ACE2.csv")
 
-        Ee_tot = 0.0
-        Ev_tot = 0.0
-        for resA in chainA:
-            if resA.id[1] not in interface_A:
-                continue
-            Ee, Ev = residue_pair_energy(resA, resE, cutoff=cutoff_energy)
-            Ee_tot += Ee
-            Ev_tot += Ev
-
-        dSolv = delta_solvation_residue(resE)
-        Etot = Ee_tot + Ev_tot + dSolv
-        res_energy_E[resE.id[1]] = (Ee_tot, Ev_tot, dSolv, Etot)
-
-    # Print tables
-    print("\nResidue interaction energies for chain A (ACE2):")
-    print("ResID   ΔG_elec   ΔG_vdw   ΔG_solv(Δ)   ΔG_total   [kcal/mol]")
-    for resid in sorted(res_energy_A):
-        Ee, Ev, Es, Et = res_energy_A[resid]
-        print(f"{resid:4d}  {Ee:8.3f} {Ev:8.3f} {Es:11.3f} {Et:10.3f}")
-
-    print("\nResidue interaction energies for chain E (RBD):")
-    print("ResID   ΔG_elec   ΔG_vdw   ΔG_solv(Δ)   ΔG_total   [kcal/mol]")
-    for resid in sorted(res_energy_E):
-        Ee, Ev, Es, Et = res_energy_E[resid]
-        print(f"{resid:4d}  {Ee:8.3f} {Ev:8.3f} {Es:11.3f} {Et:10.3f}")
-
-    # Totals (avoid double-counting elec/vdw)
-    tot_elec = sum(v[0] for v in res_energy_A.values())
-    tot_vdw  = sum(v[1] for v in res_energy_A.values())
-    tot_dsolv = sum(v[2] for v in res_energy_A.values()) + sum(v[2] for v in res_energy_E.values())
-    tot_dG = tot_elec + tot_vdw + tot_dsolv
-
-    print("\nTOTAL interaction free energy (interface-based):")
-    print(f"ΔG_elect(A–E) = {tot_elec: .3f} kcal/mol")
-    print(f"ΔG_vdw(A–E)   = {tot_vdw: .3f} kcal/mol")
-    print(f"ΔG_solv       = {tot_dsolv: .3f} kcal/mol   (G_complex - G_A - G_E, interface residues)")
-    print(f"ΔG_total      = {tot_dG: .3f} kcal/mol")
-
-    # Ensure OUTCSV directory exists
-    out_dir = os.path.dirname(out_csv)
-    if out_dir and not os.path.exists(out_dir):
-        os.makedirs(out_dir, exist_ok=True)
-
-    # Export CSV
-    with open(out_csv, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["Chain", "Residue",
-                    "ΔG_elec (kcal/mol)", "ΔG_vdw (kcal/mol)", "ΔG_solv (kcal/mol)", "ΔG_total (kcal/mol)"])
-
-        for resid, (Ee, Ev, Es, Et) in sorted(res_energy_A.items()):
-            w.writerow(["A", resid, Ee, Ev, Es, Et])
-
-        for resid, (Ee, Ev, Es, Et) in sorted(res_energy_E.items()):
-            w.writerow(["E", resid, Ee, Ev, Es, Et])
-
-        w.writerow([])
-        w.writerow(["TOTAL(A–E)", "", tot_elec, tot_vdw, tot_dsolv, tot_dG])
-
-    print(f"\nCSV written: {out_csv}")
+    rsa_complex = os.environ.get("RSA_COMPLEX", DEFAULT_RSA_COMPLEX)
+    rsa_A       = os.environ.get("RSA_A",       DEFAULT_RSA_UNBOUND["A"])
+    rsa_E       = os.environ.get("RSA_E",       DEFAULT_RSA_UNBOUND["E"])
+
+    # ENERGY_MODE=reference keeps the original per-atom functions;
+    # ENERGY_MODE=check runs both and reports the largest deviation.
+    energy_mode = os.environ.get("ENERGY_MODE", "vectorized")
+
+    # Interface sides: one chain id or a comma-separated group (e.g. CHAIN_1=A,B,C)
+    chain_1 = parse_chains(os.environ.get("CHAIN_1", "A"))
+    chain_2 = parse_chains(os.environ.get("CHAIN_2", "E"))
+
+    result = interaction_energies_from_files(pdb_file, pdbqt_file, DEFAULT_VDW,
+                                             rsa_complex, {"A": rsa_A, "E": rsa_E},
+                                             chain_1=chain_1, chain_2=chain_2,
+                                             mode=energy_mode)
+
+    print(f"Interface residues {chain_label(chain_1)}:", sorted(int(r) for r in result.resseq_1))
+    print(f"Interface residues {chain_label(chain_2)}:", sorted(int(r) for r in result.resseq_2))
+    print_culling_stats(result.culling)
+
+    result.print_tables()
+    result.write_results(out_npz)
+    print(f"\nResults written: {out_npz}")
+    if out_csv:
+        result.write_csv(out_csv)
+        print(f"CSV written: {out_csv}")
 
 
 if __name__ == "__main__":
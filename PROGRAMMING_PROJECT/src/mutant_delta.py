@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+ Compact mutant format: a delta against a referenced WT
+ A mutant is stored as the residues whose atoms differ from the WT complex (their
+ complete atom blocks: names, elements, coordinates, charges, AutoDock types and the
+ new residue name), the WT atoms they remove, and the WT input files with their
+ content hash, plus the residue ASA values that differ from the WT (in-process SASA
+ changes the neighbours too). The mutant complex is rebuilt in memory from the WT; full PDB / PDBQT
+ files are written only on demand for external tools. A delta keeps what the energy
+ terms use, not the file layout (B-factors, serial numbers, formal charges, the PDBQT
+ torsion tree), so exported files are not byte copies of the obabel output
+
+ Export a stored mutant:
+   python src/mutant_delta.py results/alanine_scanning/mutants/A_19_ALA.delta.npz \
+       --pdb A_19_ALA.pdb --pdbqt A_19_ALA.pdbqt
+ Add deltas next to existing full mutant files:
+   python src/mutant_delta.py --convert results/alanine_scanning/mutants
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import numpy as np
+from annotated_complex import AnnotatedComplex
+from complex_cache import file_hash
+from compressed_io import strip_compression_suffix
+from ddg_engine import changed_residues
+from energy_results import save_table, load_table
+from pdb_reader import (PdbAtoms, PdbTemplate, format_pdb_lines, read_atoms, read_pdbqt_atoms,
+                        residue_key_array, join_keys, _atom_keys, LINE_WIDTH)
+
+DELTA_FORMAT = "mutant-delta"
+DELTA_VERSION = 1
+
+
+def wt_reference(pdb_file, pdbqt_file):
+    ''' {"pdb", "pdbqt", "hash"} of the WT inputs a delta refers to '''
+    h = hashlib.sha256()
+    for path in (pdb_file, pdbqt_file):
+        h.update(file_hash(path).encode())
+    return {"pdb": str(pdb_file), "pdbqt": str(pdbqt_file), "hash": h.hexdigest()}
+
+
+class MutantDelta():
+    ''' Changes of a mutant against its WT complex (same residue table)
+        Residue arrays (k): residues (WT residue indices replaced), res_name (mutant names)
+        Block atoms (m), grouped by residue: atom_res (position in residues), atom_name,
+            element, xyz, charge, ad_type (AutoDock type name)
+        removed: WT atom indices dropped; added: block atoms with no WT atom of that name
+        asa_res, asa_bound, asa_unbound: residues whose ASA differs from the WT, new values
+        atom_asa_bound, atom_asa_unbound: per-atom ASA of the block atoms (NaN if unknown);
+            asa_atoms, asa_atom_bound, asa_atom_unbound: WT atoms outside the blocks whose
+            per-atom ASA differs, new values
+        wt: {"pdb", "pdbqt", "hash"} of the WT inputs
+    '''
+    def __init__(self, residues, res_name, atom_res, atom_name, element, xyz, charge, ad_type,
+                 removed, added, wt, asa_res=(), asa_bound=(), asa_unbound=(),
+                 atom_asa_bound=None, atom_asa_unbound=None,
+                 asa_atoms=(), asa_atom_bound=(), asa_atom_unbound=()):
+        self.residues = np.asarray(residues, dtype=np.int64)
+        self.res_name = np.asarray(res_name, dtype="S3")
+        self.atom_res = np.asarray(atom_res, dtype=np.int64)
+        self.atom_name = np.asarray(atom_name, dtype="S4")
+        self.element = np.asarray(element, dtype="S2")
+        self.xyz = np.asarray(xyz, dtype=np.float32).reshape(-1, 3)
+        self.charge = np.asarray(charge, dtype=np.float32)
+        self.ad_type = np.asarray(ad_type, dtype="S2")
+        self.removed = np.asarray(removed, dtype=np.int64)
+        self.added = np.asarray(added, dtype=np.int64)
+        self.wt = dict(wt)
+        self.asa_res = np.asarray(asa_res, dtype=np.int64)
+        self.asa_bound = np.asarray(asa_bound, dtype=np.float64)
+        self.asa_unbound = np.asarray(asa_unbound, dtype=np.float64)
+        m = len(self.atom_res)
+        self.atom_asa_bound = np.full(m, np.nan) if atom_asa_bound is None \
+            else np.asarray(atom_asa_bound, dtype=np.float64)
+        self.atom_asa_unbound = np.full(m, np.nan) if atom_asa_unbound is None \
+            else np.asarray(atom_asa_unbound, dtype=np.float64)
+        self.asa_atoms = np.asarray(asa_atoms, dtype=np.int64)
+        self.asa_atom_bound = np.asarray(asa_atom_bound, dtype=np.float64)
+        self.asa_atom_unbound = np.asarray(asa_atom_unbound, dtype=np.float64)
+
+    def block(self, k):
+        ''' Atom slice of replaced residue k '''
+        return np.flatnonzero(self.atom_res == k)
+
+
+def _chain_icode(cx, residues):
+    ''' (chain id, icode with b" " when blank) byte arrays of residues of cx '''
+    chain = np.array([cx.chain_ids[c] for c in cx.res_chain[residues]], dtype="S4")
+    return chain, np.where(cx.res_icode[residues] == b"", b" ", cx.res_icode[residues])
+
+
+def complex_delta(wt, mut, wt_files, pdbqt_file=None):
+    ''' MutantDelta of mut against wt (AnnotatedComplex with the same residue table);
+        wt_files: wt_reference() of the WT inputs; pdbqt_file: the mutant PDBQT, to keep
+        its AutoDock types (the complex only holds types known to the vdW parameters)
+    '''
+    residues = np.union1d(changed_residues(wt, mut), np.flatnonzero(wt.res_name != mut.res_name))
+    atoms, atom_res = mut.residue_atoms(residues)
+    wt_atoms, wt_owner = wt.residue_atoms(residues)
+
+    # names per residue on both sides: WT atoms removed, mutant atoms added
+    mut_keys = np.char.add(atom_res.astype("S8"), np.char.add(b":", mut.atom_name[atoms]))
+    wt_keys = np.char.add(wt_owner.astype("S8"), np.char.add(b":", wt.atom_name[wt_atoms]))
+    ad_type = np.array(mut.type_names, dtype="S2")[mut.atom_type[atoms]]
+    if pdbqt_file is not None:
+        qt = read_pdbqt_atoms(pdbqt_file)
+        chain, icode = _chain_icode(mut, mut.res_index[atoms])
+        index = join_keys(_atom_keys(chain, mut.res_seq[mut.res_index[atoms]], icode, mut.atom_name[atoms]),
+                          qt.atom_keys())
+        ad_type[index >= 0] = qt.ad_type[index[index >= 0]]
+
+    asa_res = np.flatnonzero((wt.asa_bound != mut.asa_bound) | (wt.asa_unbound != mut.asa_unbound))
+
+    # per-atom ASA outside the blocks: atoms in the same order in both complexes
+    wt_rest = np.flatnonzero(~np.isin(wt.res_index, residues))
+    mut_rest = np.flatnonzero(~np.isin(mut.res_index, residues))
+    asa_diff = np.zeros(len(wt_rest), dtype=bool)
+    for name in ("atom_asa_bound", "atom_asa_unbound"):
+        a, b = getattr(wt, name)[wt_rest], getattr(mut, name)[mut_rest]
+        asa_diff |= (a != b) & ~(np.isnan(a) & np.isnan(b))
+    asa_atoms = wt_rest[asa_diff]
+    return MutantDelta(residues, mut.res_name[residues], atom_res, mut.atom_name[atoms],
+                       mut.element[atoms], mut.xyz[atoms], mut.charge[atoms], ad_type,
+                       wt_atoms[~np.isin(wt_keys, mut_keys)],
+                       np.flatnonzero(~np.isin(mut_keys, wt_keys)), wt_files,
+                       asa_res, mut.asa_bound[asa_res], mut.asa_unbound[asa_res],
+                       mut.atom_asa_bound[atoms], mut.atom_asa_unbound[atoms], asa_atoms,
+                       mut.atom_asa_bound[mut_rest[asa_diff]], mut.atom_asa_unbound[mut_rest[asa_diff]])
+
+
+def apply_delta(wt, delta):
+    ''' Mutant AnnotatedComplex: the WT with the delta's residue blocks swapped in '''
+    replaced = np.zeros(wt.n_res, dtype=bool)
+    replaced[delta.residues] = True
+    keep = np.flatnonzero(~replaced[wt.res_index])
+    # AutoDock types without vdW parameters fall back to C, as in the loader
+    type_index = {t.encode(): k for k, t in enumerate(wt.type_names)}
+
+    res_index = np.concatenate([wt.res_index[keep], delta.residues[delta.atom_res]])
+    order = np.argsort(res_index, kind="stable")
+    fields = wt.fields()
+    fields["res_index"] = res_index[order]
+    for name, changed in (("atom_asa_bound", delta.asa_atom_bound), ("atom_asa_unbound", delta.asa_atom_unbound)):
+        fields[name] = fields[name].copy()
+        fields[name][delta.asa_atoms] = changed
+    for name, block in (("xyz", delta.xyz), ("charge", delta.charge),
+                        ("atom_name", delta.atom_name), ("element", delta.element),
+                        ("atom_asa_bound", delta.atom_asa_bound), ("atom_asa_unbound", delta.atom_asa_unbound),
+                        ("atom_type", [type_index.get(t, type_index[b"C"]) for t in delta.ad_type.tolist()])):
+        fields[name] = np.concatenate([fields[name][keep],
+                                       np.asarray(block, dtype=fields[name].dtype)])[order]
+    fields["res_name"] = fields["res_name"].copy()
+    fields["res_name"][delta.residues] = delta.res_name
+    for name in ("asa_bound", "asa_unbound"):
+        fields[name] = fields[name].copy()
+        fields[name][delta.asa_res] = getattr(delta, name)
+    return AnnotatedComplex(**fields)
+
+
+def save_delta(path, delta):
+    save_table(path, {
+        "format": np.array(DELTA_FORMAT), "version": np.array(DELTA_VERSION),
+        "residues": delta.residues, "res_name": delta.res_name, "atom_res": delta.atom_res,
+        "atom_name": delta.atom_name, "element": delta.element, "xyz": delta.xyz,
+        "charge": delta.charge, "ad_type": delta.ad_type, "removed": delta.removed,
+        "added": delta.added, "wt_pdb": np.array(delta.wt["pdb"]),
+        "wt_pdbqt": np.array(delta.wt["pdbqt"]), "wt_hash": np.array(delta.wt["hash"]),
+        "asa_res": delta.asa_res, "asa_bound": delta.asa_bound, "asa_unbound": delta.asa_unbound,
+        "atom_asa_bound": delta.atom_asa_bound, "atom_asa_unbound": delta.atom_asa_unbound,
+        "asa_atoms": delta.asa_atoms, "asa_atom_bound": delta.asa_atom_bound,
+        "asa_atom_unbound": delta.asa_atom_unbound,
+    })
+
+
+def load_delta(path):
+    z = load_table(path)
+    if str(z.get("format")) != DELTA_FORMAT or int(z.get("version", -1)) != DELTA_VERSION:
+        raise ValueError(f"{path}: not a {DELTA_FORMAT} v{DELTA_VERSION} file")
+    # files written before the ASA entries have none (the mutant keeps the WT ASA;
+    # block atoms without per-atom ASA get NaN)
+    return MutantDelta(z["residues"], z["res_name"], z["atom_res"], z["atom_name"], z["element"],
+                       z["xyz"], z["charge"], z["ad_type"], z["removed"], z["added"],
+                       {"pdb": str(z["wt_pdb"]), "pdbqt": str(z["wt_pdbqt"]), "hash": str(z["wt_hash"])},
+                       z.get("asa_res", ()), z.get("asa_bound", ()), z.get("asa_unbound", ()),
+                       z.get("atom_asa_bound"), z.get("atom_asa_unbound"),
+                       z.get("asa_atoms", ()), z.get("asa_atom_bound", ()), z.get("asa_atom_unbound", ()))
+
+
+def load_mutant(path, wt=None, check_hash=True):
+    ''' Mutant AnnotatedComplex of a stored delta; wt: the WT complex (loaded from the
+        referenced WT files when None, after checking their hash)
+    '''
+    delta = load_delta(path)
+    if wt is None:
+        from int_energies_AE import load_complex
+        if check_hash and wt_reference(delta.wt["pdb"], delta.wt["pdbqt"])["hash"] != delta.wt["hash"]:
+            raise ValueError(f"{path}: WT files {delta.wt['pdb']} / {delta.wt['pdbqt']} have changed")
+        wt = load_complex(delta.wt["pdb"], delta.wt["pdbqt"])
+    return apply_delta(wt, delta)
+
+
+# ---------------------------
+# Export to full PDB / PDBQT (external tools)
+# ---------------------------
+def _template_residues(atoms, wt_cx, delta):
+    ''' {template residue: delta position} for the replaced residues; runs of the same
+        residue split across the file (PDBQT atom order) all map to it
+    '''
+    s = atoms.res_start[:-1]
+    keys = residue_key_array(atoms.chain[s], atoms.res_seq[s], atoms.icode[s])
+    chain, icode = _chain_icode(wt_cx, delta.residues)
+    want = residue_key_array(chain, wt_cx.res_seq[delta.residues], icode)
+    return {int(t): int(np.flatnonzero(want == keys[t])[0]) for t in np.flatnonzero(np.isin(keys, want))}
+
+
+def _block_atoms(atoms, t, delta, k):
+    ''' PdbAtoms of delta residue k, numbered from the first serial of template residue t '''
+    at = delta.block(k)
+    first = atoms.res_start[t]
+    n = len(at)
+    return PdbAtoms(np.full(n, b"ATOM"), atoms.serial[first] + np.arange(n), delta.atom_name[at],
+                    np.full(n, b" "), np.full(n, delta.res_name[k]), np.full(n, atoms.chain[first]),
+                    np.full(n, atoms.res_seq[first]), np.full(n, atoms.icode[first]),
+                    delta.xyz[at], np.ones(n), np.zeros(n), delta.element[at])
+
+
+def _replacements(atoms, wt_cx, delta, pdbqt=False):
+    replace = {}
+    done = set()
+    for t, k in sorted(_template_residues(atoms, wt_cx, delta).items()):
+        if k in done:
+            replace[t] = np.zeros(0, dtype=f"S{LINE_WIDTH}")
+            continue
+        done.add(k)
+        block = _block_atoms(atoms, t, delta, k)
+        lines = format_pdb_lines(block)
+        if pdbqt:
+            at = delta.block(k)
+            lines = np.array([l[:54] + b"  0.00  0.00    " + (b"%+6.3f" % q) + b" " + ty.ljust(2)
+                              for l, q, ty in zip(lines, delta.charge[at].tolist(), delta.ad_type[at])],
+                             dtype=f"S{LINE_WIDTH}")
+        replace[t] = lines
+    return replace
+
+
+def export_pdb(delta, path, wt_cx):
+    ''' Full mutant PDB: WT PDB text with the replaced residue blocks '''
+    template = PdbTemplate(read_atoms(delta.wt["pdb"], altloc=None))
+    template.write(path, _replacements(template.atoms, wt_cx, delta))
+
+
+def export_pdbqt(delta, path, wt_cx):
+    ''' Full mutant PDBQT: WT PDBQT records with the replaced residue blocks '''
+    template = PdbTemplate(read_pdbqt_atoms(delta.wt["pdbqt"]))
+    template.write(path, _replacements(template.atoms, wt_cx, delta, pdbqt=True))
+
+
+def store_mutant(out_dir, tag, wt, mut, wt_files, pdb_file, pdbqt_file):
+    ''' Save mut as <tag>.delta.npz in out_dir; a mutant whose residue table differs from
+        the WT (residues inserted or dropped) cannot be a delta, so its PDB / PDBQT files
+        are copied there instead. Returns the stored path(s).
+    '''
+    try:
+        delta = complex_delta(wt, mut, wt_files, pdbqt_file)
+    except ValueError as e:
+        print(f"{tag}: {e}; keeping the full files")
+        stored = []
+        for path, suffix in ((pdb_file, ".pdb"), (pdbqt_file, ".pdbqt")):
+            out = os.path.join(out_dir, tag + suffix + path[len(strip_compression_suffix(path)):])
+            if os.path.abspath(path) != os.path.abspath(out):
+                shutil.copyfile(path, out)
+            stored.append(out)
+        return stored
+    out = os.path.join(out_dir, tag + ".delta.npz")
+    save_delta(out, delta)
+    return [out]
+
+
+def _same_complex(a, b):
+    def same(x, y):
+        x, y = np.asarray(x), np.asarray(y)
+        return np.array_equal(x, y, equal_nan=x.dtype.kind == "f" and y.dtype.kind == "f")
+    return all(same(x, y) for x, y in zip(a.fields().values(), b.fields().values()))
+
+
+def convert_dir(directory, wt_pdb, wt_pdbqt):
+    ''' Store every <tag>.pdb + <tag>.pdbqt pair of a directory as <tag>.delta.npz against
+        the WT (the full files are kept: the delta does not hold their layout)
+    '''
+    from int_energies_AE import load_complex
+
+    wt_files = wt_reference(wt_pdb, wt_pdbqt)
+    wt = load_complex(wt_pdb, wt_pdbqt)
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".pdb") or not os.path.exists(os.path.join(directory, name + "qt")):
+            continue
+        pdb = os.path.join(directory, name)
+        tag = name[:-len(".pdb")]
+        mut = load_complex(pdb, pdb + "qt", cache_dir=None)
+        try:
+            delta = complex_delta(wt, mut, wt_files, pdb + "qt")
+        except ValueError as e:
+            print(f"{tag}: {e}; skipped")
+            continue
+        out = os.path.join(directory, tag + ".delta.npz")
+        save_delta(out, delta)
+        same = _same_complex(apply_delta(wt, load_delta(out)), mut)
+        print(f"{tag}: {len(delta.residues)} residue(s), {os.path.getsize(out)} bytes"
+              + ("" if same else "  (delta does not rebuild the mutant)"))
+
+
+def main():
+    from int_energies_AE import load_complex
+
+    parser = argparse.ArgumentParser(
+        description="Write the full PDB / PDBQT of a stored mutant delta, or convert full mutant files to deltas."
+    )
+    parser.add_argument("delta", nargs="?", help="Mutant delta (.delta.npz)")
+    parser.add_argument("--pdb", help="Output PDB")
+    parser.add_argument("--pdbqt", help="Output PDBQT")
+    parser.add_argument("--convert", metavar="DIR", help="Store the <tag>.pdb/.pdbqt pairs of DIR as deltas")
+    parser.add_argument("--wt-pdb", default=os.path.join("data", "6m0j_prepared.pdb"), help="WT PDB for --convert")
+    parser.add_argument("--wt-pdbqt", default=os.path.join("data", "6m0j_prepared.pdbqt"), help="WT PDBQT for --convert")
+    args = parser.parse_args()
+
+    if args.convert:
+        convert_dir(args.convert, args.wt_pdb, args.wt_pdbqt)
+        return
+    if not args.delta:
+        parser.error("a delta file or --convert DIR is required")
+
+    delta = load_delta(args.delta)
+    wt_cx = load_complex(delta.wt["pdb"], delta.wt["pdbqt"])
+    if args.pdb:
+        export_pdb(delta, args.pdb, wt_cx)
+        print(f"Wrote {args.pdb}")
+    if args.pdbqt:
+        export_pdbqt(delta, args.pdbqt, wt_cx)
+        print(f"Wrote {args.pdbqt}")
+    print(f"{len(delta.residues)} residue(s) replaced, {len(delta.removed)} atom(s) removed, "
+          f"{len(delta.added)} added")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+ Shared steps of the mutant scans (alanine_scan.py, variant_scan.py)
+ Each mutant is built as PDB + obabel PDBQT, stored as a delta against the WT
+ (mutant_delta.py) and scored incrementally against the WT engine (ddg_engine.py);
+ the energies go to one energies.npz per scan and to the SQLite store (results_db.py)
+"""
+import os
+import subprocess
+import tempfile
+from int_energies_AE import load_complex, asa_input_files, DEFAULT_VDW, ASA_SOURCE, SASA_POINTS
+from ddg_engine import InterfaceDdgEngine
+from compressed_io import compress_file
+from energy_results import save_results
+from mutant_delta import wt_reference, store_mutant
+from pdb_reader import read_atoms
+from sasa import bound_unbound_state
+from results_db import (DEFAULT_DB, connect, inputs_hash, scan_params, upsert_run,
+                        upsert_wt, upsert_mutation)
+
+WT_CSV = "results/WT/WT_interaction_energies.csv"
+WT_NPZ = "results/WT/WT_interaction_energies.npz"
+
+# Mutants are stored as deltas against the WT (<tag>.delta.npz, mutant_delta.py exports full
+# files on demand); MUTANT_FILES=full also keeps the PDB/PDBQT built for obabel
+MUTANT_FILES = os.environ.get("MUTANT_FILES", "delta")
+
+# Compress kept mutant PDB/PDBQT files ("gz", "bz2", "xz"; empty: off)
+MUTANT_COMPRESS = os.environ.get("MUTANT_COMPRESS", "")
+
+# All residue / total energies of a scan go to one typed file (energy_results.load_results);
+# MUTANT_CSV=1 also exports one CSV per mutant
+MUTANT_CSV = os.environ.get("MUTANT_CSV", "") not in ("", "0")
+
+# Every scored mutant is also upserted into the shared SQLite store (empty: off)
+RESULTS_DB = os.environ.get("RESULTS_DB", DEFAULT_DB)
+
+
+def pdb_to_pdbqt(pdb, pdbqt):
+    subprocess.run(
+        ["obabel", pdb, "-O", pdbqt, "--partialcharge", "gasteiger"],
+        check=True
+    )
+
+
+class MutantScan():
+    ''' WT engine and result stores of one scan (kind: "alanine", "variant") writing
+        under results_dir (mutants/, energies/, energies.npz)
+    '''
+    def __init__(self, kind, results_dir, wt_pdb, wt_pdbqt):
+        self.results_dir = results_dir
+        os.makedirs(f"{results_dir}/mutants", exist_ok=True)
+        os.makedirs(f"{results_dir}/energies", exist_ok=True)
+
+        # WT residue x residue matrices are kept in memory; each mutant only
+        # recomputes the rows/columns of the residues it changes
+        self.engine = InterfaceDdgEngine(load_complex(wt_pdb, wt_pdbqt))
+        self.engine.wt.write_csv(WT_CSV)
+        self.engine.wt.write_results(WT_NPZ, "WT")
+        self.wt_energy = self.engine.wt.total
+
+        self.db = connect(RESULTS_DB) if RESULTS_DB else None
+        if self.db is not None:
+            self.run_id = upsert_run(self.db, kind,
+                                     inputs_hash([wt_pdb, wt_pdbqt, DEFAULT_VDW, *asa_input_files()]),
+                                     dict(scan_params(self.engine), asa=ASA_SOURCE),
+                                     wt_pdb, wt_pdbqt, self.wt_energy)
+            upsert_wt(self.db, self.run_id, self.engine.wt)
+        self.wt_files = wt_reference(wt_pdb, wt_pdbqt)
+        # ASA_SOURCE=sasa / sasa-fast: mutant ASA is updated from the WT sphere points around
+        # the changed atoms
+        self.wt_sasa = (bound_unbound_state(read_atoms(wt_pdb), n_points=SASA_POINTS[ASA_SOURCE])
+                        if ASA_SOURCE in SASA_POINTS else None)
+        self.scored = [("WT", self.engine.wt)]
+
+    def build(self, tag, make_pdb):
+        """Mutant complex built as PDB (make_pdb) + obabel PDBQT and stored as a delta against
+        the WT; the full files are kept (MUTANT_COMPRESS applies) with MUTANT_FILES=full, or
+        when the mutant's residue table differs from the WT (no delta possible)."""
+        mutants = f"{self.results_dir}/mutants"
+        with tempfile.TemporaryDirectory() as tmp:
+            work = mutants if MUTANT_FILES == "full" else tmp
+            pdb = f"{work}/{tag}.pdb"
+            pdbqt = f"{work}/{tag}.pdbqt"
+            make_pdb(pdb)
+            pdb_to_pdbqt(pdb, pdbqt)
+            if MUTANT_FILES == "full":
+                pdb, pdbqt = (compress_file(p, MUTANT_COMPRESS) for p in (pdb, pdbqt))
+            mut_cx = load_complex(pdb, pdbqt, cache_dir=None, sasa_reference=self.wt_sasa)
+            store_mutant(mutants, tag, self.engine.wt_cx, mut_cx, self.wt_files, pdb, pdbqt)
+        return mut_cx
+
+    def score(self, tag, mut_cx, chain, resid, mutation, label=None):
+        """Score a mutant incrementally against the WT engine and record it
+        (energies.npz, database if RESULTS_DB, CSV export if MUTANT_CSV): (result, ΔΔG)."""
+        result = self.engine.score(mut_cx)
+        if MUTANT_CSV:
+            result.write_csv(f"{self.results_dir}/energies/{tag}.csv")
+        ddg = result.total - self.wt_energy
+        self.scored.append((tag, result))
+        if self.db is not None:
+            upsert_mutation(self.db, self.run_id, tag, chain, resid, mutation, result, ddg,
+                            label=label)
+        return result, ddg
+
+    def close(self):
+        """Write energies.npz (WT first, then the scored mutants) and close the database."""
+        save_results(f"{self.results_dir}/energies.npz",
+                     [r for _, r in self.scored], [t for t, _ in self.scored])
+        if self.db is not None:
+            self.db.close()
@@ -0,0 +1,170 @@
+"""
+ NACCESS output reader (.rsa residue lines, .asa atom lines)
+ Fixed columns are sliced in bulk into typed arrays and aligned to a structure's
+ residue / atom order with one sorted-key join
+"""
+import os
+import numpy as np
+from compressed_io import open_input, strip_compression_suffix
+from pdb_reader import (LINE_WIDTH, ATOM_FIELDS, PdbAtoms, _parse_lines, _columns, _float_column,
+                        _int_column, residue_key_array, join_keys, RECORDS)
+
+# RSA value columns (ABS in Å^2, REL in % of the extended Ala-X-Ala value)
+RSA_COLUMNS = ("all_abs", "all_rel", "side_abs", "side_rel", "main_abs", "main_rel",
+               "apolar_abs", "apolar_rel", "polar_abs", "polar_rel")
+
+# Column used for the solvation term: field 8 of the RES lines, as the earlier
+# parse_naccess_rsa read it (commented there as "Non-polar ABS", it is Main-Chain ABS)
+SOLVATION_COLUMN = "main_abs"
+
+# Field bounds of the RSA values after "RES NAM C NNNNI" (14 characters)
+_RSA_BOUNDS = (14, 22, 28, 35, 41, 48, 54, 61, 67, 74, 80)
+
+
+class RsaTable():
+    ''' Residue lines of a NACCESS .rsa file
+        Residue arrays (n_res): res_name, chain, res_seq, icode (b" " when blank),
+            values (n_res, 10) in RSA_COLUMNS order
+    '''
+    def __init__(self, res_name, chain, res_seq, icode, values):
+        self.res_name = np.asarray(res_name, dtype="S3")
+        self.chain = np.asarray(chain, dtype="S1")
+        self.res_seq = np.asarray(res_seq, dtype=np.int64)
+        self.icode = np.asarray(icode, dtype="S1")
+        self.values = np.asarray(values, dtype=np.float64).reshape(-1, len(RSA_COLUMNS))
+
+    @property
+    def n_res(self):
+        return len(self.res_seq)
+
+    def column(self, name):
+        return self.values[:, RSA_COLUMNS.index(name)]
+
+    def align(self, chain, res_seq, icode, column=SOLVATION_COLUMN, default=0.0):
+        ''' Values of column for the residues (chain, res_seq, icode) of a structure
+            (bytes / int arrays): (values, found mask); missing residues get default
+        '''
+        index = join_keys(residue_key_array(chain, res_seq, icode),
+                          residue_key_array(self.chain, self.res_seq, self.icode))
+        found = index >= 0
+        values = np.full(len(index), float(default))
+        values[found] = self.column(column)[index[found]]
+        return values, found
+
+
+def read_rsa(path):
+    ''' RsaTable of the RES lines of a NACCESS .rsa file '''
+    lines = []
+    with open_input(path, "rb") as f:
+        for line in f:
+            if line.startswith(b"RES "):
+                lines.append(line.rstrip(b"\r\n"))
+
+    lines = np.asarray(lines, dtype=f"S{LINE_WIDTH}").reshape(-1)
+    buf = lines.view(np.uint8).reshape(len(lines), LINE_WIDTH).copy()
+    buf[buf == 0] = ord(" ")
+    values = np.stack([_float_column(_columns(buf, a, b), 0.0)
+                       for a, b in zip(_RSA_BOUNDS[:-1], _RSA_BOUNDS[1:])], axis=1)
+    return RsaTable(np.char.strip(_columns(buf, 4, 7)), _columns(buf, 8, 9),
+                    _int_column(_columns(buf, 9, 13)), _columns(buf, 13, 14), values)
+
+
+def read_asa(path):
+    ''' PdbAtoms of the atom lines of a NACCESS .asa file, with asa (cols 55-62)
+        and radius (cols 63-68) arrays
+    '''
+    lines = []
+    with open_input(path, "rb") as f:
+        for line in f:
+            if line.startswith(RECORDS):
+                lines.append(line.rstrip(b"\r\n"))
+
+    cols, lines = _parse_lines(lines)
+    # the element columns hold ASA digits in .asa files
+    cols["element"] = np.zeros(len(lines), dtype="S2")
+    atoms = PdbAtoms(*(cols[f] for f in ATOM_FIELDS), lines=lines)
+    buf = lines.view(np.uint8).reshape(atoms.n_atoms, LINE_WIDTH)
+    atoms.asa = _float_column(_columns(buf, 54, 62), 0.0)
+    atoms.radius = _float_column(_columns(buf, 62, 68), 0.0)
+    return atoms
+
+
+def align_atoms(asa_atoms, atoms, default=0.0):
+    ''' Atom ASA of a read_asa result for the atoms of a structure (PdbAtoms),
+        joined by (chain, resseq, icode, name): (values, found mask)
+    '''
+    index = join_keys(atoms.atom_keys(), asa_atoms.atom_keys())
+    found = index >= 0
+    values = np.full(len(index), float(default))
+    values[found] = asa_atoms.asa[index[found]]
+    return values, found
+
+
+def residue_totals(asa_atoms):
+    ''' RsaTable-like residue sums of atom ASA (only the all_abs column is filled) '''
+    s = asa_atoms.res_start[:-1]
+    values = np.zeros((asa_atoms.n_res, len(RSA_COLUMNS)))
+    values[:, 0] = np.bincount(asa_atoms.res_index, weights=asa_atoms.asa, minlength=asa_atoms.n_res)
+    return RsaTable(asa_atoms.res_name[s], asa_atoms.chain[s], asa_atoms.res_seq[s],
+                    asa_atoms.icode[s], values)
+
+
+def bound_unbound_asa(rsa_complex, rsa_unbound, chain, res_seq, icode, hetero,
+                      column=SOLVATION_COLUMN):
+    ''' Residue ASA in the complex and in the isolated chains for a residue table.
+        rsa_unbound: {chain_id: RSA file of that chain alone}; hetero residues get 0.
+        Returns (asa_bound, asa_unbound, missing_bound, missing_unbound); residues of
+        chains without an unbound file get 0 and are not counted as missing.
+    '''
+    chain = np.asarray(chain, dtype="S4")
+    hetero = np.asarray(hetero, dtype=bool)
+
+    asa_bound, found = read_rsa(rsa_complex).align(chain, res_seq, icode, column)
+    missing_bound = int(np.sum(~found & ~hetero))
+
+    asa_unbound = np.zeros(len(chain))
+    missing_unbound = 0
+    for chain_id, path in rsa_unbound.items():
+        sel = np.flatnonzero(chain == chain_id.encode())
+        if len(sel) == 0:
+            continue
+        values, found = read_rsa(path).align(chain[sel], np.asarray(res_seq)[sel],
+                                             np.asarray(icode)[sel], column)
+        asa_unbound[sel] = values
+        missing_unbound += int(np.sum(~found & ~hetero[sel]))
+
+    asa_bound[hetero] = 0.0
+    asa_unbound[hetero] = 0.0
+    return asa_bound, asa_unbound, missing_bound, missing_unbound
+
+
+def asa_companion(rsa_path):
+    ''' The .asa file NACCESS wrote next to an .rsa file, or None '''
+    plain = strip_compression_suffix(rsa_path)
+    path = os.path.splitext(plain)[0] + ".asa" + rsa_path[len(plain):]
+    return path if os.path.exists(path) else None
+
+
+def bound_unbound_atom_asa(rsa_complex, rsa_unbound, atoms):
+    ''' Per-atom ASA of a structure (PdbAtoms) in the complex and in the isolated chains,
+        from the .asa companions of the RSA files (asa_companion).
+        Returns (atom_bound, atom_unbound); both are NaN when an .asa file is missing,
+        atoms not in the files and hetero atoms get 0, as do the atoms of chains
+        without an unbound file.
+    '''
+    atom_bound = np.full(atoms.n_atoms, np.nan)
+    atom_unbound = np.full(atoms.n_atoms, np.nan)
+    asa_complex = asa_companion(rsa_complex)
+    asa_unbound = {c: asa_companion(p) for c, p in rsa_unbound.items()}
+    if asa_complex is None or None in asa_unbound.values():
+        return atom_bound, atom_unbound
+
+    atom_bound, _ = align_atoms(read_asa(asa_complex), atoms)
+    atom_unbound = np.zeros(atoms.n_atoms)
+    for chain_id, path in asa_unbound.items():
+        sel = atoms.chain == chain_id.encode()
+        if sel.any():
+            atom_unbound[sel] = align_atoms(read_asa(path), atoms)[0][sel]
+    atom_bound[atoms.hetero] = 0.0
+    atom_unbound[atoms.hetero] = 0.0
+    return atom_bound, atom_unbound
@@ -0,0 +1,106 @@
+"""
+ Cell-list neighbour search on coordinate arrays
+ Returns every cross-set atom pair within a cutoff in vectorized passes,
+ optionally tiled so the candidate arrays stay under a fixed size
+"""
+import numpy as np
+
+# 27 neighbouring cell offsets (including the cell itself)
+_OFFSETS = np.array([(dx, dy, dz)
+                     for dx in (-1, 0, 1)
+                     for dy in (-1, 0, 1)
+                     for dz in (-1, 0, 1)], dtype=np.int64)
+
+# Rough memory per candidate pair in a tile (indices, difference vector, distance, masks)
+BYTES_PER_CANDIDATE = 96
+
+
+def _expand_ranges(lo, counts):
+    ''' Concatenate arange(lo[k], lo[k] + counts[k]) for every k '''
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    return np.arange(total) - np.repeat(starts - lo, counts)
+
+
+def max_candidates_for(memory_mb):
+    ''' Tile size (candidate pairs) that fits a memory budget in MB; None for no limit '''
+    if not memory_mb:
+        return None
+    return max(1, int(memory_mb * 1024 * 1024) // BYTES_PER_CANDIDATE)
+
+
+def cross_pairs_blocks(xyz_a, xyz_b, cutoff, max_candidates=None):
+    ''' Yield (i, j, r) chunks covering all pairs with |xyz_a[i] - xyz_b[j]| <= cutoff.
+        xyz_a is processed in spatially sorted tiles of at most max_candidates
+        cell-list candidates (a single atom may exceed it); None = one tile.
+    '''
+    xyz_a = np.asarray(xyz_a, dtype=np.float64).reshape(-1, 3)
+    xyz_b = np.asarray(xyz_b, dtype=np.float64).reshape(-1, 3)
+    if len(xyz_a) == 0 or len(xyz_b) == 0:
+        return
+
+    origin = np.minimum(xyz_a.min(axis=0), xyz_b.min(axis=0))
+    cell_a = np.floor((xyz_a - origin) / cutoff).astype(np.int64) + 1
+    cell_b = np.floor((xyz_b - origin) / cutoff).astype(np.int64) + 1
+    # one empty cell of padding on every side, so offsets never wrap
+    dims = np.maximum(cell_a.max(axis=0), cell_b.max(axis=0)) + 2
+
+    def key(cells):
+        return (cells[..., 0] * dims[1] + cells[..., 1]) * dims[2] + cells[..., 2]
+
+    key_a = key(cell_a)
+    key_b = key(cell_b)
+    order_b = np.argsort(key_b, kind="stable")
+    sorted_keys = key_b[order_b]
+    offset_keys = key(_OFFSETS)  # the cell key is linear in the cell indices
+
+    def candidates(atoms):
+        lo, counts = [], []
+        for off in offset_keys:
+            k = key_a[atoms] + off
+            lo_k = np.searchsorted(sorted_keys, k, side="left")
+            lo.append(lo_k)
+            counts.append(np.searchsorted(sorted_keys, k, side="right") - lo_k)
+        return lo, counts
+
+    # Spatial order keeps each tile compact; tiles are cut on cumulative candidate counts
+    order_a = np.argsort(key_a, kind="stable")
+    if max_candidates is None:
+        bounds = [0, len(order_a)]
+    else:
+        per_atom = np.zeros(len(order_a), dtype=np.int64)
+        for off in offset_keys:
+            k = key_a[order_a] + off
+            per_atom += (np.searchsorted(sorted_keys, k, side="right")
+                         - np.searchsorted(sorted_keys, k, side="left"))
+        cum = np.cumsum(per_atom)
+        bounds = [0]
+        while bounds[-1] < len(order_a):
+            start = bounds[-1]
+            base = cum[start - 1] if start else 0
+            stop = int(np.searchsorted(cum, base + max_candidates, side="right"))
+            bounds.append(max(stop, start + 1))
+
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        atoms = order_a[start:stop]
+        lo, counts = candidates(atoms)
+        i = np.concatenate([np.repeat(atoms, c) for c in counts])
+        j = np.concatenate([order_b[_expand_ranges(l, c)] for l, c in zip(lo, counts)])
+        d = xyz_a[i] - xyz_b[j]
+        r = np.sqrt(np.einsum("ij,ij->i", d, d))
+        keep = r <= cutoff
+        yield i[keep], j[keep], r[keep]
+
+
+def cross_pairs(xyz_a, xyz_b, cutoff, max_candidates=None):
+    ''' All (i, j) with |xyz_a[i] - xyz_b[j]| <= cutoff.
+        Returns (i, j, r) arrays sorted by i, then j.
+    '''
+    chunks = list(cross_pairs_blocks(xyz_a, xyz_b, cutoff, max_candidates))
+    if not chunks:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    i, j, r = (np.concatenate(c) for c in zip(*chunks))
+    order = np.lexsort((j, i))
+    return i[order], j[order], r[order]
@@ -0,0 +1,487 @@
+"""
+ Fixed-column PDB / PDBQT readers
+ Slices the ATOM/HETATM columns of a PDB file in bulk into NumPy arrays
+ (no Biopython object tree); chains and altlocs can be filtered at read time.
+ PDBQT charges / AutoDock types are joined to PDB atoms by atom name, not by position.
+ Compressed inputs (gzip / bzip2 / xz) are read transparently.
+"""
+import numpy as np
+from compressed_io import open_input, open_output, strip_compression_suffix
+
+RECORDS = (b"ATOM  ", b"HETATM")
+LINE_WIDTH = 80
+
+
+def _columns(buf, start, stop):
+    ''' Fixed columns [start, stop) (0-based) of a (n, 80) byte matrix as an S array '''
+    return np.ascontiguousarray(buf[:, start:stop]).view(f"S{stop - start}").ravel()
+
+
+def _float_column(col, default):
+    blank = np.char.strip(col) == b""
+    if blank.any():
+        col = np.where(blank, str(default).encode(), col)
+    try:
+        return col.astype(np.float64)
+    except ValueError:
+        # malformed values: default
+        out = np.full(len(col), float(default))
+        for k, v in enumerate(col):
+            try:
+                out[k] = float(v)
+            except ValueError:
+                pass
+        return out
+
+
+def _hybrid36(value, width):
+    ''' Integer of a hybrid-36 field (e.g. resSeq "A000" = 10000), ValueError if it is none '''
+    value = value.strip()
+    if len(value) == width and value[:1].isalpha():
+        if value.isupper():
+            return int(value, 36) - 10 * 36 ** (width - 1) + 10 ** width
+        if value.islower():
+            return int(value, 36) + 16 * 36 ** (width - 1) + 10 ** width
+    return int(value)
+
+
+def _int_column(col, default=0):
+    ''' Integer fields of an S array; hybrid-36 values are decoded, blank or malformed
+        ones get default
+    '''
+    try:
+        return col.astype(np.int64)
+    except ValueError:
+        width = col.dtype.itemsize
+        out = np.full(len(col), int(default), dtype=np.int64)
+        for k, v in enumerate(col.tolist()):
+            try:
+                out[k] = _hybrid36(v.decode(), width)
+            except ValueError:
+                pass
+        return out
+
+
+def _guess_element(names):
+    ''' Element from the atom name when the element column is blank (first letter) '''
+    return np.array([bytes([c for c in n if chr(c).isalpha()][:1]) for n in names], dtype="S2")
+
+
+def _atom_keys(chain, res_seq, icode, name):
+    ''' One bytes key per atom for (chain, resseq, icode, name); the chain is delimited so
+        multi-character (mmCIF) chain ids cannot run into the insertion code
+    '''
+    return np.char.add(np.char.add(np.char.add(chain, b"|"), icode),
+                       np.char.add(np.asarray(res_seq).astype("S8"), np.char.add(b":", name)))
+
+
+def residue_key_array(chain, res_seq, icode):
+    ''' One bytes key per residue for (chain, resseq, icode) (bytes columns, icode b" " if blank) '''
+    chain = np.asarray(chain, dtype="S4")
+    return _atom_keys(chain, res_seq, np.asarray(icode, dtype="S1"), np.zeros(len(chain), dtype="S1"))
+
+
+def join_keys(keys, ref_keys):
+    ''' Index of the first ref_keys entry equal to each key (-1 where none), via one sort '''
+    order = np.argsort(ref_keys, kind="stable")
+    sorted_keys = ref_keys[order]
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), max(len(sorted_keys) - 1, 0))
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), -1, dtype=np.int64)
+    return np.where(sorted_keys[pos] == keys, order[pos], -1)
+
+
+def _select_altloc(chain, res_seq, icode, name, altloc, occupancy, keep):
+    ''' Mask of the records to keep for altloc ("best": highest occupancy per atom,
+        first one on ties, as Biopython does; a letter: blank or that letter; None: all)
+    '''
+    if keep is None:
+        return np.ones(len(altloc), dtype=bool)
+    blank = altloc == b" "
+    if keep != "best":
+        return blank | (altloc == keep.encode())
+
+    mask = blank.copy()
+    alt = np.flatnonzero(~blank)
+    if len(alt):
+        key = _atom_keys(chain[alt], res_seq[alt], icode[alt], name[alt])
+        # per atom: highest occupancy, then first in file
+        order = np.lexsort((alt, -occupancy[alt], key))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = key[order][1:] != key[order][:-1]
+        mask[alt[order[first]]] = True
+    return mask
+
+
+# Per-atom columns of PdbAtoms, in constructor order
+ATOM_FIELDS = ("record", "serial", "name", "altloc", "res_name", "chain", "res_seq", "icode",
+               "xyz", "occupancy", "bfactor", "element")
+
+
+def _parse_lines(lines):
+    ''' {field: array} for ATOM_FIELDS from PDB ATOM/HETATM lines, plus the padded lines '''
+    lines = np.asarray(lines, dtype=f"S{LINE_WIDTH}").reshape(-1)
+    buf = lines.view(np.uint8).reshape(len(lines), LINE_WIDTH).copy()
+    buf[buf == 0] = ord(" ")
+
+    cols = {"record": np.char.strip(_columns(buf, 0, 6))}
+    try:
+        cols["serial"] = _columns(buf, 6, 11).astype(np.int64)
+    except ValueError:
+        # hybrid-36 / overflowed serial numbers: use the record order
+        cols["serial"] = np.arange(1, len(buf) + 1)
+    cols["name"] = np.char.strip(_columns(buf, 12, 16))
+    cols["altloc"] = _columns(buf, 16, 17)
+    cols["res_name"] = np.char.strip(_columns(buf, 17, 20))
+    cols["chain"] = _columns(buf, 21, 22)
+    cols["res_seq"] = _int_column(_columns(buf, 22, 26))
+    cols["icode"] = _columns(buf, 26, 27)
+    cols["xyz"] = np.stack([_columns(buf, 30, 38).astype(np.float64),
+                            _columns(buf, 38, 46).astype(np.float64),
+                            _columns(buf, 46, 54).astype(np.float64)], axis=1).reshape(-1, 3)
+    cols["occupancy"] = _float_column(_columns(buf, 54, 60), 1.0)
+    cols["bfactor"] = _float_column(_columns(buf, 60, 66), 0.0)
+    cols["element"] = np.char.strip(_columns(buf, 76, 78))
+    return cols, buf.view(f"S{LINE_WIDTH}").ravel()
+
+
+def _put(buf, start, col):
+    ''' Write an S array into the fixed columns starting at start (0-based) '''
+    width = col.dtype.itemsize
+    buf[:, start:start + width] = np.ascontiguousarray(col).view(np.uint8).reshape(len(col), width)
+
+
+def _fmt(fmt, values, width):
+    ''' values formatted with fmt (e.g. "%8.3f"), as an S{width} array '''
+    return np.char.mod(fmt, values).astype(f"S{width}")
+
+
+def format_pdb_lines(atoms):
+    ''' Fixed-column ATOM/HETATM lines for a PdbAtoms, formatted column by column over
+        all atoms at once (chain ids are cut to one character)
+    '''
+    n = atoms.n_atoms
+    if n == 0:
+        return np.zeros(0, dtype=f"S{LINE_WIDTH}")
+    # 78 columns of text; the two trailing columns stay empty (stripped on output)
+    buf = np.zeros((n, LINE_WIDTH), dtype=np.uint8)
+    buf[:, :78] = ord(" ")
+
+    # names of one-letter elements start in column 14
+    shift = (np.char.str_len(atoms.name) < 4) & (np.char.str_len(atoms.element) < 2)
+    name = np.where(shift, np.char.add(b" ", atoms.name), atoms.name)
+
+    _put(buf, 0, np.char.ljust(atoms.record, 6).astype("S6"))
+    _put(buf, 6, _fmt("%5d", atoms.serial % 100000, 5))
+    _put(buf, 12, np.char.ljust(name, 4).astype("S4"))
+    _put(buf, 16, atoms.altloc)
+    _put(buf, 17, np.char.rjust(atoms.res_name, 3).astype("S3"))
+    _put(buf, 21, np.char.ljust(atoms.chain.astype("S1"), 1).astype("S1"))
+    _put(buf, 22, _fmt("%4d", atoms.res_seq, 4))
+    _put(buf, 26, atoms.icode)
+    for k in range(3):
+        _put(buf, 30 + 8 * k, _fmt("%8.3f", atoms.xyz[:, k], 8))
+    _put(buf, 54, _fmt("%6.2f", atoms.occupancy, 6))
+    _put(buf, 60, _fmt("%6.2f", atoms.bfactor, 6))
+    _put(buf, 76, np.char.rjust(atoms.element, 2).astype("S2"))
+    return buf.view(f"S{LINE_WIDTH}").ravel()
+
+
+def _ter_line(line):
+    ''' TER record closing the chain whose last ATOM/HETATM line is line '''
+    try:
+        serial = b"%5d" % (int(line[6:11]) + 1)
+    except ValueError:
+        serial = b"     "
+    return (b"TER   " + serial + b"      " + line[17:27]).rstrip() + b"\n"
+
+
+def _pdb_body(lines, ter_at_end=True):
+    ''' PDB text of ATOM/HETATM lines with a TER record after each chain (and after the
+        last line if ter_at_end), plus the byte offset of every line (n + 1 entries)
+    '''
+    lines = np.ascontiguousarray(np.asarray(lines, dtype=f"S{LINE_WIDTH}").reshape(-1))
+    if len(lines) == 0:
+        return b"", np.zeros(1, dtype=np.int64)
+    text = np.char.add(np.char.rstrip(lines), b"\n")
+    chain = lines.view(np.uint8).reshape(len(lines), LINE_WIDTH)[:, 21]
+    ends = np.append(np.flatnonzero(chain[1:] != chain[:-1]), len(lines) - 1 if ter_at_end else -1)
+    ends = ends[ends >= 0]
+
+    parts = []
+    size = np.char.str_len(text).astype(np.int64)
+    start = 0
+    for k in ends:
+        parts.append(b"".join(text[start:k + 1].tolist()))
+        ter = _ter_line(lines[k])
+        parts.append(ter)
+        size[k] += len(ter)
+        start = k + 1
+    parts.append(b"".join(text[start:].tolist()))
+    return b"".join(parts), np.concatenate([[0], np.cumsum(size)])
+
+
+def pdb_text(lines):
+    ''' Whole PDB file text (lines, TER after each chain, END) as one bytes object '''
+    return _pdb_body(lines)[0] + b"END\n"
+
+
+def write_pdb_text(path, text):
+    ''' Write PDB text in one call (compressed when path ends in .gz / .bz2 / .xz) '''
+    with open_output(path, "wb") as f:
+        f.write(text)
+
+
+class PdbAtoms():
+    ''' Columnar ATOM/HETATM records of one model
+        Atom arrays (n_atoms): record, serial, name, altloc, res_name, chain, res_seq, icode,
+            xyz, occupancy, bfactor, element, hetero, and the 80-column PDB lines
+            (the source lines for PDB input, formatted on first use otherwise)
+        Residues are runs of records with the same (chain, res_seq, icode, res_name):
+            res_index (per atom) and res_start (n_res + 1 atom offsets)
+        Text columns are stripped bytes (S dtype); icode / altloc keep b" " when blank.
+    '''
+    def __init__(self, record, serial, name, altloc, res_name, chain, res_seq, icode,
+                 xyz, occupancy, bfactor, element, lines=None):
+        self.record = np.asarray(record, dtype="S6")
+        self.serial = np.asarray(serial, dtype=np.int64)
+        self.name = np.asarray(name, dtype="S4")
+        self.altloc = np.asarray(altloc, dtype="S1")
+        self.res_name = np.asarray(res_name, dtype="S3")
+        self.chain = np.asarray(chain, dtype="S4")
+        self.res_seq = np.asarray(res_seq, dtype=np.int64)
+        self.icode = np.asarray(icode, dtype="S1")
+        self.xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+        self.occupancy = np.asarray(occupancy, dtype=np.float64)
+        self.bfactor = np.asarray(bfactor, dtype=np.float64)
+        self.element = np.char.upper(np.asarray(element, dtype="S2"))
+        blank = self.element == b""
+        if blank.any():
+            self.element[blank] = _guess_element(self.name[blank])
+        self.hetero = self.record == b"HETATM"
+        self._lines = lines
+
+        n = len(self.record)
+        new_res = np.ones(n, dtype=bool)
+        new_res[1:] = ((self.chain[1:] != self.chain[:-1]) | (self.res_seq[1:] != self.res_seq[:-1])
+                       | (self.icode[1:] != self.icode[:-1]) | (self.res_name[1:] != self.res_name[:-1]))
+        self.res_index = np.cumsum(new_res) - 1
+        self.res_start = np.append(np.flatnonzero(new_res), n).astype(np.int64)
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = format_pdb_lines(self)
+        return self._lines
+
+    @property
+    def n_atoms(self):
+        return len(self.record)
+
+    @property
+    def n_res(self):
+        return len(self.res_start) - 1
+
+    def chain_ids(self):
+        ''' Chain ids in order of first appearance '''
+        _, first = np.unique(self.chain, return_index=True)
+        return [c.decode() for c in self.chain[np.sort(first)]]
+
+    def residue_keys(self):
+        ''' (chain, resseq, icode) per residue, icode " " when blank '''
+        s = self.res_start[:-1]
+        return [(c.decode(), int(n), i.decode())
+                for c, n, i in zip(self.chain[s], self.res_seq[s], self.icode[s])]
+
+    def atom_keys(self):
+        ''' (chain, resseq, icode, name) key per atom, as sortable bytes '''
+        return _atom_keys(self.chain, self.res_seq, self.icode, self.name)
+
+    def residue_names(self):
+        return [r.decode() for r in self.res_name[self.res_start[:-1]]]
+
+    def select(self, mask):
+        ''' New PdbAtoms with the records where mask (bool or index array) is set '''
+        return PdbAtoms(*(getattr(self, f)[mask] for f in ATOM_FIELDS),
+                        lines=None if self._lines is None else self._lines[mask])
+
+    def write(self, path, lines=None):
+        ''' Write the records (or the given PDB lines) with TER after each chain and END,
+            formatted into one buffer and written in one call
+            (compressed when path ends in .gz / .bz2 / .xz)
+        '''
+        write_pdb_text(path, pdb_text(self.lines if lines is None else lines))
+
+
+class PdbTemplate():
+    ''' PDB text of a structure kept as one bytes object with the offset of every atom
+        line, so structures that differ in a few residues (point mutants) are written by
+        copying the unchanged text around the residue blocks that change
+    '''
+    def __init__(self, atoms):
+        self.atoms = atoms
+        self.body, self.offsets = _pdb_body(atoms.lines)
+
+    def residue_lines(self, r):
+        s, e = self.atoms.res_start[r], self.atoms.res_start[r + 1]
+        return self.atoms.lines[s:e]
+
+    def text(self, replace=None):
+        ''' PDB text with residue blocks replaced: replace = {residue index: lines} '''
+        parts = []
+        pos = 0
+        res_start = self.atoms.res_start
+        for r in sorted(replace or {}):
+            s, e = res_start[r], res_start[r + 1]
+            # the residue block includes the TER record when the chain ends there
+            chain_end = e == self.atoms.n_atoms or self.atoms.chain[e] != self.atoms.chain[e - 1]
+            parts.append(self.body[self.offsets[pos]:self.offsets[s]])
+            parts.append(_pdb_body(replace[r], ter_at_end=chain_end)[0])
+            pos = e
+        parts.append(self.body[self.offsets[pos]:])
+        parts.append(b"END\n")
+        return b"".join(parts)
+
+    def write(self, path, replace=None):
+        write_pdb_text(path, self.text(replace))
+
+
+def group_chains(atoms):
+    ''' Records grouped by chain, in order of first appearance (e.g. trailing HETATM blocks) '''
+    _, first, inv = np.unique(atoms.chain, return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first))
+    order = np.argsort(rank[inv.ravel()], kind="stable")
+    return atoms if np.all(order == np.arange(len(order))) else atoms.select(order)
+
+
+def select_altloc(atoms, altloc="best"):
+    ''' Records kept for altloc ("best", a letter, or None) '''
+    keep = _select_altloc(atoms.chain, atoms.res_seq, atoms.icode, atoms.name,
+                          atoms.altloc, atoms.occupancy, altloc)
+    return atoms if keep.all() else atoms.select(keep)
+
+
+def read_pdb_atoms(path, chains=None, altloc="best", hetatm=True):
+    ''' PdbAtoms of the first model of a PDB file.
+        chains: chain ids to keep (None: all); altloc: "best", a letter, or None (keep all);
+        hetatm: keep HETATM records
+    '''
+    records = RECORDS if hetatm else RECORDS[:1]
+    if chains is not None:
+        chains = {c.encode() for c in chains}
+
+    lines = []
+    with open_input(path, "rb") as f:
+        for line in f:
+            if line.startswith(records):
+                if chains is None or line[21:22] in chains:
+                    lines.append(line.rstrip(b"\r\n"))
+            elif line.startswith(b"ENDMDL"):
+                break
+
+    cols, lines = _parse_lines(lines)
+    atoms = PdbAtoms(*(cols[f] for f in ATOM_FIELDS), lines=lines)
+    return select_altloc(group_chains(atoms), altloc)
+
+
+def read_atoms(path, chains=None, altloc="best", hetatm=True):
+    ''' PdbAtoms of a PDB or mmCIF (.cif / .mmcif, optionally .gz / .bz2 / .xz) file;
+        see read_pdb_atoms
+    '''
+    if is_cif(path):
+        from cif_reader import read_cif_atoms
+        return read_cif_atoms(path, chains=chains, altloc=altloc, hetatm=hetatm)
+    return read_pdb_atoms(path, chains=chains, altloc=altloc, hetatm=hetatm)
+
+
+def is_cif(path):
+    return strip_compression_suffix(path).lower().endswith((".cif", ".mmcif"))
+
+
+# ---------------------------
+# PDBQT (charge cols 71-76, AutoDock type cols 78-79) and name-based matching
+# ---------------------------
+def read_pdbqt_atoms(path):
+    ''' PdbAtoms of the ATOM/HETATM records of a PDBQT file, in file order,
+        with charge (float64) and ad_type (stripped bytes) arrays
+    '''
+    lines = []
+    with open_input(path, "rb") as f:
+        for line in f:
+            if line.startswith(RECORDS):
+                lines.append(line.rstrip(b"\r\n"))
+
+    cols, lines = _parse_lines(lines)
+    atoms = PdbAtoms(*(cols[f] for f in ATOM_FIELDS), lines=lines)
+    buf = lines.view(np.uint8).reshape(atoms.n_atoms, LINE_WIDTH)
+    atoms.charge = _float_column(_columns(buf, 70, 76), 0.0)
+    atoms.ad_type = np.char.strip(_columns(buf, 77, 79))
+    return atoms
+
+
+def biopython_keys(model):
+    ''' Atoms and residues of a Biopython model (get_atoms / get_residues order) with their
+        (chain, resseq, icode, name) and (chain, resseq, icode) keys, as atom_keys() and
+        residue_key_array build them: (atoms, residues, atom keys, residue keys)
+    '''
+    residues = list(model.get_residues())
+    atoms = list(model.get_atoms())
+    res_chain = np.array([r.get_parent().id for r in residues], dtype="S4")
+    res_seq = np.array([r.id[1] for r in residues], dtype=np.int64)
+    res_icode = np.array([r.id[2] or " " for r in residues], dtype="S1")
+    res_keys = residue_key_array(res_chain, res_seq, res_icode)
+
+    owner = np.repeat(np.arange(len(residues)), [len(list(r.get_atoms())) for r in residues])
+    names = np.array([a.get_id().strip() for a in atoms], dtype="S4")
+    atom_keys = _atom_keys(res_chain[owner], res_seq[owner], res_icode[owner], names)
+    return atoms, residues, atom_keys, res_keys
+
+
+def match_atoms(atoms, ref):
+    ''' Index of the ref record matching each record of atoms by (chain, resseq, icode, name),
+        -1 where there is none. Keys repeated in ref (e.g. alternate locations written
+        without altloc ids) go to the nearest coordinates.
+        Returns (index, report) with report = {"matched", "missing", "ambiguous", "unused"}
+        (unused: ref records whose key matches no atom).
+    '''
+    key = atoms.atom_keys()
+    ref_key = ref.atom_keys()
+    order = np.argsort(ref_key, kind="stable")
+    sorted_keys = ref_key[order]
+    lo = np.searchsorted(sorted_keys, key, side="left")
+    counts = np.searchsorted(sorted_keys, key, side="right") - lo
+
+    index = np.full(len(key), -1, dtype=np.int64)
+    unique = counts == 1
+    index[unique] = order[lo[unique]]
+    for k in np.flatnonzero(counts > 1):
+        cand = order[lo[k]:lo[k] + counts[k]]
+        index[k] = cand[np.argmin(np.sum((ref.xyz[cand] - atoms.xyz[k]) ** 2, axis=1))]
+
+    # unused: ref keys with no atom at all (alternate copies of a matched key are not counted)
+    report = {"matched": int(np.sum(index >= 0)), "missing": int(np.sum(counts == 0)),
+              "ambiguous": int(np.sum(counts > 1)), "unused": int(np.sum(~np.isin(ref_key, key)))}
+    return index, report
+
+
+def pdbqt_charges(atoms, pdbqt_file, type_names, default_type="C"):
+    ''' Charge and AutoDock type of every PDB record from a PDBQT file, matched by name.
+        Unmatched atoms (and types not in type_names) fall back to charge 0.0 / default_type.
+        Returns (charge, atom_type (str array), report); mismatches are printed.
+    '''
+    qt = read_pdbqt_atoms(pdbqt_file)
+    index, report = match_atoms(atoms, qt)
+    found = index >= 0
+
+    charge = np.zeros(atoms.n_atoms)
+    charge[found] = qt.charge[index[found]]
+    atom_type = np.full(atoms.n_atoms, default_type, dtype=object)
+    atom_type[found] = [t.decode() for t in qt.ad_type[index[found]]]
+    atom_type[~np.isin(atom_type, list(type_names))] = default_type
+
+    if report["missing"] or report["unused"]:
+        keys = atoms.atom_keys()[~found][:5]
+        print(f"PDBQT mismatch ({pdbqt_file}): {report['missing']} PDB atoms without a PDBQT record"
+              f" (charge 0.0, type {default_type}), {report['unused']} PDBQT records unused"
+              + (f"; e.g. {', '.join(k.decode() for k in keys)}" if len(keys) else ""))
+    return charge, atom_type.astype(str), report
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+ SQLite store of scan results
+ runs (WT inputs by content hash + scoring parameters), mutations (one row per scored
+ structure with its totals and ΔΔG) and residue_terms (per-residue energy rows), indexed
+ on (chain, resid, mutation) so per-site and hotspot lookups are index queries.
+ The database runs in WAL mode with a busy timeout and every upsert is one
+ BEGIN IMMEDIATE transaction, so parallel workers can write to the same file
+
+ Query:
+   python src/results_db.py --site E501
+   python src/results_db.py --top 20
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from complex_cache import file_hash
+
+DEFAULT_DB = os.path.join("results", "scans.sqlite")
+SCHEMA_VERSION = 1
+
+# Seconds a writer waits for the lock held by another worker
+BUSY_TIMEOUT = 60.0
+
+# Tag / mutation of the WT row of each run
+WT_TAG = "WT"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    input_hash  TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    wt_pdb      TEXT,
+    wt_pdbqt    TEXT,
+    wt_total    REAL,
+    created     TEXT NOT NULL DEFAULT (datetime('now')),
+    UNIQUE (kind, input_hash, params)
+);
+CREATE TABLE IF NOT EXISTS mutations (
+    mutation_id INTEGER PRIMARY KEY,
+    run_id      INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    tag         TEXT NOT NULL,
+    label       TEXT,
+    chain       TEXT NOT NULL,
+    resid       INTEGER NOT NULL,
+    mutation    TEXT NOT NULL,
+    elec        REAL,
+    vdw         REAL,
+    solv        REAL,
+    total       REAL,
+    ddg         REAL,
+    updated     TEXT NOT NULL DEFAULT (datetime('now')),
+    UNIQUE (run_id, tag)
+);
+CREATE INDEX IF NOT EXISTS mutations_site ON mutations (chain, resid, mutation);
+CREATE INDEX IF NOT EXISTS mutations_ddg ON mutations (ddg);
+CREATE TABLE IF NOT EXISTS residue_terms (
+    mutation_id INTEGER NOT NULL REFERENCES mutations (mutation_id) ON DELETE CASCADE,
+    chain       TEXT NOT NULL,
+    resid       INTEGER NOT NULL,
+    elec        REAL,
+    vdw         REAL,
+    solv        REAL,
+    total       REAL
+);
+CREATE INDEX IF NOT EXISTS residue_terms_mutation ON residue_terms (mutation_id);
+CREATE INDEX IF NOT EXISTS residue_terms_site ON residue_terms (chain, resid, mutation_id);
+"""
+
+
+def connect(path=DEFAULT_DB, timeout=BUSY_TIMEOUT):
+    ''' Connection to the results database (created with its schema if needed) '''
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    con = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA foreign_keys=ON")
+    with transaction(con):
+        for statement in _SCHEMA.split(";"):
+            if statement.strip():
+                con.execute(statement)
+        con.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return con
+
+
+@contextmanager
+def transaction(con):
+    ''' BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error): takes the write lock up front,
+        so concurrent writers queue on the busy timeout instead of failing mid-transaction
+    '''
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+
+
+def inputs_hash(paths):
+    ''' Content hash of input files (complex directories: all their files) '''
+    h = hashlib.sha256()
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                h.update(name.encode())
+                h.update(file_hash(os.path.join(path, name)).encode())
+        else:
+            h.update(file_hash(path).encode())
+    return h.hexdigest()
+
+
+def scan_params(engine):
+    ''' Scoring parameters of an InterfaceDdgEngine, as stored with its runs '''
+    return {"chain_1": engine.chain_1, "chain_2": engine.chain_2,
+            "cutoff_contact": engine.cutoff_contact, "cutoff_energy": engine.cutoff_energy,
+            "solvation": engine.solvation_model, "solvation_atoms": engine.solvation_atoms}
+
+
+def upsert_run(con, kind, input_hash, params, wt_pdb=None, wt_pdbqt=None, wt_total=None):
+    ''' run_id of the (kind, input_hash, params) run, created or updated '''
+    params = json.dumps(params, sort_keys=True)
+    with transaction(con):
+        con.execute(
+            "INSERT INTO runs (kind, input_hash, params, wt_pdb, wt_pdbqt, wt_total) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (kind, input_hash, params) DO UPDATE SET "
+            "wt_pdb = excluded.wt_pdb, wt_pdbqt = excluded.wt_pdbqt, wt_total = excluded.wt_total",
+            (kind, input_hash, params, wt_pdb, wt_pdbqt, wt_total))
+        row = con.execute("SELECT run_id FROM runs WHERE kind = ? AND input_hash = ? AND params = ?",
+                          (kind, input_hash, params)).fetchone()
+    return int(row["run_id"])
+
+
+def upsert_mutation(con, run_id, tag, chain, resid, mutation, result, ddg, label=None):
+    ''' Store one scored structure (InterfaceEnergies) and its per-residue terms,
+        replacing an earlier row with the same (run_id, tag); returns mutation_id
+    '''
+    res = result.residue_columns()
+    columns = (res["chain"].tolist(), res["residue"].tolist(), res["elec"].tolist(),
+               res["vdw"].tolist(), res["solv"].tolist(), res["total"].tolist())
+    with transaction(con):
+        con.execute(
+            "INSERT INTO mutations (run_id, tag, label, chain, resid, mutation, elec, vdw, solv, total, ddg) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (run_id, tag) DO UPDATE SET "
+            "label = excluded.label, chain = excluded.chain, resid = excluded.resid, "
+            "mutation = excluded.mutation, elec = excluded.elec, vdw = excluded.vdw, "
+            "solv = excluded.solv, total = excluded.total, ddg = excluded.ddg, "
+            "updated = datetime('now')",
+            (run_id, tag, label, chain, int(resid), mutation,
+             result.elec, result.vdw, result.solv, result.total, ddg))
+        mutation_id = int(con.execute("SELECT mutation_id FROM mutations WHERE run_id = ? AND tag = ?",
+                                      (run_id, tag)).fetchone()["mutation_id"])
+        con.execute("DELETE FROM residue_terms WHERE mutation_id = ?", (mutation_id,))
+        con.executemany(
+            "INSERT INTO residue_terms (mutation_id, chain, resid, elec, vdw, solv, total) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", ((mutation_id, *row) for row in zip(*columns)))
+    return mutation_id
+
+
+def upsert_wt(con, run_id, result):
+    ''' Store the WT result of a run (tag WT, ΔΔG 0) '''
+    return upsert_mutation(con, run_id, WT_TAG, "", 0, WT_TAG, result, 0.0)
+
+
+# ---------------------------
+# Queries
+# ---------------------------
+_SITE = re.compile(r"^(?P<chain>[^\W_]+?)[:_]?(?P<resid>-?\d+)$")
+
+
+def parse_site(site):
+    ''' "E501" -> ("E", 501); chain ids of several characters (mmCIF) take a separator
+        when they end in a digit: "AA501", "B2:501", "B2_501"
+    '''
+    m = _SITE.match(site.strip())
+    if m is None:
+        raise ValueError(f"Cannot parse site '{site}' (chain then residue number, e.g. E501)")
+    return m["chain"], int(m["resid"])
+
+
+def ddg_at(con, chain, resid, mutation=None):
+    ''' ΔΔG rows of all runs at one site (optionally one target residue) '''
+    sql = ("SELECT m.*, r.kind FROM mutations m JOIN runs r USING (run_id) "
+           "WHERE m.chain = ? AND m.resid = ?")
+    args = [chain, int(resid)]
+    if mutation is not None:
+        sql += " AND m.mutation = ?"
+        args.append(mutation)
+    return con.execute(sql + " ORDER BY m.ddg DESC", args).fetchall()
+
+
+def top_hotspots(con, n=20, kind=None):
+    ''' n mutations with the largest ΔΔG across runs (optionally one scan kind) '''
+    sql = ("SELECT m.*, r.kind FROM mutations m JOIN runs r USING (run_id) "
+           "WHERE m.tag != ?")
+    args = [WT_TAG]
+    if kind is not None:
+        sql += " AND r.kind = ?"
+        args.append(kind)
+    return con.execute(sql + " ORDER BY m.ddg DESC LIMIT ?", args + [int(n)]).fetchall()
+
+
+def residue_terms_at(con, chain, resid):
+    ''' Per-residue energy rows of one residue in every stored structure '''
+    return con.execute(
+        "SELECT t.*, m.tag, m.run_id FROM residue_terms t JOIN mutations m USING (mutation_id) "
+        "WHERE t.chain = ? AND t.resid = ? ORDER BY m.run_id, m.tag",
+        (chain, int(resid))).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the scan results database.")
+    parser.add_argument("--db", default=os.environ.get("RESULTS_DB") or DEFAULT_DB,
+                        help="SQLite file (RESULTS_DB)")
+    parser.add_argument("--site", help="ΔΔG of all mutations at a site, e.g. E501")
+    parser.add_argument("--mutation", help="Target residue for --site (e.g. TYR)")
+    parser.add_argument("--top", type=int, help="Largest ΔΔG across runs")
+    parser.add_argument("--kind", help="Restrict --top to one scan (alanine, variant)")
+    args = parser.parse_args()
+
+    con = connect(args.db)
+    if args.site:
+        rows = ddg_at(con, *parse_site(args.site), mutation=args.mutation)
+    else:
+        rows = top_hotspots(con, args.top or 20, kind=args.kind)
+    print("run  kind      tag                     site     mut   ΔΔG (kcal/mol)")
+    for r in rows:
+        print(f"{r['run_id']:3d}  {r['kind']:8s}  {r['tag']:22s}  {r['chain']}{r['resid']:<6d}  "
+              f"{r['mutation']:4s}  {r['ddg']:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
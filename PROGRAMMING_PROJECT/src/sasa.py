@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+ In-process solvent accessible surface (Shrake–Rupley)
+ Per-atom ASA from a golden-spiral point set on every expanded sphere (radius + probe):
+ neighbour spheres come from one cell-list search, and the points of a batch of atoms
+ are tested against all their neighbours with one matrix product. Every point records
+ which chains bury it, so the complex and any chain subset (e.g. each chain unbound)
+ come out of the same pass. Radii, atom classes
+ and residue columns follow NACCESS (vdw.radii, probe 1.4 Å, hetero atoms, waters and
+ hydrogens excluded), so the residue tables line up with the .rsa files it replaces
+
+ Write NACCESS-style files for a structure (or a chain subset):
+   python src/sasa.py data/6m0j_prepared.pdb results/sasa/6m0j_prepared.rsa
+   python src/sasa.py data/6m0j_prepared.pdb results/sasa/6m0j_chain_A.rsa --chains A
+ Accuracy of the full and fast point sets against the NACCESS files in results/naccess:
+   python src/sasa.py data/6m0j_prepared.pdb --report
+"""
+import argparse
+import os
+import time
+import numpy as np
+from compressed_io import open_output
+from naccess_reader import RsaTable, RSA_COLUMNS, SOLVATION_COLUMN, bound_unbound_asa
+from neighbors import cross_pairs
+from pdb_reader import read_atoms, join_keys
+
+PROBE = 1.4            # Å, water
+N_POINTS = 960         # sphere points per atom
+FAST_POINTS = 60       # sphere points per atom of the fast screening mode (report())
+MEMORY_MB = 64         # budget for one batch of point-neighbour tests
+
+# NACCESS vdw.radii (Å): backbone of every residue, then side chains
+BACKBONE_RADII = {"N": 1.65, "CA": 1.87, "C": 1.76, "O": 1.40, "OXT": 1.40}
+SIDE_CHAIN_RADII = {
+    "ALA": {"CB": 1.87},
+    "ARG": {"CB": 1.87, "CG": 1.87, "CD": 1.87, "NE": 1.65, "CZ": 1.76, "NH1": 1.65, "NH2": 1.65},
+    "ASN": {"CB": 1.87, "CG": 1.76, "OD1": 1.40, "ND2": 1.65},
+    "ASP": {"CB": 1.87, "CG": 1.76, "OD1": 1.40, "OD2": 1.40},
+    "CYS": {"CB": 1.87, "SG": 1.85},
+    "GLN": {"CB": 1.87, "CG": 1.87, "CD": 1.76, "OE1": 1.40, "NE2": 1.65},
+    "GLU": {"CB": 1.87, "CG": 1.87, "CD": 1.76, "OE1": 1.40, "OE2": 1.40},
+    "GLY": {},
+    "HIS": {"CB": 1.87, "CG": 1.76, "ND1": 1.65, "CD2": 1.76, "CE1": 1.76, "NE2": 1.65},
+    "ILE": {"CB": 1.87, "CG1": 1.87, "CG2": 1.87, "CD1": 1.87},
+    "LEU": {"CB": 1.87, "CG": 1.87, "CD1": 1.87, "CD2": 1.87},
+    "LYS": {"CB": 1.87, "CG": 1.87, "CD": 1.87, "CE": 1.87, "NZ": 1.50},
+    "MET": {"CB": 1.87, "CG": 1.87, "SD": 1.85, "CE": 1.87},
+    "PHE": {"CB": 1.87, "CG": 1.76, "CD1": 1.76, "CD2": 1.76, "CE1": 1.76, "CE2": 1.76, "CZ": 1.76},
+    "PRO": {"CB": 1.87, "CG": 1.87, "CD": 1.87},
+    "SER": {"CB": 1.87, "OG": 1.40},
+    "THR": {"CB": 1.87, "OG1": 1.40, "CG2": 1.87},
+    "TRP": {"CB": 1.87, "CG": 1.76, "CD1": 1.76, "CD2": 1.76, "NE1": 1.65, "CE2": 1.76,
+            "CE3": 1.76, "CZ2": 1.76, "CZ3": 1.76, "CH2": 1.76},
+    "TYR": {"CB": 1.87, "CG": 1.76, "CD1": 1.76, "CD2": 1.76, "CE1": 1.76, "CE2": 1.76,
+            "CZ": 1.76, "OH": 1.40},
+    "VAL": {"CB": 1.87, "CG1": 1.87, "CG2": 1.87},
+}
+# Atoms not in the table: by element
+ELEMENT_RADII = {"C": 1.80, "N": 1.60, "O": 1.40, "S": 1.85, "P": 1.90}
+DEFAULT_RADIUS = 1.80
+
+# NACCESS atom classes: the main chain is N, C, O (CA counts as side chain);
+# polar atoms are N and O, everything else is non-polar
+MAIN_CHAIN_ATOMS = (b"N", b"C", b"O", b"OXT")
+POLAR_ELEMENTS = (b"N", b"O")
+ATOM_CLASSES = ("all", "side", "main", "apolar", "polar")
+
+# ABS of the residue in an extended Ala-X-Ala (NACCESS standard.data, as recovered from
+# the ABS / REL pairs of results/naccess/*.rsa): all, side, main, non-polar, polar
+REL_REFERENCE = {
+    "ALA": (107.95, 69.41, 38.54, 71.38, 36.58),
+    "ARG": (238.76, 201.24, 37.50, 77.78, 160.94),
+    "ASN": (143.96, 106.24, 37.70, 46.24, 97.71),
+    "ASP": (140.38, 102.68, 37.70, 49.24, 91.16),
+    "CYS": (134.25, 96.74, 37.53, 97.94, 36.36),
+    "GLN": (178.49, 140.98, 37.50, 52.21, 126.29),
+    "GLU": (172.25, 134.74, 37.52, 60.29, 111.96),
+    "GLY": (80.10, 32.33, 47.77, 37.55, 42.56),
+    "HIS": (182.87, 147.03, 35.80, 97.16, 85.74),
+    "ILE": (175.12, 138.03, 37.20, 139.12, 35.98),
+    "LEU": (178.66, 141.13, 37.51, 142.28, 36.33),
+    "LYS": (200.83, 163.32, 37.51, 116.57, 84.24),
+    "MET": (194.17, 156.69, 37.52, 157.92, 36.32),
+    "PHE": (199.49, 164.13, 35.38, 165.21, 34.24),
+    "PRO": (136.14, 119.91, 16.23, 120.96, 15.19),
+    "SER": (116.51, 78.10, 38.41, 48.55, 67.94),
+    "THR": (139.28, 101.70, 37.59, 75.73, 63.55),
+    "TRP": (249.23, 211.30, 38.10, 189.79, 59.70),
+    "TYR": (212.75, 177.40, 35.36, 136.47, 76.23),
+    "VAL": (151.42, 114.28, 37.17, 115.49, 35.97),
+}
+
+
+def sphere_points(n=N_POINTS):
+    ''' n unit vectors spread evenly over the sphere (golden spiral) '''
+    k = np.arange(n) + 0.5
+    z = 1.0 - 2.0 * k / n
+    rho = np.sqrt(1.0 - z * z)
+    phi = np.pi * (3.0 - np.sqrt(5.0)) * k
+    return np.stack([rho * np.cos(phi), rho * np.sin(phi), z], axis=1)
+
+
+def _radius(res_name, name, element):
+    ''' NACCESS radius of one atom: its residue entry, else the same atom name in another
+        residue (backbone first, then the residues in alphabetical order), else its element
+    '''
+    if name in BACKBONE_RADII:
+        return BACKBONE_RADII[name]
+    side = SIDE_CHAIN_RADII.get(res_name)
+    if side is not None and name in side:
+        return side[name]
+    for res in sorted(SIDE_CHAIN_RADII):
+        if name in SIDE_CHAIN_RADII[res]:
+            return SIDE_CHAIN_RADII[res][name]
+    return ELEMENT_RADII.get(element or name[:1], DEFAULT_RADIUS)
+
+
+def atom_radii(res_name, name, element):
+    ''' NACCESS radii for byte arrays of residue names, atom names and elements '''
+    keys = np.char.add(np.char.add(np.asarray(res_name, dtype="S3"), b":"),
+                       np.char.add(np.char.add(np.char.strip(np.asarray(name, dtype="S4")), b":"),
+                                   np.char.strip(np.asarray(element, dtype="S2"))))
+    unique, inverse = np.unique(keys, return_inverse=True)
+    radii = np.array([_radius(*k.decode().split(":")) for k in unique.tolist()])
+    return radii[inverse.reshape(-1)]
+
+
+def surface_atoms(atoms):
+    ''' Atoms NACCESS keeps by default: no hetero atoms, waters or hydrogens '''
+    return (~atoms.hetero & (atoms.element != b"H") & (atoms.element != b"D")
+            & ~np.isin(atoms.res_name, (b"HOH", b"WAT", b"DOD")))
+
+
+# ---------------------------
+# Shrake–Rupley
+# ---------------------------
+# Chain groups tracked in one pass: one bit per group in the point occluder masks
+MAX_GROUPS = 63
+
+
+def _subset_bits(subsets):
+    return [np.bitwise_or.reduce(np.left_shift(np.int64(1), np.asarray(s, dtype=np.int64)))
+            if len(s) else np.int64(0) for s in subsets]
+
+
+def _exposed_points(xyz, expanded, group, subset_bits, n_points=N_POINTS, memory_mb=MEMORY_MB,
+                    targets=None):
+    ''' Exposed sphere points (len(subset_bits), len(targets)) of the target atoms (default
+        all) for each subset bit mask, testing their points against every atom of xyz.
+        A point of atom i is buried by a neighbour j when it lies inside its expanded
+        sphere: 2 R_i p·v > R_i^2 + |v|^2 - R_j^2 (v = x_j - x_i), which for a batch of
+        atoms is one (neighbours x 3) @ (3 x points) product. Each point keeps the bit
+        mask of the groups burying it, so a subset sees it exposed when none of its
+        groups does (points buried only by partner chains count as unbound surface).
+    '''
+    if targets is None:
+        targets = np.arange(len(xyz))
+    n = len(targets)
+    exposed = np.full((len(subset_bits), n), n_points, dtype=np.int64)
+    if n == 0:
+        return exposed
+    bits = np.left_shift(np.int64(1), group)
+
+    i, j, r = cross_pairs(xyz[targets], xyz, 2.0 * expanded.max())
+    keep = (targets[i] != j) & (r < expanded[targets[i]] + expanded[j])
+    i, j = i[keep], j[keep]
+    counts = np.bincount(i, minlength=n)
+    start = np.concatenate([[0], np.cumsum(counts)])
+    single = len(np.unique(group)) == 1
+
+    points = sphere_points(n_points)
+    # Atoms in order of neighbour count, so a batch pads to a similar width
+    order = np.argsort(counts, kind="stable")
+    budget = max(1, int(memory_mb * 1024 * 1024) // (8 * n_points))
+    pos = 0
+    while pos < n:
+        stop = pos + 1
+        while stop < n and (stop - pos + 1) * max(int(counts[order[stop]]), 1) <= budget:
+            stop += 1
+        batch = order[pos:stop]
+        pos = stop
+        width = int(counts[batch].max())
+        if width == 0:
+            continue
+        atom = targets[batch]
+
+        # neighbour table (batch, width); padding gets an unreachable threshold
+        slot = np.arange(width)
+        valid = slot[None, :] < counts[batch][:, None]
+        nb = np.where(valid, start[batch][:, None] + slot[None, :], 0)
+        nb = j[np.minimum(nb, len(j) - 1)]
+        v = xyz[nb] - xyz[atom][:, None, :]
+        big_r = expanded[atom][:, None]
+        threshold = (big_r ** 2 + np.einsum("bkc,bkc->bk", v, v) - expanded[nb] ** 2) / (2.0 * big_r)
+        threshold[~valid] = np.inf
+
+        dots = (v.reshape(-1, 3) @ points.T).reshape(len(batch), width, n_points)
+        hit = dots > threshold[:, :, None]
+        if single:
+            occluders = np.where(hit.any(axis=1), bits[atom][:, None], 0)
+        else:
+            # one reduction per group present among the batch's neighbours (a few chains)
+            occluders = np.zeros((len(batch), n_points), dtype=np.int64)
+            nb_group = np.where(valid, group[nb], -1)
+            for g in np.unique(nb_group[valid]).tolist():
+                in_g = (nb_group == g)[:, :, None]
+                occluders |= np.where((hit & in_g).any(axis=1), np.int64(1 << g), 0)
+        for s, mask in enumerate(subset_bits):
+            exposed[s, batch] = np.count_nonzero((occluders & mask) == 0, axis=1)
+    return exposed
+
+
+def _point_area(expanded, group, subset_bits, exposed, n_points):
+    ''' ASA of exposed point counts, 0 for atoms outside a subset '''
+    bits = np.left_shift(np.int64(1), group)
+    inside = np.array([(bits & mask) != 0 for mask in subset_bits]).reshape(len(subset_bits), len(group))
+    return np.where(inside, 4.0 * np.pi * expanded ** 2 * exposed / n_points, 0.0)
+
+
+def subset_sasa(xyz, radii, group, subsets, probe=PROBE, n_points=N_POINTS, memory_mb=MEMORY_MB):
+    ''' Per-atom ASA (Å^2) of spheres xyz / radii with only the atoms of each subset of
+        groups present, from one neighbour search: (len(subsets), n) array, 0 for atoms
+        outside a subset. group: per-atom group index (e.g. chain), subsets: lists of
+        group indices ([all groups] gives the complex, [g] group g alone).
+    '''
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    expanded = np.asarray(radii, dtype=np.float64) + probe
+    group = np.asarray(group, dtype=np.int64)
+    if len(group) and group.max() >= MAX_GROUPS:
+        raise ValueError(f"At most {MAX_GROUPS} groups per SASA pass")
+    subset_bits = _subset_bits(subsets)
+    exposed = _exposed_points(xyz, expanded, group, subset_bits, n_points, memory_mb)
+    return _point_area(expanded, group, subset_bits, exposed, n_points)
+
+
+def atom_sasa(xyz, radii, probe=PROBE, n_points=N_POINTS, memory_mb=MEMORY_MB):
+    ''' Per-atom ASA (Å^2) of spheres xyz / radii, with a probe of the given radius '''
+    n = len(np.asarray(radii))
+    return subset_sasa(xyz, radii, np.zeros(n, dtype=np.int64), [[0]], probe, n_points, memory_mb)[0]
+
+
+def column_atoms(column, name, element):
+    ''' Mask of the atoms (byte arrays of names and elements) an RSA column or atom class
+        (ATOM_CLASSES) counts: all, side / main chain, apolar / polar (ABS and REL alike)
+    '''
+    name = np.char.strip(np.asarray(name, dtype="S4"))
+    element = np.char.strip(np.asarray(element, dtype="S2"))
+    element = np.where(element == b"", np.array([n[:1] for n in name.tolist()], dtype="S2"), element)
+    kind = column.rsplit("_", 1)[0]
+    if kind == "all":
+        return np.ones(len(name), dtype=bool)
+    if kind in ("side", "main"):
+        return np.isin(name, MAIN_CHAIN_ATOMS) == (kind == "main")
+    if kind in ("apolar", "polar"):
+        return np.isin(element, POLAR_ELEMENTS) == (kind == "polar")
+    raise ValueError(f"Unknown RSA column '{column}' ({', '.join(RSA_COLUMNS)})")
+
+
+def residue_table(atoms, asa, mask=None):
+    ''' RsaTable (all residues of atoms, PdbAtoms) of per-atom ASA: the NACCESS ABS
+        columns, and REL against REL_REFERENCE for the standard residues (0 otherwise).
+        mask: atoms counted (default all).
+    '''
+    asa = np.asarray(asa, dtype=np.float64)
+    if mask is not None:
+        asa = np.where(mask, asa, 0.0)
+    main = column_atoms("main_abs", atoms.name, atoms.element)
+    polar = column_atoms("polar_abs", atoms.name, atoms.element)
+
+    def per_res(w):
+        return np.bincount(atoms.res_index, weights=w, minlength=atoms.n_res)
+
+    absolute = np.stack([per_res(asa), per_res(asa * ~main), per_res(asa * main),
+                         per_res(asa * ~polar), per_res(asa * polar)], axis=1)
+    s = atoms.res_start[:-1]
+    res_name = atoms.res_name[s]
+    reference = np.array([REL_REFERENCE.get(r, (np.inf,) * 5) for r in res_name.astype(str).tolist()],
+                         dtype=np.float64).reshape(-1, 5)
+    values = np.empty((atoms.n_res, len(RSA_COLUMNS)))
+    values[:, 0::2] = absolute
+    values[:, 1::2] = 100.0 * absolute / reference
+    return RsaTable(res_name, atoms.chain[s], atoms.res_seq[s], atoms.icode[s], values)
+
+
+class SasaState():
+    ''' Per-atom exposed sphere points of a PdbAtoms structure for a list of chain
+        subsets (a list of chain ids; None: all chains), kept so that a mutant can be
+        updated locally (mutant()) instead of recomputed
+        sel: surface atom indices; xyz, expanded (radius + probe), group (chain index)
+        of those atoms; exposed (n_subsets, len(sel)); recomputed: atoms whose points
+        were tested when the state was built (all of them for a full computation)
+    '''
+    def __init__(self, atoms, subsets, probe=PROBE, n_points=N_POINTS, _exposed=None, _targets=None):
+        self.atoms = atoms
+        self.subsets = list(subsets)
+        self.probe = probe
+        self.n_points = n_points
+        self.use = surface_atoms(atoms)
+        self.sel = np.flatnonzero(self.use)
+        self.chain_ids = atoms.chain_ids()
+        unique, inverse = np.unique(atoms.chain[self.sel], return_inverse=True)
+        self.group = np.array([self.chain_ids.index(c.decode()) for c in unique.tolist()],
+                              dtype=np.int64)[inverse.reshape(-1)]
+        if len(self.chain_ids) > MAX_GROUPS:
+            raise ValueError(f"At most {MAX_GROUPS} chains per SASA pass")
+        self.groups = [list(range(len(self.chain_ids))) if chains is None
+                       else [self.chain_ids.index(c) for c in chains] for chains in self.subsets]
+        self.subset_bits = _subset_bits(self.groups)
+        self.xyz = atoms.xyz[self.sel].astype(np.float64)
+        self.expanded = atom_radii(atoms.res_name[self.sel], atoms.name[self.sel],
+                                   atoms.element[self.sel]) + probe
+
+        if _exposed is None:
+            _exposed = np.zeros((len(self.subsets), len(self.sel)), dtype=np.int64)
+            _targets = np.arange(len(self.sel))
+        self.exposed = _exposed
+        if len(_targets):
+            self.exposed[:, _targets] = _exposed_points(self.xyz, self.expanded, self.group,
+                                                        self.subset_bits, n_points, targets=_targets)
+        self.recomputed = len(_targets)
+
+    def atom_asa(self):
+        ''' (n_subsets, n_atoms) per-atom ASA, 0 outside a subset '''
+        asa = np.zeros((len(self.subsets), self.atoms.n_atoms))
+        asa[:, self.sel] = _point_area(self.expanded, self.group, self.subset_bits, self.exposed, self.n_points)
+        return asa
+
+    def results(self):
+        ''' [(per-atom ASA, RsaTable)] per subset '''
+        out = []
+        for k, asa in enumerate(self.atom_asa()):
+            inside = self.use.copy()
+            inside[self.sel] = np.isin(self.group, self.groups[k])
+            out.append((asa, residue_table(self.atoms, asa, inside)))
+        return out
+
+    def mutant(self, atoms):
+        ''' SasaState of a structure derived from this one (e.g. a mutant), recomputing
+            only the atoms that are new or moved and those whose expanded sphere overlaps
+            an added or removed one; all other atoms keep their exposed point counts
+        '''
+        if atoms.chain_ids() != self.chain_ids:
+            return type(self)(atoms, self.subsets, self.probe, self.n_points)
+        sel = np.flatnonzero(surface_atoms(atoms))
+        xyz = atoms.xyz[sel].astype(np.float64)
+        expanded = atom_radii(atoms.res_name[sel], atoms.name[sel], atoms.element[sel]) + self.probe
+
+        # atoms unchanged from the reference: same key, coordinates and radius
+        index = join_keys(atoms.atom_keys()[sel], self.atoms.atom_keys()[self.sel])
+        same = index >= 0
+        same[same] = (np.all(xyz[same] == self.xyz[index[same]], axis=1)
+                      & (expanded[same] == self.expanded[index[same]]))
+        kept = np.zeros(len(self.sel), dtype=bool)
+        kept[index[same]] = True
+
+        # spheres added (mutant) or removed (reference), and the unchanged atoms they touch
+        changed_xyz = np.concatenate([xyz[~same], self.xyz[~kept]])
+        changed_r = np.concatenate([expanded[~same], self.expanded[~kept]])
+        unchanged = np.flatnonzero(same)
+        touched = np.zeros(0, dtype=np.int64)
+        if len(changed_r) and len(unchanged):
+            i, j, r = cross_pairs(xyz[unchanged], changed_xyz, expanded.max() + changed_r.max())
+            touched = unchanged[i[r < expanded[unchanged[i]] + changed_r[j]]]
+
+        exposed = np.zeros((len(self.subsets), len(sel)), dtype=np.int64)
+        exposed[:, same] = self.exposed[:, index[same]]
+        targets = np.union1d(np.flatnonzero(~same), touched)
+        return type(self)(atoms, self.subsets, self.probe, self.n_points, exposed, targets)
+
+
+def chain_subsets_sasa(atoms, subsets, probe=PROBE, n_points=N_POINTS):
+    ''' [(per-atom ASA, RsaTable)] of a PdbAtoms structure for each chain subset
+        (a list of chain ids; None: all chains), all from one SASA pass.
+        Atoms outside a subset get 0.
+    '''
+    return SasaState(atoms, subsets, probe, n_points).results()
+
+
+def structure_sasa(atoms, chains=None, probe=PROBE, n_points=N_POINTS):
+    ''' (per-atom ASA, RsaTable) of a PdbAtoms structure, or of the chain subset chains
+        taken alone; atoms outside the computation get 0
+    '''
+    return chain_subsets_sasa(atoms, [chains], probe, n_points)[0]
+
+
+class BoundUnboundState(SasaState):
+    ''' SasaState of the complex (first subset) and of single chains alone '''
+    def bound_unbound(self, column=SOLVATION_COLUMN):
+        ''' Residue ASA (column) bound and unbound, as naccess_reader.bound_unbound_asa:
+            (asa_bound, asa_unbound, missing_bound, missing_unbound); residues of chains
+            not computed alone and hetero residues get 0
+        '''
+        tables = self.results()
+        asa_bound = tables[0][1].column(column).copy()
+        asa_unbound = np.zeros(self.atoms.n_res)
+        res_chain = self.atoms.chain[self.atoms.res_start[:-1]]
+        for (chain_id,), (_, alone) in zip(self.subsets[1:], tables[1:]):
+            sel = res_chain == chain_id.encode()
+            asa_unbound[sel] = alone.column(column)[sel]
+
+        hetero = self.atoms.hetero[self.atoms.res_start[:-1]]
+        asa_bound[hetero] = 0.0
+        asa_unbound[hetero] = 0.0
+        return asa_bound, asa_unbound, 0, 0
+
+    def atom_bound_unbound(self):
+        ''' Per-atom ASA bound and unbound (each atom with its own chain alone) '''
+        asa = self.atom_asa()
+        unbound = np.zeros(self.atoms.n_atoms)
+        for k, (chain_id,) in enumerate(self.subsets[1:], start=1):
+            sel = self.atoms.chain == chain_id.encode()
+            unbound[sel] = asa[k, sel]
+        return asa[0], unbound
+
+
+def bound_unbound_state(atoms, unbound_chains=None, probe=PROBE, n_points=N_POINTS):
+    ''' BoundUnboundState of the complex and each chain alone (unbound_chains, default all) '''
+    if unbound_chains is None:
+        unbound_chains = atoms.chain_ids()
+    return BoundUnboundState(atoms, [None] + [[c] for c in unbound_chains], probe, n_points)
+
+
+def bound_unbound_sasa(atoms, column=SOLVATION_COLUMN, unbound_chains=None, reference=None,
+                       n_points=N_POINTS):
+    ''' In-process counterpart of naccess_reader.bound_unbound_asa for a PdbAtoms
+        structure: residue ASA in the complex and with each chain alone, from one
+        SASA pass (unbound_chains: chains computed alone, default all; others get 0).
+        reference: bound_unbound_state of a related structure (e.g. the WT of a mutant),
+        updated locally instead (its unbound chains and point count are used).
+        Returns (asa_bound, asa_unbound, missing_bound, missing_unbound).
+    '''
+    if reference is not None:
+        return reference.mutant(atoms).bound_unbound(column)
+    return bound_unbound_state(atoms, unbound_chains, n_points=n_points).bound_unbound(column)
+
+
+# ---------------------------
+# Accuracy against NACCESS
+# ---------------------------
+REPORT_COLUMNS = ("all_abs", SOLVATION_COLUMN)
+
+
+def report(atoms, rsa_complex, rsa_unbound, points=(N_POINTS, FAST_POINTS), columns=REPORT_COLUMNS):
+    ''' Residue ASA of a PdbAtoms structure (complex and each chain of rsa_unbound alone)
+        for each sphere point count, against the NACCESS files (naccess_reader inputs).
+        Returns one row per (points, column): {"points", "seconds", "column", "bound",
+        "unbound", "delta" (RMSE over residues, Å^2), "delta_max", "worst" (residue of
+        delta_max), "buried", "buried_naccess" (sum of bound - unbound, Å^2)}
+    '''
+    s = atoms.res_start[:-1]
+    chains = list(rsa_unbound)
+    naccess = {c: bound_unbound_asa(rsa_complex, rsa_unbound, atoms.chain[s], atoms.res_seq[s],
+                                    atoms.icode[s], atoms.hetero[s], c)[:2] for c in columns}
+    labels = [f"{c.decode()}{n}{i.decode().strip()}" for c, n, i in
+              zip(atoms.chain[s].tolist(), atoms.res_seq[s].tolist(), atoms.icode[s].tolist())]
+
+    def rmse(x):
+        return float(np.sqrt(np.mean(x ** 2))) if len(x) else 0.0
+
+    rows = []
+    for n_points in points:
+        start = time.perf_counter()
+        state = bound_unbound_state(atoms, chains, n_points=n_points)
+        state.atom_asa()
+        seconds = time.perf_counter() - start
+        for column in columns:
+            bound, unbound, _, _ = state.bound_unbound(column)
+            ref_bound, ref_unbound = naccess[column]
+            delta = (bound - unbound) - (ref_bound - ref_unbound)
+            worst = int(np.argmax(np.abs(delta)))
+            rows.append({"points": n_points, "seconds": seconds, "column": column,
+                         "bound": rmse(bound - ref_bound), "unbound": rmse(unbound - ref_unbound),
+                         "delta": rmse(delta), "delta_max": float(delta[worst]), "worst": labels[worst],
+                         "buried": float(np.sum(bound - unbound)),
+                         "buried_naccess": float(np.sum(ref_bound - ref_unbound))})
+    return rows
+
+
+def print_report(rows):
+    print("points  time (s)  column     RMSE bound  unbound  ΔASA   max ΔASA (res)      "
+          "Σ ΔASA   NACCESS  [Å^2]")
+    for r in rows:
+        print(f"{r['points']:6d}  {r['seconds']:8.2f}  {r['column']:9s}  {r['bound']:10.2f}  "
+              f"{r['unbound']:7.2f}  {r['delta']:5.2f}  {r['delta_max']:8.2f} ({r['worst']:7s})  "
+              f"{r['buried']:8.1f}  {r['buried_naccess']:8.1f}")
+
+
+# ---------------------------
+# NACCESS-style output
+# ---------------------------
+def write_rsa(path, table):
+    ''' .rsa file of an RsaTable (RES lines plus chain and total sums) '''
+    with open_output(path, "wt") as f:
+        f.write("REM  Relative accessibilites from in-process Shrake-Rupley (src/sasa.py)\n")
+        f.write("REM RES _ NUM      All-atoms   Total-Side   Main-Chain    Non-polar    All polar\n")
+        f.write("REM                ABS   REL    ABS   REL    ABS   REL    ABS   REL    ABS   REL\n")
+        chains = table.chain.astype(str)
+        for k in range(table.n_res):
+            v = table.values[k]
+            f.write(f"RES {table.res_name[k].decode():3s} {chains[k]:1s}{table.res_seq[k]:4d}"
+                    f"{table.icode[k].decode() or ' ':1s}{v[0]:8.2f}{v[1]:6.1f}" +
+                    "".join(f"{v[c]:7.2f}{v[c + 1]:6.1f}" for c in range(2, 10, 2)) + "\n")
+        f.write("END  Absolute sums over single chains surface \n")
+        sums = table.values[:, 0::2]
+        for n, chain_id in enumerate(dict.fromkeys(chains), start=1):
+            s = sums[chains == chain_id].sum(axis=0)
+            f.write(f"CHAIN{n:3d} {chain_id:1s}{s[0]:11.1f}" + "".join(f"{x:13.1f}" for x in s[1:]) + "\n")
+        f.write("END  Absolute sums over all chains \n")
+        total = sums.sum(axis=0)
+        f.write(f"TOTAL{total[0]:16.1f}" + "".join(f"{x:13.1f}" for x in total[1:]) + "\n")
+
+
+def write_asa(path, atoms, asa, radii, mask):
+    ''' .asa file: PDB columns 1-54 of the atoms in mask, then ASA and radius '''
+    with open_output(path, "wb") as f:
+        for line, a, r in zip(atoms.lines[mask], asa[mask].tolist(), radii.tolist()):
+            f.write(line[:54].ljust(54) + b"%8.3f%6.2f\n" % (a, r))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NACCESS-style accessible surface of a structure.")
+    parser.add_argument("pdb", help="PDB / mmCIF input")
+    parser.add_argument("rsa", nargs="?",
+                        help="Output .rsa (an .asa with the atom values is written next to it)")
+    parser.add_argument("--chains", help="Comma-separated chains computed alone (default: all)")
+    parser.add_argument("--probe", type=float, default=PROBE, help="Probe radius (Å)")
+    parser.add_argument("--points", type=int, default=N_POINTS, help="Sphere points per atom")
+    parser.add_argument("--report", action="store_true",
+                        help=f"Compare {N_POINTS} and {FAST_POINTS} points (and --points) with the "
+                             "NACCESS files of the energy script (RSA_COMPLEX, RSA_A, RSA_E)")
+    args = parser.parse_args()
+
+    atoms = read_atoms(args.pdb)
+    if args.report:
+        # defaults of the energy script (imported here: int_energies_AE imports this module)
+        from int_energies_AE import DEFAULT_RSA_COMPLEX, DEFAULT_RSA_UNBOUND
+        rsa_complex = os.environ.get("RSA_COMPLEX", DEFAULT_RSA_COMPLEX)
+        rsa_unbound = {c: os.environ.get(f"RSA_{c}", p) for c, p in DEFAULT_RSA_UNBOUND.items()}
+        print_report(report(atoms, rsa_complex, rsa_unbound,
+                            sorted({N_POINTS, FAST_POINTS, args.points}, reverse=True)))
+        return
+    if args.rsa is None:
+        parser.error("an output .rsa is required (or --report)")
+    chains = [c.strip() for c in args.chains.split(",")] if args.chains else None
+    asa, table = structure_sasa(atoms, chains, args.probe, args.points)
+    mask = surface_atoms(atoms)
+    if chains is not None:
+        mask &= np.isin(atoms.chain, [c.encode() for c in chains])
+        table = RsaTable(*(np.asarray(x)[np.isin(table.chain, [c.encode() for c in chains])]
+                           for x in (table.res_name, table.chain, table.res_seq, table.icode, table.values)))
+    out_dir = os.path.dirname(args.rsa)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    write_rsa(args.rsa, table)
+    write_asa(os.path.splitext(args.rsa)[0] + ".asa", atoms, asa,
+              atom_radii(atoms.res_name[mask], atoms.name[mask], atoms.element[mask]), mask)
+    print(f"{args.rsa}: {table.n_res} residues, total ASA {table.column('all_abs').sum():.1f} Å^2")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from annotated_complex import AnnotatedComplex
+from mutant_delta import complex_delta, apply_delta, store_mutant, load_delta, _same_complex
+
+WT_FILES = {"pdb": "wt.pdb", "pdbqt": "wt.pdbqt", "hash": "0"}
+
+
+def make_complex(res_names, shift=0.0):
+    ''' Chain A with 3-atom residues res_names, chain E with one 3-atom GLY '''
+    n_res = len(res_names) + 1
+    res_index = np.repeat(np.arange(n_res), 3)
+    xyz = np.arange(3 * n_res * 3, dtype=np.float64).reshape(-1, 3)
+    xyz[:3] += shift
+    return AnnotatedComplex(
+        ["A", "E"], xyz, np.full(3 * n_res, 0.1), np.zeros(3 * n_res), [b"N", b"CA", b"C"] * n_res,
+        [b"N", b"C", b"C"] * n_res, res_index, [0] * len(res_names) + [1],
+        list(range(1, n_res + 1)), [b""] * n_res, list(res_names) + ["GLY"],
+        np.ones(n_res), np.full(n_res, 2.0), ["C"], [0.1], [4.0], [0.01])
+
+
+def test_delta_round_trip():
+    wt = make_complex(["ALA", "SER"])
+    mut = make_complex(["ALA", "SER"], shift=0.5)
+    mut.res_name[0] = b"GLY"
+    delta = complex_delta(wt, mut, WT_FILES)
+    assert delta.residues.tolist() == [0]
+    assert _same_complex(apply_delta(wt, delta), mut)
+
+
+def test_residue_count_mismatch_keeps_full_files(tmp_path):
+    wt = make_complex(["ALA", "SER"])
+    mut = make_complex(["ALA", "SER", "THR"])
+    with pytest.raises(ValueError):
+        complex_delta(wt, mut, WT_FILES)
+
+    pdb, pdbqt = tmp_path / "in.pdb", tmp_path / "in.pdbqt"
+    pdb.write_text("ATOM\n")
+    pdbqt.write_text("ATOM\n")
+    out_dir = tmp_path / "mutants"
+    out_dir.mkdir()
+    stored = store_mutant(str(out_dir), "A_3_THR", wt, mut, WT_FILES, str(pdb), str(pdbqt))
+    assert sorted(os.path.basename(p) for p in stored) == ["A_3_THR.pdb", "A_3_THR.pdbqt"]
+    assert (out_dir / "A_3_THR.pdb").read_text() == "ATOM\n"
+    assert not (out_dir / "A_3_THR.delta.npz").exists()
+
+
+def test_store_mutant_writes_delta(tmp_path):
+    wt = make_complex(["ALA", "SER"])
+    mut = make_complex(["ALA", "SER"], shift=0.5)
+    pdbqt = tmp_path / "in.pdbqt"
+    pdbqt.write_text("")
+    stored = store_mutant(str(tmp_path), "A_1_ALA", wt, mut, WT_FILES, "unused.pdb", str(pdbqt))
+    assert stored == [str(tmp_path / "A_1_ALA.delta.npz")]
+    assert _same_complex(apply_delta(wt, load_delta(stored[0])), mut)
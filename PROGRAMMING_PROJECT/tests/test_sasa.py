@@ -0,0 +1,76 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+from pdb_reader import read_atoms
+from naccess_reader import bound_unbound_asa
+from sasa import (atom_sasa, structure_sasa, bound_unbound_state, bound_unbound_sasa, report,
+                  PROBE, N_POINTS, FAST_POINTS)
+
+WT_PDB = os.path.join(ROOT, "data", "6m0j_prepared.pdb")
+RSA_COMPLEX = os.path.join(ROOT, "results", "naccess", "6m0j_prepared.rsa")
+RSA_UNBOUND = {c: os.path.join(ROOT, "results", "naccess", f"6m0j_chain_{c}.rsa") for c in "AE"}
+
+
+@pytest.fixture(scope="module")
+def wt():
+    return read_atoms(WT_PDB)
+
+
+def alanine_mutant(atoms, chain, resid):
+    ''' atoms with the side chain of (chain, resid) cut back to CB and one of its
+        backbone atoms moved '''
+    site = (atoms.chain == chain.encode()) & (atoms.res_seq == resid)
+    keep = ~site | np.isin(atoms.name, [b"N", b"CA", b"C", b"O", b"CB"])
+    mut = atoms.select(keep)
+    moved = np.flatnonzero((mut.chain == chain.encode()) & (mut.res_seq == resid) & (mut.name == b"O"))
+    mut.xyz[moved] += 0.3
+    return mut
+
+
+def test_isolated_atom_is_full_sphere():
+    asa = atom_sasa(np.zeros((1, 3)), np.array([1.8]))
+    assert asa[0] == pytest.approx(4.0 * np.pi * (1.8 + PROBE) ** 2)
+
+
+def test_mutant_update_matches_full_recompute(wt):
+    state = bound_unbound_state(wt, n_points=FAST_POINTS)
+    mut = alanine_mutant(wt, "E", 501)
+    local = state.mutant(mut)
+    full = type(state)(mut, state.subsets, n_points=FAST_POINTS)
+    assert 0 < local.recomputed < full.recomputed
+    np.testing.assert_array_equal(local.exposed, full.exposed)
+    np.testing.assert_array_equal(local.atom_asa(), full.atom_asa())
+
+
+def test_unbound_matches_single_chain_runs(wt):
+    _, unbound = bound_unbound_state(wt, n_points=FAST_POINTS).atom_bound_unbound()
+    for chain in wt.chain_ids():
+        sel = wt.chain == chain.encode()
+        alone, _ = structure_sasa(wt.select(sel), n_points=FAST_POINTS)
+        np.testing.assert_allclose(unbound[sel], alone, rtol=0, atol=1e-9)
+
+
+def test_agrees_with_naccess(wt):
+    # per-residue RMSE (Å^2) and buried area (relative) against the committed NACCESS files
+    s = wt.res_start[:-1]
+    bound, unbound, _, _ = bound_unbound_sasa(wt, column="all_abs", n_points=N_POINTS)
+    ref_bound, ref_unbound, _, _ = bound_unbound_asa(RSA_COMPLEX, RSA_UNBOUND, wt.chain[s],
+                                                     wt.res_seq[s], wt.icode[s], wt.hetero[s],
+                                                     "all_abs")
+    assert np.sqrt(np.mean((bound - ref_bound) ** 2)) < 1.0
+    assert np.sqrt(np.mean((unbound - ref_unbound) ** 2)) < 2.0
+    buried, ref_buried = np.sum(bound - unbound), np.sum(ref_bound - ref_unbound)
+    assert buried == pytest.approx(ref_buried, rel=0.01)
+
+
+def test_fast_mode_report(wt):
+    rows = report(wt, RSA_COMPLEX, RSA_UNBOUND, points=(FAST_POINTS,), columns=("all_abs",))
+    assert len(rows) == 1
+    row = rows[0]
+    assert row["points"] == FAST_POINTS
+    assert row["bound"] < 4.0 and row["delta"] < 2.5
+    assert row["buried"] == pytest.approx(row["buried_naccess"], rel=0.02)